@@ -0,0 +1,245 @@
+"""
+Local stand-in for the Bedrock runtime API, for load tests without AWS.
+
+Speaks the two calls the app makes, on the real wire format, so the boto3
+client, the LLM gateway and the SSE path run unchanged:
+
+    POST /model/{modelId}/invoke                       -> Anthropic messages JSON
+    POST /model/{modelId}/invoke-with-response-stream  -> application/vnd.amazon.eventstream
+
+Point the app at it with BEDROCK_ENDPOINT_URL=http://127.0.0.1:8711 (plus any
+AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY; nothing is verified).
+
+The reply depends on the system prompt:
+- planner ("tool-routing planner" + a "plan" contract) -> canned plan JSON
+- single-tool router                                     -> canned decision JSON
+- NL->SQL ("PostgreSQL SQL writer")                      -> canned SELECT
+- session summary                                        -> short summary
+- anything else (answerer, /chat)                        -> `answer_tokens` tokens of prose
+`{client_id}` in the canned JSON is replaced by the first number in the user
+message (default 1).
+
+Timing: `latency_ms` before the first token, then `tokens_per_sec`; a
+non-streamed call sleeps for the whole generation. `throttle_rate` answers that
+share of calls with a ThrottlingException (429), to exercise the retry path.
+
+    python bench/fake_bedrock.py --port 8711 --latency-ms 400 --tokens-per-sec 60
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PLAN = {
+    "plan": [
+        {"tool": "database_info", "args": {"client_id": "{client_id}"}},
+        {"tool": "investment_packages", "args": {"risk": "{{database_info.risk_profile}}"}},
+    ],
+    "why": "client profile, then packages for its risk",
+    "confidence": 0.9,
+}
+DEFAULT_DECISION = {"tool": "transaction_history", "args": {"client_id": "{client_id}"},
+                    "why": "recent activity", "confidence": 0.9}
+DEFAULT_SQL = "SELECT id, name, risk_rating FROM public.clients ORDER BY id LIMIT 50"
+
+_PROSE = ("Based on your profile and recent activity, a balanced allocation makes sense: keep an emergency "
+          "fund, add a diversified equity ETF for growth and a bond fund for stability, and review it quarterly. ")
+
+
+# ---------- AWS event stream encoding (application/vnd.amazon.eventstream) ----------
+def _header(name: str, value: str) -> bytes:
+    n, v = name.encode(), value.encode()
+    return struct.pack("!B", len(n)) + n + struct.pack("!BH", 7, len(v)) + v  # 7 = string
+
+
+def event_message(payload: Dict[str, Any]) -> bytes:
+    """One `chunk` event carrying an Anthropic stream event, as Bedrock frames it."""
+    body = json.dumps({"bytes": base64.b64encode(json.dumps(payload).encode()).decode()}).encode()
+    headers = _header(":event-type", "chunk") + _header(":content-type", "application/json") \
+        + _header(":message-type", "event")
+    total = 12 + len(headers) + len(body) + 4
+    prelude = struct.pack("!II", total, len(headers))
+    prelude += struct.pack("!I", zlib.crc32(prelude) & 0xFFFFFFFF)
+    msg = prelude + headers + body
+    return msg + struct.pack("!I", zlib.crc32(msg) & 0xFFFFFFFF)
+
+
+class FakeBedrock:
+    def __init__(self, *, latency_ms: float = 300.0, tokens_per_sec: float = 80.0, answer_tokens: int = 200,
+                 throttle_rate: float = 0.0, plan: Optional[Dict[str, Any]] = None,
+                 decision: Optional[Dict[str, Any]] = None, sql: str = DEFAULT_SQL, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.throttle_rate = throttle_rate
+        self.plan = plan or DEFAULT_PLAN
+        self.decision = decision or DEFAULT_DECISION
+        self.sql = sql
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"invoke": 0, "stream": 0, "throttled": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def throttle(self) -> bool:
+        with self._lock:
+            hit = self._rng.random() < self.throttle_rate
+        if hit:
+            self._count("throttled")
+        return hit
+
+    def reply_tokens(self, request: Dict[str, Any]) -> List[str]:
+        system = " ".join(b.get("text", "") for b in request.get("system") or [] if isinstance(b, dict)) \
+            if isinstance(request.get("system"), list) else str(request.get("system") or "")
+        user = " ".join(str(m.get("content", "")) for m in request.get("messages") or [])
+        found = re.search(r"\b(\d{1,9})\b", user.split("User message:")[-1])
+        client_id = found.group(1) if found else "1"
+        if "tool-routing planner" in system:
+            canned = self.plan if '"plan"' in system else self.decision
+            text = json.dumps(canned).replace("{client_id}", client_id)
+        elif "PostgreSQL SQL writer" in system:
+            text = self.sql
+        elif "running summary" in system:
+            text = f"The client (id {client_id}) asked about investments; packages were discussed."
+        else:
+            words = (_PROSE * (self.answer_tokens // 30 + 1)).split(" ")
+            return [w + " " for w in words[: self.answer_tokens]]
+        # structured replies: ~4 chars per token
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    @staticmethod
+    def input_tokens(raw: bytes) -> int:
+        return max(1, len(raw) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeBedrock = None  # set by serve()
+
+    def log_message(self, *args):  # quiet: this runs under load
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        fake = self.fake
+        if self.path.endswith("/invoke-with-response-stream"):
+            stream = True
+        elif self.path.endswith("/invoke"):
+            stream = False
+        else:
+            self._send_json(404, {"message": f"unknown path {self.path}"})
+            return
+        if fake.throttle():
+            self._send_json(429, {"message": "Too many requests (fake)"},
+                            {"x-amzn-ErrorType": "ThrottlingException:http://internal.amazon.com/coral/"})
+            return
+        try:
+            request = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"message": "body is not JSON"},
+                            {"x-amzn-ErrorType": "ValidationException:http://internal.amazon.com/coral/"})
+            return
+        tokens = fake.reply_tokens(request)
+        usage_in = fake.input_tokens(raw)
+        time.sleep(fake.latency_ms / 1000.0)
+        if not stream:
+            fake._count("invoke")
+            time.sleep(len(tokens) / fake.tokens_per_sec if fake.tokens_per_sec > 0 else 0)
+            self._send_json(200, {
+                "id": "msg_fake", "type": "message", "role": "assistant", "model": "fake",
+                "content": [{"type": "text", "text": "".join(tokens)}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": usage_in, "output_tokens": len(tokens)},
+            })
+            return
+
+        fake._count("stream")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(payload: Dict[str, Any]) -> None:
+            data = event_message(payload)
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        chunk({"type": "message_start", "message": {"id": "msg_fake", "role": "assistant", "content": [],
+                                                    "usage": {"input_tokens": usage_in, "output_tokens": 0}}})
+        chunk({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        pause = 1.0 / fake.tokens_per_sec if fake.tokens_per_sec > 0 else 0
+        for tok in tokens:
+            time.sleep(pause)
+            chunk({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": tok}})
+        chunk({"type": "content_block_stop", "index": 0})
+        chunk({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": len(tokens)}})
+        chunk({"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def serve(fake: FakeBedrock, host: str = "127.0.0.1", port: int = 8711) -> ThreadingHTTPServer:
+    """Starts the server on a daemon thread and returns it (server.shutdown() to stop)."""
+    handler = type("Handler", (_Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-bedrock", daemon=True).start()
+    return server
+
+
+def add_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--latency-ms", type=float, default=300.0, help="time to first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=80.0)
+    ap.add_argument("--answer-tokens", type=int, default=200, help="length of answerer / chat replies")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="share of calls answered with a 429")
+    ap.add_argument("--planner-json", help="canned route_tool_plan reply (JSON text or @file)")
+    ap.add_argument("--router-json", help="canned route_tool_decision reply (JSON text or @file)")
+
+
+def _load_json(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not value:
+        return None
+    if value.startswith("@"):
+        with open(value[1:], encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def from_args(args: argparse.Namespace) -> FakeBedrock:
+    return FakeBedrock(latency_ms=args.latency_ms, tokens_per_sec=args.tokens_per_sec,
+                       answer_tokens=args.answer_tokens, throttle_rate=args.throttle_rate,
+                       plan=_load_json(args.planner_json), decision=_load_json(args.router_json))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8711)
+    add_arguments(ap)
+    args = ap.parse_args()
+    srv = serve(from_args(args), args.host, args.port)
+    print(f"fake Bedrock on http://{args.host}:{args.port}  (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
@@ -0,0 +1,118 @@
+"""
+Requests/sec of the FastAPI app at several concurrency levels.
+
+Stdlib only (threads + keep-alive http.client), so it runs anywhere the app does:
+
+    python bench/http_concurrency.py --base-url http://localhost:8090 \
+        --path /clients --path "/transactions?limit=100" --concurrency 1,50,500
+
+Compare the psycopg2 pool (default) and the opt-in asyncpg path by restarting
+the app with DB_ASYNC=1 and running the same command.
+
+Measured 2026-10-18 (--duration 10, synthetic_data 10k preset, local Postgres 16,
+app, Postgres and this client on one CPU, default pool sizes):
+
+    path                     c    sync rps / p95            DB_ASYNC=1 rps / p95
+    /clients                 1    141.8 /    9.1 ms         112.2 /   11.6 ms
+    /clients                50    131.4 /  476 ms            89.8 /  747 ms
+    /clients               500    109.6 / 5122 ms           113.3 / 5846 ms  (308 errors)
+    /transactions?limit=100  1    287.7 /    4.2 ms         277.1 /    4.6 ms
+    /transactions?limit=100 50    287.4 /  253 ms           258.4 /  289 ms
+    /transactions?limit=100 500   265.2 / 2201 ms           279.0 / 5155 ms  (244 errors)
+
+On a single core the async path does not pay off: CPU, not connections, is
+the limit, which is why it is off by default. At 500 its errors are 503
+"Database busy" from pool checkouts waiting past PG_POOL_TIMEOUT (5 s); the
+threadpool path queues behind its 40 workers without a deadline instead.
+Re-measure on a multi-core host before turning DB_ASYNC on.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def _worker(host, port, paths, stop_at, out, lock):
+    """paths: GET paths, or (method, path, json_body) tuples."""
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    lat, errors, i = [], 0, 0
+    while time.perf_counter() < stop_at:
+        req = paths[i % len(paths)]
+        i += 1
+        method, path, body = ("GET", req, None) if isinstance(req, str) else req
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                errors += 1
+        except Exception:
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=120)
+            continue
+        lat.append(time.perf_counter() - t0)
+    conn.close()
+    with lock:
+        out["latencies"].extend(lat)
+        out["errors"] += errors
+
+
+def run_level(base_url, paths, concurrency, duration):
+    u = urlsplit(base_url)
+    out = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_worker, args=(u.hostname, u.port or 80, paths, stop_at, out, lock), daemon=True)
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    lat = sorted(out["latencies"])
+
+    def pct(p):
+        return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "errors": out["errors"],
+        "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.fmean(lat) * 1000, 2) if lat else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://localhost:8090")
+    ap.add_argument("--path", action="append", help="GET path, repeatable (default: /clients)")
+    ap.add_argument("--concurrency", default="1,50,500", help="comma-separated levels")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    ap.add_argument("--json", action="store_true", help="print one JSON object per level")
+    args = ap.parse_args()
+
+    paths = args.path or ["/clients"]
+    for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        res = run_level(args.base_url, paths, level, args.duration)
+        if args.json:
+            print(json.dumps(res))
+        else:
+            print(f"c={res['concurrency']:>4}  rps={res['rps']:>8}  p50={res['p50_ms']}ms  "
+                  f"p95={res['p95_ms']}ms  p99={res['p99_ms']}ms  errors={res['errors']}")
+
+
+if __name__ == "__main__":
+    main()
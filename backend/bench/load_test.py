@@ -0,0 +1,240 @@
+"""
+Offline load test of the FastAPI app: no AWS, a local Postgres, stored baselines.
+
+    python bench/load_test.py --seed --concurrency 1,20 --duration 15 --save-baseline laptop
+    python bench/load_test.py --concurrency 1,20 --duration 15 --compare laptop   # exit 1 on regression
+
+What it does:
+1. --seed: loads the 10k preset of bench/synthetic_data.py (POSTGRES_* env,
+   same as the app) unless clients already has --clients rows
+2. starts bench/fake_bedrock.py in-process (latency / token rate / canned router
+   JSON flags, see that file)
+3. starts `uvicorn main:app` from fastapi_web/ with BEDROCK_ENDPOINT_URL pointing
+   at the fake (or use --base-url for an app you started yourself; RSS is then
+   not measured). Extra app env: --app-env KEY=VALUE, repeatable.
+4. drives each scenario (/clients, /transactions, /prompt, /agent_chat,
+   /agent_chat_v2) at each concurrency level for --duration seconds
+5. reports p50/p95/p99, requests/s and errors per scenario and level, and the
+   app's peak RSS (VmHWM, Linux)
+
+Baselines are JSON files under bench/baselines/. --compare flags a scenario/level
+whose p95 rose or whose requests/s fell by more than --tolerance (default 15%).
+Compare runs made with the same flags on the same machine. laptop.json is the
+committed reference: the first command above, fake Bedrock defaults, local
+Postgres 16; re-save it on your own machine before comparing.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..", "fastapi_web")
+BASELINE_DIR = os.path.join(HERE, "baselines")
+
+sys.path.insert(0, HERE)
+import fake_bedrock  # noqa: E402
+import synthetic_data  # noqa: E402
+from http_concurrency import run_level  # noqa: E402
+
+
+def seed(min_clients: int) -> None:
+    """Loads the 10k synthetic_data preset unless there are already enough clients for the chat scenarios."""
+    sys.path.insert(0, APP_DIR)
+    import db  # the app's POSTGRES_* handling
+
+    conn = db.connect_unpooled()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM clients")
+            have = cur.fetchone()[0]
+        conn.commit()
+        if have >= min_clients:
+            print(f"seed: {have} clients already present")
+            return
+        synthetic_data.load(conn, preset=synthetic_data.PRESETS["10k"], seed=1,
+                            end_date=dt.date.fromisoformat(synthetic_data.DEFAULT_END_DATE), days=730)
+    finally:
+        conn.close()
+
+
+def scenarios(n_clients: int) -> Dict[str, List[Any]]:
+    """Request mix per scenario; ids rotate so per-client caches see realistic reuse."""
+    ids = range(1, n_clients + 1)
+    return {
+        "clients": ["/clients"],
+        "transactions": ["/transactions?limit=100"],
+        "prompt": [("POST", "/prompt", {"prompt": f"top {n} clients by income"}) for n in range(5, 55, 5)],
+        "agent_chat": [("POST", "/agent_chat", {"message": f"How is client {i} spending lately?"}) for i in ids],
+        "agent_chat_v2": [
+            ("POST", "/agent_chat_v2", {"message": m})
+            for i in ids
+            for m in (f"What should client {i} invest in?",              # fast router
+                      f"Give client {i} some advice for next year.")     # planner LLM
+        ],
+    }
+
+
+def _wait_healthy(base_url: str, proc: Optional[subprocess.Popen], timeout: float = 90.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"app exited with {proc.returncode} before becoming healthy")
+        try:
+            with urllib.request.urlopen(base_url + "/health", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except Exception:
+            time.sleep(0.5)
+    raise SystemExit(f"app not healthy at {base_url} after {timeout:.0f}s")
+
+
+def _rss_mb(pid: int, field: str) -> Optional[float]:
+    """VmRSS (current) or VmHWM (peak) from /proc; None off Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        return None
+    return None
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except Exception:
+        return None
+
+
+def load_baseline(name: str) -> Dict[str, Any]:
+    with open(os.path.join(BASELINE_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    base = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    for r in current["results"]:
+        b = base.get((r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+        where = f"{r['scenario']} c={r['concurrency']}"
+        if b["p95_ms"] and r["p95_ms"] and r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{where}: p95 {b['p95_ms']} -> {r['p95_ms']} ms")
+        if b["rps"] and r["rps"] < b["rps"] * (1 - tolerance):
+            regressions.append(f"{where}: rps {b['rps']} -> {r['rps']}")
+        if r["errors"] > b["errors"]:
+            regressions.append(f"{where}: errors {b['errors']} -> {r['errors']}")
+    b_rss, c_rss = baseline.get("peak_rss_mb"), current.get("peak_rss_mb")
+    if b_rss and c_rss and c_rss > b_rss * (1 + tolerance):
+        regressions.append(f"peak RSS {b_rss} -> {c_rss} MB")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seed", action="store_true", help="load the bench dataset first")
+    ap.add_argument("--base-url", help="use an already running app instead of starting one")
+    ap.add_argument("--app-port", type=int, default=8790)
+    ap.add_argument("--bedrock-port", type=int, default=8711)
+    ap.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra env for the app")
+    ap.add_argument("--scenario", action="append", help="run only these (repeatable)")
+    ap.add_argument("--concurrency", default="1,10", help="comma-separated levels")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and level")
+    ap.add_argument("--clients", type=int, default=50, help="client ids the chat scenarios rotate through")
+    ap.add_argument("--save-baseline", metavar="NAME")
+    ap.add_argument("--compare", metavar="NAME")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    fake_bedrock.add_arguments(ap)
+    args = ap.parse_args()
+
+    baseline = None
+    if args.compare:  # before the run: a typo should not cost a full run
+        try:
+            baseline = load_baseline(args.compare)
+        except (OSError, ValueError) as e:
+            sys.exit(f"--compare {args.compare}: cannot read baseline ({e}); "
+                     f"save one first with --save-baseline {args.compare}")
+
+    if args.seed:
+        seed(args.clients)
+
+    fake = fake_bedrock.from_args(args)
+    fake_srv = fake_bedrock.serve(fake, port=args.bedrock_port)
+
+    proc = None
+    base_url = args.base_url
+    if base_url is None:
+        env = dict(os.environ,
+                   BEDROCK_ENDPOINT_URL=f"http://127.0.0.1:{args.bedrock_port}",
+                   AWS_ACCESS_KEY_ID=os.environ.get("AWS_ACCESS_KEY_ID", "bench"),
+                   AWS_SECRET_ACCESS_KEY=os.environ.get("AWS_SECRET_ACCESS_KEY", "bench"))
+        env.update(kv.split("=", 1) for kv in args.app_env)
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.app_port)],
+            cwd=APP_DIR, env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.app_port}"
+
+    results = []
+    try:
+        _wait_healthy(base_url, proc)
+        mix = scenarios(args.clients)
+        for name in args.scenario or list(mix):
+            for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+                res = run_level(base_url, mix[name], level, args.duration)
+                res["scenario"] = name
+                res["rss_mb"] = _rss_mb(proc.pid, "VmRSS") if proc else None
+                results.append(res)
+                print(f"{name:<14} c={level:>4}  rps={res['rps']:>8}  p50={res['p50_ms']}ms  "
+                      f"p95={res['p95_ms']}ms  p99={res['p99_ms']}ms  errors={res['errors']}  rss={res['rss_mb']}MB")
+        if proc is not None and proc.poll() is not None:  # e.g. port taken: another app answered /health
+            raise SystemExit(f"app exited with {proc.returncode} during the run; results are not from it")
+        peak = _rss_mb(proc.pid, "VmHWM") if proc else None
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        fake_srv.shutdown()
+
+    report = {
+        "git": _git_rev(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"duration": args.duration, "concurrency": args.concurrency, "clients": args.clients,
+                     "latency_ms": args.latency_ms, "tokens_per_sec": args.tokens_per_sec,
+                     "answer_tokens": args.answer_tokens, "throttle_rate": args.throttle_rate,
+                     "app_env": args.app_env},
+        "fake_bedrock": fake.stats,
+        "peak_rss_mb": peak,
+        "results": results,
+    }
+    print(f"peak RSS: {peak} MB   fake Bedrock calls: {fake.stats}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved: {path}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        print(f"vs {args.compare} ({baseline.get('git')}), tolerance {args.tolerance:.0%}:")
+        for line in regressions or ["no regressions"]:
+            print("  " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
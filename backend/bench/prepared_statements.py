@@ -0,0 +1,147 @@
+"""
+Per-call cost of the /fn/transactions and /fn/risk queries: the old inlined
+f-string SQL against the parameterized builders run as prepared statements.
+
+Talks to Postgres directly (same POSTGRES_* env as the app) and reports, per
+variant, the wall time per call and the planning time Postgres reports in
+EXPLAIN (ANALYZE):
+
+    python bench/prepared_statements.py --client-id 1 --iterations 500
+
+Run it from a checkout where the app's requirements are installed; it imports
+the builders from fastapi_web/main.py.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fastapi_web"))
+
+import db  # noqa: E402
+from main import TxRequest, build_sql_client_risk, build_sql_client_transactions  # noqa: E402
+
+
+def legacy_transactions_sql(p: TxRequest) -> str:
+    """The builder as it was before parameterization: every request is a new SQL text."""
+    where = [f"t.client_id = {int(p.client_id)}"]
+    if p.date_from:
+        where.append(f"t.transaction_date >= '{p.date_from}'")
+    if p.date_to:
+        where.append(f"t.transaction_date <= '{p.date_to}'")
+    if p.category:
+        where.append(f"t.category ILIKE '%{p.category.replace(chr(39), chr(39) * 2)}%'")
+    if p.min_amount is not None:
+        where.append(f"t.amount >= {float(p.min_amount)}")
+    if p.max_amount is not None:
+        where.append(f"t.amount <= {float(p.max_amount)}")
+    return f"""
+    SELECT t.id, t.transaction_date, t.amount, t.category
+    FROM public.transactions t
+    WHERE {' AND '.join(where)}
+    ORDER BY t.transaction_date DESC, t.id DESC
+    LIMIT {int(p.limit)}
+    """
+
+
+def legacy_risk_sql(client_id: int) -> str:
+    return f"SELECT c.id AS client_id, c.name, c.risk_rating FROM public.clients c WHERE c.id = {int(client_id)} LIMIT 1"
+
+
+def _requests(client_id: int, n: int):
+    """Rotate through the request shapes the agent sends, with varying values."""
+    out = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            out.append(TxRequest(client_id=client_id, limit=50 + i % 5))
+        elif kind == 1:
+            out.append(TxRequest(client_id=client_id, date_from=f"2024-{1 + i % 12:02d}-01", limit=100))
+        else:
+            out.append(TxRequest(client_id=client_id, category="food" if i % 2 else "rent",
+                                 min_amount=float(i % 50), limit=100))
+    return out
+
+
+def _planning_ms(cur, sql, params=None) -> float:
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params or None)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0].get("Planning Time", 0.0))
+
+
+def run_legacy(conn, reqs, client_id):
+    lat, planning = [], []
+    with conn.cursor() as cur:
+        for p in reqs:
+            sql = legacy_transactions_sql(p)
+            t0 = time.perf_counter()
+            cur.execute(sql)
+            cur.fetchall()
+            cur.execute(legacy_risk_sql(client_id))
+            cur.fetchall()
+            lat.append(time.perf_counter() - t0)
+            planning.append(_planning_ms(cur, sql))
+    conn.rollback()
+    return lat, planning
+
+
+def run_prepared(conn, reqs, client_id):
+    lat, planning = [], []
+    risk = build_sql_client_risk(client_id)
+    with conn.cursor() as cur:
+        for p in reqs:
+            q = build_sql_client_transactions(p)
+            t0 = time.perf_counter()
+            db.execute_prepared(cur, q.name, q.sql, q.params)
+            cur.fetchall()
+            db.execute_prepared(cur, risk.name, risk.sql, risk.params)
+            cur.fetchall()
+            lat.append(time.perf_counter() - t0)
+            params = ", ".join(["%s"] * len(q.params))
+            planning.append(_planning_ms(cur, f"EXECUTE {q.name} ({params})", q.params))
+    conn.rollback()
+    return lat, planning
+
+
+def _summary(lat, planning):
+    lat_ms = sorted(x * 1000.0 for x in lat)
+    return {
+        "calls": len(lat_ms),
+        "mean_ms": round(statistics.mean(lat_ms), 3) if lat_ms else None,
+        "p50_ms": round(lat_ms[len(lat_ms) // 2], 3) if lat_ms else None,
+        "p95_ms": round(lat_ms[int(len(lat_ms) * 0.95) - 1], 3) if lat_ms else None,
+        "planning_mean_ms": round(statistics.mean(planning), 4) if planning else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--client-id", type=int, default=1)
+    ap.add_argument("--iterations", type=int, default=300)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    reqs = _requests(args.client_id, args.iterations)
+    results = {}
+    # one fresh connection per variant, so the prepared run starts with nothing cached
+    for name, fn in (("legacy", run_legacy), ("prepared", run_prepared)):
+        conn = db.connect_unpooled()
+        try:
+            results[name] = _summary(*fn(conn, reqs, args.client_id))
+        finally:
+            conn.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'variant':<10} {'calls':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'plan ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['calls']:>6} {r['mean_ms']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['planning_mean_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Synthetic clients / transactions / invesments at production-like volume.
+
+    python bench/synthetic_data.py --preset 1m --seed 7 --truncate
+    python bench/synthetic_data.py --preset 10k --out /tmp/finai10k    # TSV files only, no database
+
+Presets (transaction rows; clients and packages scale with them):
+
+    10k   ->   10 000 transactions,     250 clients,   30 packages
+    1m    ->    1 000 000 transactions,  25 000 clients,  300 packages
+    50m   ->   50 000 000 transactions, 1 000 000 clients, 3000 packages
+
+Distributions:
+- transactions per client are Pareto-skewed (a few heavy clients, a long tail
+  with a handful each), scaled so the total hits the preset
+- dates fall in the `--days` before `--end-date`, with more activity in
+  December and the summer; amounts follow the category, the client's income,
+  the same seasonality and a lognormal spread
+- categories follow a fixed mix (groceries most, investments least)
+- risk_rating is spread usor / mediu / ridicat ~ 45/40/15, shifted by age
+  (younger clients lean ridicat, older ones usor)
+
+The same --seed, preset, --end-date and --days give byte-identical rows.
+--end-date has a fixed default on purpose: "today" would break that.
+
+Rows go in with one COPY per table over a streamed buffer (no row lists in
+memory). Client ids are assigned explicitly after the current max(id), so
+the transactions can reference them in the same run; the sequences are moved
+past them afterwards. Unless --keep-triggers, the user triggers on
+transactions (rollups, client_changed NOTIFY) are disabled for the load and
+transaction_rollups is rebuilt from scratch afterwards. --rebuild-indexes
+(default for 50m) drops the secondary transaction indexes first and recreates
+them after the load, which is much faster than maintaining them row by row.
+The app's client cache is not notified; restart it after a load.
+
+Same POSTGRES_* env as the app.
+"""
+import argparse
+import datetime as dt
+import io
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "10k": {"transactions": 10_000, "clients": 250, "investments": 30, "rebuild_indexes": False},
+    "1m": {"transactions": 1_000_000, "clients": 25_000, "investments": 300, "rebuild_indexes": False},
+    "50m": {"transactions": 50_000_000, "clients": 1_000_000, "investments": 3000, "rebuild_indexes": True},
+}
+
+DEFAULT_END_DATE = "2026-09-30"
+
+# category -> (share of transactions, typical amount)
+CATEGORIES = {
+    "groceries": (0.28, 45.0),
+    "transport": (0.12, 20.0),
+    "dining": (0.12, 35.0),
+    "utilities": (0.09, 110.0),
+    "shopping": (0.10, 80.0),
+    "rent": (0.06, 650.0),
+    "entertainment": (0.08, 40.0),
+    "healthcare": (0.05, 70.0),
+    "travel": (0.05, 420.0),
+    "education": (0.03, 150.0),
+    "investments": (0.02, 900.0),
+}
+_CAT_NAMES = list(CATEGORIES)
+_CAT_CUM = list(itertools.accumulate(w for w, _ in CATEGORIES.values()))
+_CAT_BASE = [b for _, b in CATEGORIES.values()]
+
+# month (1-12) -> activity and amount multiplier
+SEASON = {1: 0.85, 2: 0.85, 3: 0.95, 4: 1.0, 5: 1.0, 6: 1.1, 7: 1.2, 8: 1.2, 9: 1.0, 10: 1.0, 11: 1.15, 12: 1.45}
+_TRAVEL_SUMMER = {6: 1.6, 7: 2.2, 8: 2.2, 12: 1.3}
+
+RISKS = ["usor", "mediu", "ridicat"]
+_RISK_WEIGHTS = {"young": (0.30, 0.45, 0.25), "mid": (0.45, 0.40, 0.15), "senior": (0.65, 0.30, 0.05)}
+
+FIRST_NAMES = ["Andrei", "Maria", "Ioana", "Alexandru", "Elena", "Mihai", "Ana", "Stefan", "Cristina", "Bogdan",
+               "Gabriela", "Vlad", "Raluca", "Adrian", "Diana", "Radu", "Irina", "Florin", "Simona", "Catalin"]
+LAST_NAMES = ["Popescu", "Ionescu", "Popa", "Dumitru", "Stan", "Stoica", "Gheorghe", "Rusu", "Munteanu", "Matei",
+              "Constantin", "Serban", "Marin", "Tudor", "Lazar", "Florea", "Dobre", "Barbu", "Nistor", "Ene"]
+CITIES = [("Bucuresti", "Bucuresti", 0.30), ("Cluj-Napoca", "Cluj", 0.12), ("Timisoara", "Timis", 0.09),
+          ("Iasi", "Iasi", 0.09), ("Constanta", "Constanta", 0.07), ("Brasov", "Brasov", 0.07),
+          ("Craiova", "Dolj", 0.06), ("Galati", "Galati", 0.05), ("Oradea", "Bihor", 0.05),
+          ("Sibiu", "Sibiu", 0.05), ("Ploiesti", "Prahova", 0.05)]
+_CITY_CUM = list(itertools.accumulate(w for _, _, w in CITIES))
+
+PACKAGES = {
+    "usor": ["Safety Net", "Capital Guard", "Money Market Plus", "Gov Bond Ladder", "Deposit Booster"],
+    "mediu": ["Core Balanced", "Income & Growth", "Dividend Mix", "Target Date", "Multi-Asset"],
+    "ridicat": ["Equity Growth", "Tech Leaders", "Emerging Markets", "Small Cap Momentum", "Thematic Innovation"],
+}
+_PACKAGE_MIX = {"usor": "Bonds {b}%, Equities {e}%, Cash {c}%", "mediu": "Bonds {b}%, Equities {e}%, Cash {c}%",
+                "ridicat": "Equities {e}%, Bonds {b}%, Cash {c}%"}
+_PACKAGE_EQUITY = {"usor": (5, 25), "mediu": (35, 60), "ridicat": (70, 95)}
+
+CLIENT_COLUMNS = ("id", "name", "age", "gender", "education_level", "marital_status", "income", "credit_score",
+                  "loan_amount", "loan_purpose", "employment_status", "years_at_current_job", "payment_history",
+                  "debt_to_income_ratio", "assets_value", "number_of_dependents", "city", "state", "country",
+                  "previous_defaults", "marital_status_change", "risk_rating")
+TRANSACTION_COLUMNS = ("client_id", "transaction_date", "amount", "category")
+INVESTMENT_COLUMNS = ("investment", "risk_score", "description")
+
+
+# ---------- row generators (TSV lines in COPY text format) ----------
+def client_rows(n: int, first_id: int, rng: random.Random, incomes: List[float]) -> Iterator[str]:
+    """Yields n client lines; appends each income to `incomes` (transaction amounts scale with it)."""
+    for i in range(n):
+        age = min(80, max(19, int(rng.gauss(42, 13))))
+        income = round(min(600_000.0, rng.lognormvariate(10.9, 0.55)), 2)
+        credit = min(850, max(300, int(rng.gauss(680, 70))))
+        dti = round(min(0.95, max(0.0, rng.gauss(0.32, 0.14))), 4)
+        band = "young" if age < 35 else "senior" if age >= 55 else "mid"
+        risk = rng.choices(RISKS, weights=_RISK_WEIGHTS[band])[0]
+        city, state, _ = rng.choices(CITIES, cum_weights=_CITY_CUM)[0]
+        has_loan = rng.random() < 0.45
+        defaults = 0 if credit > 620 else rng.choice((0, 0, 1, 1, 2))
+        incomes.append(income)
+        yield "\t".join((
+            str(first_id + i),
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            str(age),
+            rng.choice(("female", "male")),
+            rng.choices(("High School", "Bachelor", "Master", "PhD"), weights=(30, 45, 20, 5))[0],
+            rng.choices(("single", "married", "divorced", "widowed"), weights=(38, 48, 11, 3))[0],
+            f"{income:.2f}",
+            str(credit),
+            f"{rng.uniform(2_000, income * 2):.2f}" if has_loan else "0.00",
+            rng.choice(("home", "car", "education", "business", "personal")) if has_loan else "\\N",
+            rng.choices(("employed", "self-employed", "unemployed", "retired"),
+                        weights=(70, 14, 6, 10) if age < 62 else (10, 8, 2, 80))[0],
+            str(min(age - 18, int(rng.expovariate(1 / 5.0)))),
+            "poor" if defaults > 1 else rng.choices(("excellent", "good", "fair"), weights=(40, 45, 15))[0],
+            f"{dti:.4f}",
+            f"{income * rng.uniform(0.2, 6.0):.2f}",
+            str(rng.choices((0, 1, 2, 3, 4), weights=(40, 25, 22, 10, 3))[0]),
+            city,
+            state,
+            "Romania",
+            str(defaults),
+            str(int(rng.random() < 0.08)),
+            risk,
+        )) + "\n"
+
+
+def transactions_per_client(n_clients: int, total: int, rng: random.Random) -> List[int]:
+    """Pareto-skewed counts (>= 1 each) summing to `total`."""
+    weights = [min(rng.paretovariate(1.2) - 1.0, 200.0) for _ in range(n_clients)]  # Lomax: many near 0
+    spare = max(0, total - n_clients)
+    scale = spare / sum(weights)
+    counts = [1 + int(w * scale) for w in weights]
+    short = total - sum(counts)  # rounding leftovers go to the heaviest clients
+    for i in sorted(range(n_clients), key=weights.__getitem__, reverse=True)[:max(0, short)]:
+        counts[i] += 1
+    return counts
+
+
+def transaction_rows(first_id: int, counts: List[int], incomes: List[float], end_date: dt.date, days: int,
+                     rng: random.Random) -> Iterator[str]:
+    dates = [end_date - dt.timedelta(days=d) for d in range(days)]
+    date_text = [d.isoformat() for d in dates]
+    month = [d.month for d in dates]
+    season_max = max(SEASON.values())
+    for i, n in enumerate(counts):
+        client_id = str(first_id + i)
+        scale = (incomes[i] / 60_000.0) ** 0.5
+        cats = rng.choices(range(len(_CAT_NAMES)), cum_weights=_CAT_CUM, k=n)
+        for c in cats:
+            while True:  # seasonal activity: thin out the quiet months
+                d = rng.randrange(days)
+                if rng.random() * season_max < SEASON[month[d]]:
+                    break
+            m = month[d]
+            amount = _CAT_BASE[c] * scale * SEASON[m] * rng.lognormvariate(0.0, 0.5)
+            if c == 8:  # travel
+                amount *= _TRAVEL_SUMMER.get(m, 1.0)
+            yield f"{client_id}\t{date_text[d]}\t{amount:.2f}\t{_CAT_NAMES[c]}\n"
+
+
+def investment_rows(n: int, rng: random.Random) -> Iterator[str]:
+    for i in range(n):
+        risk = RISKS[i % 3]
+        stem = PACKAGES[risk][(i // 3) % len(PACKAGES[risk])]
+        lo, hi = _PACKAGE_EQUITY[risk]
+        e = rng.randint(lo, hi)
+        c = rng.randint(2, 10)
+        b = max(0, 100 - e - c)
+        fee = rng.uniform(0.2, 0.5) if risk == "usor" else rng.uniform(0.3, 0.7) if risk == "mediu" \
+            else rng.uniform(0.5, 1.2)
+        yield "\t".join((
+            f"{stem} {i // 15 + 1:04d}",
+            risk,
+            f"{_PACKAGE_MIX[risk].format(b=b, e=e, c=c)}; annual fee {fee:.2f}%",
+        )) + "\n"
+
+
+class LineStream(io.RawIOBase):
+    """File-like view over an iterator of text lines, for cursor.copy_expert (nothing is materialized)."""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buf = b""
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buf) < size:
+            batch = list(itertools.islice(self._lines, 4096))
+            if not batch:
+                break
+            self.rows += len(batch)
+            self._buf += "".join(batch).encode()
+        if size < 0:
+            out, self._buf = self._buf, b""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+
+# ---------- loading ----------
+ROLLUP_REBUILD_SQL = """
+TRUNCATE transaction_rollups;
+INSERT INTO transaction_rollups (client_id, month, category, total, tx_count)
+SELECT client_id, date_trunc('month', transaction_date)::date, COALESCE(category, ''), SUM(amount), COUNT(*)
+FROM transactions
+GROUP BY 1, 2, 3;
+"""
+
+
+def _copy(cur, table: str, columns: Sequence[str], lines: Iterator[str]) -> int:
+    stream = LineStream(lines)
+    started = time.monotonic()
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=1 << 20)
+    elapsed = time.monotonic() - started
+    print(f"  {table}: {stream.rows:,} rows in {elapsed:.1f}s ({stream.rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return stream.rows
+
+
+def _secondary_indexes(cur, table: str) -> List[tuple]:
+    cur.execute("""
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = 'public' AND i.tablename = %s
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+    """, (table,))
+    return cur.fetchall()
+
+
+def load(conn, *, preset: Dict[str, Any], seed: int, end_date: dt.date, days: int, truncate: bool = False,
+         keep_triggers: bool = False, rebuild_indexes: Optional[bool] = None) -> Dict[str, int]:
+    rebuild_indexes = preset["rebuild_indexes"] if rebuild_indexes is None else rebuild_indexes
+    out: Dict[str, int] = {}
+    with conn.cursor() as cur:
+        if truncate:
+            cur.execute("TRUNCATE transactions, transaction_rollups, clients, invesments RESTART IDENTITY")
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM clients")
+        first_id = cur.fetchone()[0] + 1
+        print(f"seed {seed}: clients from id {first_id}")
+
+        incomes: List[float] = []
+        out["clients"] = _copy(cur, "clients", CLIENT_COLUMNS,
+                               client_rows(preset["clients"], first_id, random.Random(f"{seed}:clients"), incomes))
+        cur.execute("SELECT setval(pg_get_serial_sequence('clients', 'id'), (SELECT MAX(id) FROM clients))")
+        out["invesments"] = _copy(cur, "invesments", INVESTMENT_COLUMNS,
+                                  investment_rows(preset["investments"], random.Random(f"{seed}:investments")))
+
+        dropped = _secondary_indexes(cur, "transactions") if rebuild_indexes else []
+        for name, _ in dropped:
+            cur.execute(f'DROP INDEX IF EXISTS public."{name}"')
+        if not keep_triggers:
+            cur.execute("ALTER TABLE transactions DISABLE TRIGGER USER")
+        tx_rng = random.Random(f"{seed}:transactions")
+        counts = transactions_per_client(preset["clients"], preset["transactions"], tx_rng)
+        out["transactions"] = _copy(cur, "transactions", TRANSACTION_COLUMNS,
+                                    transaction_rows(first_id, counts, incomes, end_date, days, tx_rng))
+        if not keep_triggers:
+            cur.execute("ALTER TABLE transactions ENABLE TRIGGER USER")
+            started = time.monotonic()
+            cur.execute(ROLLUP_REBUILD_SQL)
+            print(f"  transaction_rollups rebuilt in {time.monotonic() - started:.1f}s")
+        for name, indexdef in dropped:
+            started = time.monotonic()
+            cur.execute(indexdef)
+            print(f"  {name} rebuilt in {time.monotonic() - started:.1f}s")
+    conn.commit()
+
+    conn.autocommit = True  # VACUUM cannot run in a transaction
+    with conn.cursor() as cur:
+        cur.execute("VACUUM ANALYZE clients, transactions, transaction_rollups, invesments")
+    return out
+
+
+def write_files(out_dir: str, *, preset: Dict[str, Any], seed: int, end_date: dt.date, days: int) -> None:
+    """Same rows as load() on an empty database, as TSV files (COPY text format)."""
+    os.makedirs(out_dir, exist_ok=True)
+    incomes: List[float] = []
+    tx_rng = random.Random(f"{seed}:transactions")
+    streams = [
+        ("clients", lambda: client_rows(preset["clients"], 1, random.Random(f"{seed}:clients"), incomes)),
+        ("invesments", lambda: investment_rows(preset["investments"], random.Random(f"{seed}:investments"))),
+        ("transactions", lambda: transaction_rows(
+            1, transactions_per_client(preset["clients"], preset["transactions"], tx_rng), incomes, end_date,
+            days, tx_rng)),
+    ]
+    for table, make in streams:
+        path = os.path.join(out_dir, f"{table}.tsv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.writelines(make())
+        print(f"  {path}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="10k")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--end-date", default=DEFAULT_END_DATE, help="last transaction date (YYYY-MM-DD)")
+    ap.add_argument("--days", type=int, default=730, help="transaction history length")
+    ap.add_argument("--truncate", action="store_true", help="empty the tables first (ids restart at 1)")
+    ap.add_argument("--keep-triggers", action="store_true",
+                    help="load with the rollup / NOTIFY triggers on (slow; exercises the incremental path)")
+    ap.add_argument("--rebuild-indexes", action=argparse.BooleanOptionalAction, default=None,
+                    help="drop and recreate the secondary transaction indexes around the load")
+    ap.add_argument("--out", metavar="DIR", help="write TSV files instead of loading the database")
+    args = ap.parse_args()
+
+    preset = PRESETS[args.preset]
+    end_date = dt.date.fromisoformat(args.end_date)
+    started = time.monotonic()
+    if args.out:
+        write_files(args.out, preset=preset, seed=args.seed, end_date=end_date, days=args.days)
+    else:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fastapi_web"))
+        import db  # same POSTGRES_* env as the app
+
+        conn = db.connect_unpooled()
+        try:
+            load(conn, preset=preset, seed=args.seed, end_date=end_date, days=args.days, truncate=args.truncate,
+                 keep_triggers=args.keep_triggers, rebuild_indexes=args.rebuild_indexes)
+        finally:
+            conn.close()
+    print(f"done in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Cost-based admission control for LLM-generated SQL.
+
+_sanitize_sql only looks at the text; a cross join or an unindexed scan still
+runs until statement_timeout and holds a pooled connection. Before running a
+generated query, check() asks the planner (plain EXPLAIN, nothing executes)
+and decides:
+
+- allow:   estimated total cost <= max_cost and estimated rows <= max_rows
+- rewrite: too many rows, but the query wrapped as
+           SELECT * FROM (<sql>) AS admitted LIMIT row_cap
+           plans under max_cost: the wrapped SQL runs instead (this also caps
+           queries whose only LIMIT sits in a subquery)
+- reject:  still over max_cost; the reason names the estimate and the
+           sequential scans behind it, so the caller (or the LLM) can narrow
+           the query
+
+Verdicts are cached per SQL text with its literals (whitespace collapsed) and
+the schema version. A fingerprint without literals would be too coarse: "WHERE
+amount > 0" scans the table while "WHERE amount > 1000000" returns a few rows,
+so the estimate of one says nothing about the other. Repeated queries (the
+NL->SQL cache hands out the same text for the same prompt) still skip EXPLAIN.
+The cache TTL bounds how long a verdict outlives new indexes or fresh statistics.
+A query the planner rejects with an error is not cached: the caller surfaces
+the error as it would from execution.
+
+The explain callable runs `EXPLAIN (FORMAT JSON) <sql>` and returns the value
+of the single result cell (parsed JSON, a JSON string, or the row dict
+postgres-api /query returns); each service brings its own.
+"""
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import cache
+
+ALLOW, REWRITE, REJECT = "allow", "rewrite", "reject"
+
+
+class Verdict(NamedTuple):
+    action: str           # allow | rewrite | reject
+    sql: str              # what to run: the wrapped query for rewrite, the original otherwise
+    cost: float           # planner total cost of `sql` (of the original for reject)
+    rows: float           # planner row estimate of the same
+    reason: str = ""
+    cached: bool = False
+
+
+def plan_root(value: Any) -> Dict[str, Any]:
+    """Top "Plan" node from an EXPLAIN (FORMAT JSON) result cell, whatever the driver made of it."""
+    if isinstance(value, dict) and "QUERY PLAN" in value:  # postgres-api /query row
+        value = value["QUERY PLAN"]
+    if isinstance(value, (str, bytes)):  # asyncpg / text
+        value = json.loads(value)
+    if isinstance(value, list):
+        value = value[0]
+    return value["Plan"]
+
+
+def _seq_scans(node: Dict[str, Any], out: List[str]) -> List[str]:
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name"):
+        out.append(f"{node['Relation Name']} (~{int(node.get('Plan Rows', 0))} rows)")
+    for child in node.get("Plans") or []:
+        _seq_scans(child, out)
+    return out
+
+
+class AdmissionControl:
+    def __init__(self, explain: Callable[[str], Any], *, max_cost: float = 1_000_000.0, max_rows: float = 10_000.0,
+                 row_cap: int = 1000, verdicts=None, version: Callable[[], str] = lambda: ""):
+        self._explain = explain
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.row_cap = row_cap
+        self._verdicts = verdicts  # cache.make_cache(...) or None (explain every time)
+        self._version = version    # schema version: a changed shape drops old verdicts
+        self._lock = threading.Lock()
+        self._stats = {ALLOW: 0, REWRITE: 0, REJECT: 0, "explains": 0}
+
+    @classmethod
+    def from_env(cls, explain: Callable[[str], Any], *, version: Callable[[], str] = lambda: "") -> "AdmissionControl":
+        return cls(
+            explain,
+            max_cost=float(os.getenv("QUERY_MAX_COST", "1000000")),
+            max_rows=float(os.getenv("QUERY_MAX_ROWS", "10000")),
+            row_cap=int(os.getenv("QUERY_ROW_CAP", "1000")),
+            verdicts=cache.make_cache(os.getenv("QUERY_VERDICT_CACHE", "memory"),
+                                      max_entries=int(os.getenv("QUERY_VERDICT_MAX", "2048")),
+                                      ttl=float(os.getenv("QUERY_VERDICT_TTL", "600"))),
+            version=version,
+        )
+
+    def wrap(self, sql: str) -> str:
+        return f"SELECT * FROM ({sql.strip().rstrip(';').strip()}) AS admitted LIMIT {int(self.row_cap)}"
+
+    def _estimate(self, sql: str) -> Dict[str, Any]:
+        with self._lock:
+            self._stats["explains"] += 1
+        return plan_root(self._explain(f"EXPLAIN (FORMAT JSON) {sql}"))
+
+    def _decide(self, sql: str) -> Dict[str, Any]:
+        plan = self._estimate(sql)
+        cost, rows = float(plan.get("Total Cost", 0.0)), float(plan.get("Plan Rows", 0.0))
+        if cost <= self.max_cost and rows <= self.max_rows:
+            return {"action": ALLOW, "cost": cost, "rows": rows, "reason": ""}
+        if rows > self.max_rows:
+            capped = self._estimate(self.wrap(sql))
+            capped_cost = float(capped.get("Total Cost", 0.0))
+            if capped_cost <= self.max_cost:
+                return {"action": REWRITE, "cost": capped_cost, "rows": float(capped.get("Plan Rows", 0.0)),
+                        "reason": f"~{rows:.0f} rows estimated, capped at {self.row_cap}"}
+        scans = _seq_scans(plan, [])
+        reason = f"estimated cost {cost:.0f} exceeds {self.max_cost:.0f} (~{rows:.0f} rows)"
+        if scans:
+            reason += "; sequential scans on " + ", ".join(scans)
+        return {"action": REJECT, "cost": cost, "rows": rows, "reason": reason}
+
+    def check(self, sql: str) -> Verdict:
+        """Verdict for a sanitized SELECT/WITH. Errors from EXPLAIN propagate (the query would fail anyway)."""
+        key = json.dumps([" ".join(sql.split()).rstrip(";").rstrip(), self._version()])
+        decided = self._verdicts.get(key) if self._verdicts is not None else None
+        cached = decided is not None
+        if decided is None:
+            decided = self._decide(sql)
+            if self._verdicts is not None:
+                self._verdicts.set(key, decided)
+        with self._lock:
+            self._stats[decided["action"]] += 1
+        run = self.wrap(sql) if decided["action"] == REWRITE else sql
+        return Verdict(decided["action"], run, decided["cost"], decided["rows"], decided["reason"], cached)
+
+    def clear(self) -> None:
+        """Drop cached verdicts (new indexes, ANALYZE after a bulk load)."""
+        if self._verdicts is not None:
+            self._verdicts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out.update({"max_cost": self.max_cost, "max_rows": self.max_rows, "row_cap": self.row_cap,
+                    "verdict_cache": self._verdicts.stats() if self._verdicts is not None else {"enabled": False}})
+        return out
@@ -0,0 +1,202 @@
+"""
+Batch advice for a set of clients (the banker portal's "whole book" run).
+
+Instead of one /agent_chat_v2 round trip per client (planner + tools + answerer):
+- the plan is fixed (profile, recent transactions, packages for the client's
+  risk), so there is no planner call
+- profiles and transactions come from two set-based queries per chunk of
+  `chunk_size` clients (= ANY(array) and a LATERAL top-N per client on
+  transactions_client_date_id_idx)
+- answerer calls fan out over `workers` threads; the LLM gateway still caps
+  what actually reaches Bedrock
+- every finished client is upserted into app.client_advice right away: that
+  table is the checkpoint, and a resumed job skips clients already 'done'
+
+Job bookkeeping lives in app.advice_jobs / app.client_advice (init.sql).
+The per-client answer is produced by the `advise` callback (main.advise_client).
+
+CLI (same env as the API):
+    python batch_advice.py [--clients 1,2,3] [--resume JOB_ID] [--workers N]
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+ALL_CLIENTS_SQL = "SELECT id FROM public.clients ORDER BY id"
+
+PROFILES_SQL = """
+SELECT id AS client_id, name, risk_rating
+FROM public.clients
+WHERE id = ANY(%s::int[])
+""".strip()
+
+TRANSACTIONS_SQL = """
+SELECT c.id AS client_id, t.transaction_date, t.amount, t.category
+FROM unnest(%s::int[]) AS c(id)
+CROSS JOIN LATERAL (
+    SELECT transaction_date, amount, category
+    FROM public.transactions
+    WHERE client_id = c.id
+    ORDER BY transaction_date DESC, id DESC
+    LIMIT %s
+) t
+ORDER BY c.id
+""".strip()
+
+# (client_id, profile row or None, transaction rows newest first) -> advice text
+Advise = Callable[[int, Optional[Dict[str, Any]], List[Dict[str, Any]]], str]
+
+
+class BatchAdvisor:
+    def __init__(self, connection: Callable[[], Any], advise: Advise, *, workers: int = 4,
+                 chunk_size: int = 100, tx_per_client: int = 20):
+        self._connection = connection  # db.connection
+        self.advise = advise
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.tx_per_client = tx_per_client
+        self._lock = threading.Lock()
+        self._runs: Dict[str, Dict[str, Any]] = {}  # job_id -> live counters of the run in this process
+
+    # ---------- SQL ----------
+    def _fetch(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+
+    def _save(self, job_id: str, client_id: int, advice: Optional[str], error: Optional[str]) -> None:
+        self._execute("""
+            INSERT INTO app.client_advice (job_id, client_id, status, advice, error)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (job_id, client_id) DO UPDATE
+            SET status = EXCLUDED.status, advice = EXCLUDED.advice, error = EXCLUDED.error, created_at = now()
+        """, (job_id, client_id, "error" if error else "done", advice, error))
+
+    # ---------- jobs ----------
+    def create_job(self, client_ids: Optional[List[int]] = None) -> str:
+        """client_ids=None -> every client."""
+        if client_ids is None:
+            client_ids = [r["id"] for r in self._fetch(ALL_CLIENTS_SQL)]
+        job_id = uuid.uuid4().hex[:12]
+        self._execute("INSERT INTO app.advice_jobs (job_id, client_ids, status) VALUES (%s, %s::int[], 'pending')",
+                      (job_id, sorted(set(int(c) for c in client_ids))))
+        return job_id
+
+    def pending_clients(self, job_id: str) -> List[int]:
+        rows = self._fetch("""
+            SELECT c AS client_id
+            FROM app.advice_jobs j, unnest(j.client_ids) AS c
+            WHERE j.job_id = %s
+              AND NOT EXISTS (SELECT 1 FROM app.client_advice a
+                              WHERE a.job_id = j.job_id AND a.client_id = c AND a.status = 'done')
+            ORDER BY c
+        """, (job_id,))
+        return [r["client_id"] for r in rows]
+
+    def is_running(self, job_id: str) -> bool:
+        with self._lock:
+            return self._runs.get(job_id, {}).get("running", False)
+
+    def run(self, job_id: str) -> Dict[str, Any]:
+        """Runs (or resumes) a job to the end; clients already 'done' are skipped, failed ones retried."""
+        with self._lock:
+            if self._runs.get(job_id, {}).get("running"):
+                raise RuntimeError(f"job {job_id} is already running")
+            live = self._runs[job_id] = {"running": True, "done": 0, "errors": 0, "started": time.monotonic()}
+        try:
+            todo = self.pending_clients(job_id)
+            self._execute("UPDATE app.advice_jobs SET status = 'running', started_at = now(), finished_at = NULL"
+                          " WHERE job_id = %s", (job_id,))
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="advice") as pool:
+                for start in range(0, len(todo), self.chunk_size):
+                    chunk = todo[start:start + self.chunk_size]
+                    profiles = {r["client_id"]: r for r in self._fetch(PROFILES_SQL, (chunk,))}
+                    txs: Dict[int, List[Dict[str, Any]]] = {}
+                    for r in self._fetch(TRANSACTIONS_SQL, (chunk, self.tx_per_client)):
+                        txs.setdefault(r.pop("client_id"), []).append(r)
+                    futures = {pool.submit(self.advise, cid, profiles.get(cid), txs.get(cid, [])): cid for cid in chunk}
+                    for fut in as_completed(futures):
+                        cid = futures[fut]
+                        try:
+                            advice, error = fut.result(), None
+                        except Exception as e:
+                            advice, error = None, str(e)
+                        self._save(job_id, cid, advice, error)
+                        with self._lock:
+                            live["errors" if error else "done"] += 1
+            status = "failed" if live["errors"] else "done"
+        except Exception:
+            status = "failed"
+            raise
+        finally:
+            with self._lock:
+                live["running"] = False
+                live["elapsed"] = time.monotonic() - live["started"]
+            try:
+                self._execute("UPDATE app.advice_jobs SET status = %s, finished_at = now() WHERE job_id = %s",
+                              (status, job_id))
+            except Exception:
+                pass
+        return self.progress(job_id)
+
+    def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._fetch("""
+            SELECT j.status, cardinality(j.client_ids) AS total, j.created_at, j.started_at, j.finished_at,
+                   COUNT(*) FILTER (WHERE a.status = 'done')  AS done,
+                   COUNT(*) FILTER (WHERE a.status = 'error') AS errors
+            FROM app.advice_jobs j
+            LEFT JOIN app.client_advice a ON a.job_id = j.job_id
+            WHERE j.job_id = %s
+            GROUP BY j.job_id
+        """, (job_id,))
+        if not rows:
+            return None
+        out = rows[0]
+        with self._lock:
+            live = dict(self._runs.get(job_id, {}))
+        if live:
+            elapsed = live.get("elapsed", time.monotonic() - live["started"])
+            finished = live["done"] + live["errors"]
+            out["run"] = {
+                "running": live["running"],
+                "processed": finished,
+                "elapsed_s": round(elapsed, 3),
+                "clients_per_minute": round(finished / elapsed * 60.0, 2) if elapsed > 0 else 0.0,
+            }
+        out["job_id"] = job_id
+        return out
+
+    def results(self, job_id: str, *, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        return self._fetch("""
+            SELECT client_id, status, advice, error, created_at
+            FROM app.client_advice
+            WHERE job_id = %s
+            ORDER BY client_id
+            LIMIT %s OFFSET %s
+        """, (job_id, limit, offset))
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    import main  # the API module: pool, gateway, answerer prompt
+
+    p = argparse.ArgumentParser(description="Generate advice for a set of clients (resumable).")
+    p.add_argument("--clients", help="comma-separated client ids (default: every client)")
+    p.add_argument("--resume", metavar="JOB_ID", help="continue an existing job")
+    p.add_argument("--workers", type=int, default=main.ADVICE_BATCH.workers)
+    args = p.parse_args()
+
+    main.ADVICE_BATCH.workers = args.workers
+    job = args.resume or main.ADVICE_BATCH.create_job(
+        [int(c) for c in args.clients.split(",")] if args.clients else None)
+    print(f"job {job}")
+    print(json.dumps(main.ADVICE_BATCH.run(job), default=str, indent=2))
@@ -0,0 +1,182 @@
+"""
+Small key/value caches with TTL + LRU eviction and hit/miss counters.
+
+- MemoryCache: per-process, OrderedDict-based.
+- SQLiteCache: local file, survives restarts and is shared by every worker on
+  the host (WAL mode). Values must be JSON-serializable.
+
+Both expose get/set/delete/clear/stats, so callers pick one with
+`make_cache(kind, ...)` and never care which backend they got.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+_MISSING = object()
+
+
+class _Counters:
+    def __init__(self):
+        self._counter_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += n
+
+    def _counter_stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            out = dict(self._counters)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+
+class MemoryCache(_Counters):
+    def __init__(self, *, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] is not None and item[0] < time.monotonic():
+                del self._data[key]
+                self._count("expired")
+                item = _MISSING
+            if item is _MISSING:
+                self._count("misses")
+                return default
+            self._data.move_to_end(key)
+        self._count("hits")
+        return item[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            victims = [k for k in self._data if k.startswith(prefix)]
+            for k in victims:
+                del self._data[k]
+        return len(victims)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        out = self._counter_stats()
+        with self._lock:
+            out.update({"backend": "memory", "entries": len(self._data), "max_entries": self.max_entries, "ttl_s": self.ttl})
+        return out
+
+
+class SQLiteCache(_Counters):
+    def __init__(self, path: str, *, max_entries: int = 10000, ttl: Optional[float] = 86400.0):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_used_idx ON cache (last_used)")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._count("expired")
+                row = None
+            if row is None:
+                self._count("misses")
+                return default
+            self._db.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None, now),
+            )
+            cur = self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            evicted = cur.rowcount or 0
+        self._count("sets")
+        if evicted > 0:
+            self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str) -> int:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._lock:
+            cur = self._db.execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+        return cur.rowcount or 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        out = self._counter_stats()
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        out.update({"backend": "sqlite", "path": self.path, "entries": entries,
+                    "max_entries": self.max_entries, "ttl_s": self.ttl})
+        return out
+
+
+def make_cache(kind: str, *, path: Optional[str] = None, max_entries: int = 1024,
+               ttl: Optional[float] = 3600.0):
+    """kind: 'memory' | 'sqlite' | 'off' (returns None)."""
+    kind = (kind or "memory").lower()
+    if kind in ("off", "none", "0", "false"):
+        return None
+    if kind == "sqlite":
+        return SQLiteCache(path or "cache.sqlite3", max_entries=max_entries, ttl=ttl)
+    return MemoryCache(max_entries=max_entries, ttl=ttl)
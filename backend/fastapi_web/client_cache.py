@@ -0,0 +1,92 @@
+"""
+Per-client read-through cache for client profile / transaction lookups.
+
+Used by the agent tools (database_info, transaction_history) and by
+/fn/transactions and /fn/risk. Entries are keyed by client id, lookup kind and
+the lookup arguments:
+
+    client:<id>:<kind>:<sha1(args)>
+
+so everything cached for one client is dropped with a single prefix delete.
+Invalidation comes from the `client_changed` NOTIFY channel (triggers on
+clients / transactions in init.sql), delivered by pg_listen.ChannelListener.
+
+A per-client generation counter guards against a load that started before an
+invalidation storing its (stale) result after it.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cache import MemoryCache
+
+CLIENT_CHANNEL = "client_changed"
+
+_MISSING = object()
+
+
+class ClientCache:
+    def __init__(self, *, max_entries: int = 2048, ttl: Optional[float] = 300.0):
+        self._cache = MemoryCache(max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self._global_generation = 0
+        self._stats = {"invalidations": 0, "invalidated_entries": 0, "flushes": 0, "stale_loads_dropped": 0}
+
+    @staticmethod
+    def _prefix(client_id: Any) -> str:
+        return f"client:{client_id}:"
+
+    def _key(self, client_id: Any, kind: str, args: Any) -> str:
+        digest = hashlib.sha1(json.dumps(args, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return f"{self._prefix(client_id)}{kind}:{digest}"
+
+    def _generation(self, client_id: Any) -> Tuple[int, int]:
+        with self._lock:
+            return self._global_generation, self._generations.get(str(client_id), 0)
+
+    def get_or_load(self, client_id: Any, kind: str, args: Any, load: Callable[[], Any]) -> Tuple[Any, str]:
+        """Returns (value, status) with status HIT | MISS. Cached values are shared: do not mutate them."""
+        key = self._key(client_id, kind, args)
+        value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value, "HIT"
+        gen = self._generation(client_id)
+        value = load()
+        if self._generation(client_id) == gen:
+            self._cache.set(key, value)
+        else:
+            with self._lock:
+                self._stats["stale_loads_dropped"] += 1
+        return value, "MISS"
+
+    def invalidate(self, client_id: Any) -> int:
+        with self._lock:
+            cid = str(client_id)
+            self._generations[cid] = self._generations.get(cid, 0) + 1
+            self._stats["invalidations"] += 1
+        dropped = self._cache.delete_prefix(self._prefix(client_id))
+        with self._lock:
+            self._stats["invalidated_entries"] += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._global_generation += 1
+            self._generations.clear()
+            self._stats["flushes"] += 1
+        self._cache.clear()
+
+    def on_notify(self, payload: Optional[str]) -> None:
+        """client_changed handler: payload is a client id; None (listener reconnect) flushes everything."""
+        if payload:
+            self.invalidate(payload.strip())
+        else:
+            self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        out = self._cache.stats()
+        with self._lock:
+            out.update(self._stats)
+        return out
@@ -0,0 +1,323 @@
+"""
+Compact, opt-in encodings for bulk row results, built straight from cursor tuples.
+
+Clients opt in with the Accept header; anything else keeps the default
+list-of-objects JSON:
+
+    application/vnd.finai.columnar+json  {"columns": [...], "rows": [[...], ...]}
+    application/x-msgpack                same layout, MessagePack (needs `msgpack`)
+    application/vnd.apache.arrow.stream  Arrow IPC stream (needs `pyarrow`)
+
+Framework-agnostic (returns bytes) so both the FastAPI app and the Flask
+/query service use it.
+
+Arrow streams are typed up front from the cursor description (arrow_schema):
+every later batch must fit the schema written with the first one, and a
+response that fails mid-body has already sent its 200. A whole body (encode)
+is a single batch, so its types are inferred from all rows at once.
+"""
+import io
+import json
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional
+    pa = None
+
+COLUMNAR_JSON = "application/vnd.finai.columnar+json"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+FORMATS = (COLUMNAR_JSON, MSGPACK, ARROW)
+
+
+class UnsupportedFormat(Exception):
+    """The requested format needs an optional dependency that is not installed."""
+
+
+def json_default(o: Any) -> Any:
+    """json.dumps fallback matching FastAPI's encoding of DB values."""
+    if isinstance(o, (date, datetime, dtime)):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """Return the first compact format named in `accept`, or None for the default JSON."""
+    if not accept:
+        return None
+    for part in accept.split(","):
+        media = part.split(";", 1)[0].strip().lower()
+        if media in FORMATS:
+            return media
+    return None
+
+
+def available(fmt: str) -> bool:
+    if fmt == MSGPACK:
+        return msgpack is not None
+    if fmt == ARROW:
+        return pa is not None
+    return fmt == COLUMNAR_JSON
+
+
+def _require(fmt: str) -> None:
+    if not available(fmt):
+        raise UnsupportedFormat(f"{fmt} is not available on this server")
+
+
+def _msgpack_default(o: Any) -> Any:
+    return json_default(o)
+
+
+# Postgres type OIDs -> Arrow; anything not listed is sent as its text form
+_PG_ARROW = {
+    16: "bool_", 20: "int64", 21: "int16", 23: "int32", 26: "int64",
+    700: "float32", 701: "float64", 17: "binary",
+    1082: "date32", 1083: "time64_us", 1114: "timestamp_us", 1184: "timestamptz_us",
+}
+_PG_NUMERIC = 1700
+
+
+def _arrow_type(name: str):
+    if name == "time64_us":
+        return pa.time64("us")
+    if name == "timestamp_us":
+        return pa.timestamp("us")
+    if name == "timestamptz_us":
+        return pa.timestamp("us", tz="UTC")
+    return getattr(pa, name)()
+
+
+def arrow_schema(description: Sequence[Any]):
+    """
+    Nullable Arrow fields from a psycopg2 cursor.description or asyncpg attributes.
+    NUMERIC(p,s) -> decimal128(p,s); unconstrained numeric (and asyncpg, which does
+    not expose the typmod) -> float64, like the JSON encoding.
+    """
+    fields = []
+    for col in description:
+        oid = getattr(col, "type_code", None)
+        if oid is None:  # asyncpg Attribute(name, type)
+            oid = col.type.oid
+        precision, scale = getattr(col, "precision", None), getattr(col, "scale", None)
+        if oid == _PG_NUMERIC:
+            if precision and precision <= 38 and scale is not None and scale <= precision:
+                t = pa.decimal128(precision, scale)
+            else:
+                t = pa.float64()
+        elif oid in _PG_ARROW:
+            t = _arrow_type(_PG_ARROW[oid])
+        else:
+            t = pa.string()
+        fields.append(pa.field(col.name, t, nullable=True))
+    return pa.schema(fields)
+
+
+def _to_text(v: Any) -> Any:
+    if v is None or isinstance(v, str):
+        return v
+    if isinstance(v, (dict, list)):  # json / jsonb / arrays
+        return json.dumps(v, default=json_default)
+    return str(v)
+
+
+def _arrow_values(t, values: List[Any]) -> List[Any]:
+    if pa.types.is_floating(t):
+        return [None if v is None else float(v) for v in values]
+    if pa.types.is_string(t):
+        return [_to_text(v) for v in values]
+    if pa.types.is_binary(t):
+        return [None if v is None else bytes(v) for v in values]
+    return values
+
+
+def _arrow_batch(columns: Sequence[str], rows: Sequence[Sequence[Any]], schema=None):
+    if schema is not None:
+        arrays = [pa.array(_arrow_values(f.type, [r[i] for r in rows]), type=f.type) for i, f in enumerate(schema)]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+    arrays = {c: [r[i] for r in rows] for i, c in enumerate(columns)}
+    batch = pa.RecordBatch.from_pydict(arrays)
+    # an all-NULL first batch would pin the column to the null type; widen to string
+    if any(pa.types.is_null(f.type) for f in batch.schema):
+        fields = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in batch.schema]
+        batch = pa.RecordBatch.from_pydict(arrays, schema=pa.schema(fields))
+    return batch
+
+
+def encode(fmt: str, columns: Sequence[str], rows: Sequence[Sequence[Any]],
+           extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """Whole result in one body. `extra` keys (e.g. next_cursor, sql) ride along (Arrow: schema metadata)."""
+    _require(fmt)
+    if fmt == ARROW:
+        batch = _arrow_batch(columns, rows)
+        if extra:
+            batch = batch.replace_schema_metadata({k: json.dumps(v, default=json_default) for k, v in extra.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+    body = {"columns": list(columns), "rows": [list(r) for r in rows]}
+    if extra:
+        body.update(extra)
+    if fmt == MSGPACK:
+        return msgpack.packb(body, default=_msgpack_default, use_bin_type=True)
+    return json.dumps(body, default=json_default, separators=(",", ":")).encode()
+
+
+# -----------------------------------------------------
+# Chunked encoders for server-side cursors: start(), batch(rows) per fetch, finish()
+# -----------------------------------------------------
+NDJSON = "application/x-ndjson"
+JSON = "application/json"
+
+
+class _StreamEncoder:
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+
+    def start(self) -> bytes:
+        return b""
+
+    def batch(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _JsonObjectsEncoder(_StreamEncoder):
+    """Default layout: one JSON array of row objects."""
+
+    def __init__(self, columns):
+        super().__init__(columns)
+        self._first = True
+
+    def start(self) -> bytes:
+        return b"["
+
+    def batch(self, rows) -> bytes:
+        if not rows:
+            return b""
+        body = ",".join(json.dumps(dict(zip(self.columns, r)), default=json_default) for r in rows)
+        out, self._first = (body if self._first else "," + body), False
+        return out.encode()
+
+    def finish(self) -> bytes:
+        return b"]"
+
+
+class _NdjsonEncoder(_StreamEncoder):
+    def batch(self, rows) -> bytes:
+        return "".join(json.dumps(dict(zip(self.columns, r)), default=json_default) + "\n" for r in rows).encode()
+
+
+class _ColumnarJsonEncoder(_JsonObjectsEncoder):
+    """{"columns": [...], "rows": [[...]]} written incrementally."""
+
+    def start(self) -> bytes:
+        return ('{"columns":' + json.dumps(self.columns) + ',"rows":[').encode()
+
+    def batch(self, rows) -> bytes:
+        if not rows:
+            return b""
+        body = ",".join(json.dumps(list(r), default=json_default, separators=(",", ":")) for r in rows)
+        out, self._first = (body if self._first else "," + body), False
+        return out.encode()
+
+    def finish(self) -> bytes:
+        return b"]}"
+
+
+class _MsgpackEncoder(_StreamEncoder):
+    """A stream of MessagePack objects: the column list first, then one list of rows per batch."""
+
+    def start(self) -> bytes:
+        return msgpack.packb(self.columns, use_bin_type=True)
+
+    def batch(self, rows) -> bytes:
+        return msgpack.packb([list(r) for r in rows], default=_msgpack_default, use_bin_type=True)
+
+
+class _ArrowEncoder(_StreamEncoder):
+    """One IPC record batch per chunk, all under the schema built from the cursor description."""
+
+    def __init__(self, columns, description=None):
+        super().__init__(columns)
+        if description is None:
+            raise ValueError("an Arrow stream needs the cursor description to type its schema")
+        self._schema = arrow_schema(description)
+        self._sink = _ChunkSink()
+        self._writer = None
+
+    def start(self) -> bytes:
+        self._writer = pa.ipc.new_stream(self._sink, self._schema)
+        return self._sink.take()
+
+    def batch(self, rows) -> bytes:
+        if not rows:
+            return b""
+        self._writer.write_batch(_arrow_batch(self.columns, rows, self._schema))
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.take()
+
+
+_STREAM_ENCODERS = {
+    JSON: _JsonObjectsEncoder,
+    NDJSON: _NdjsonEncoder,
+    COLUMNAR_JSON: _ColumnarJsonEncoder,
+    MSGPACK: _MsgpackEncoder,
+}
+
+
+def stream_encoder(fmt: str, columns: Sequence[str], description: Optional[Sequence[Any]] = None) -> _StreamEncoder:
+    """
+    fmt: one of FORMATS, or JSON / NDJSON for the row-object layouts.
+    description: cursor.description (psycopg2) or asyncpg attributes; required for ARROW.
+    """
+    if fmt in FORMATS:
+        _require(fmt)
+    if fmt == ARROW:
+        return _ArrowEncoder(columns, description)
+    return _STREAM_ENCODERS[fmt](columns)
+
+
+def encode_stream(fmt: str, columns: Sequence[str], batches: Iterable[Sequence[Sequence[Any]]],
+                  description: Optional[Sequence[Any]] = None) -> Iterator[bytes]:
+    enc = stream_encoder(fmt, columns, description)
+    yield enc.start()
+    for rows in batches:
+        yield enc.batch(rows)
+    yield enc.finish()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object for the Arrow stream writer; take() hands out what was written since."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
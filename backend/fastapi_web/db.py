@@ -0,0 +1,384 @@
+"""
+Shared PostgreSQL connection pool for the FastAPI entry points.
+
+One process-wide `PgPool` is created at import time (lazy: no sockets are opened
+until `open()` or the first checkout) and is opened/closed by the app's
+startup/shutdown hooks. Handlers borrow connections with:
+
+    with db.connection() as conn, conn.cursor() as cur:
+        ...
+
+The block commits on success, rolls back on error and always returns the
+connection to the pool.
+"""
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+import tracing
+
+log = logging.getLogger("db")
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements were PREPAREd on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set = set()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within `wait_timeout` seconds."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def conn_kwargs_from_env(default_host: str = "postgres") -> Dict[str, Any]:
+    return {
+        "dbname": os.getenv("POSTGRES_DB", "skepyadb"),
+        "user": os.getenv("POSTGRES_USER", "admin"),
+        "password": os.getenv("POSTGRES_PASSWORD", "Paroladb"),
+        "host": os.getenv("POSTGRES_HOST", default_host),
+        "port": os.getenv("POSTGRES_PORT", "5432"),
+        "connect_timeout": _env_int("PG_CONNECT_TIMEOUT", 5),
+    }
+
+
+class PgPool:
+    """
+    Bounded, thread-safe psycopg2 pool.
+    - min_size connections are kept warm, never more than max_size are open.
+    - Idle connections older than `health_check_after` seconds are pinged before reuse.
+    - Idle connections above min_size are reaped after `max_idle` seconds.
+    - Checkout blocks up to `wait_timeout` seconds, then raises PoolTimeout.
+    """
+
+    def __init__(
+        self,
+        conn_kwargs: Optional[Dict[str, Any]] = None,
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        wait_timeout: float = 5.0,
+        max_idle: float = 300.0,
+        health_check_after: float = 30.0,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"invalid pool bounds min={min_size} max={max_size}")
+        self.conn_kwargs = conn_kwargs or conn_kwargs_from_env()
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[Any, float]] = []  # (conn, returned_at), most recent last
+        self._size = 0  # open connections (idle + in use + being created)
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "connects": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "reaped": 0,
+            "discarded": 0,
+            "resets": 0,
+            "wait_time_total_ms": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls, default_host: str = "postgres") -> "PgPool":
+        return cls(
+            conn_kwargs_from_env(default_host),
+            min_size=_env_int("PG_POOL_MIN", 1),
+            max_size=_env_int("PG_POOL_MAX", 10),
+            wait_timeout=_env_float("PG_POOL_TIMEOUT", 5.0),
+            max_idle=_env_float("PG_POOL_MAX_IDLE", 300.0),
+            health_check_after=_env_float("PG_POOL_HEALTHCHECK", 30.0),
+        )
+
+    # ---------- lifecycle ----------
+    def open(self) -> None:
+        """Pre-fill min_size connections. A down database is logged, not fatal."""
+        with self._cond:
+            self._closed = False
+        try:
+            warm = []
+            for _ in range(self.min_size):
+                warm.append(self._checkout())
+            for conn in warm:
+                self._checkin(conn)
+        except Exception as e:
+            log.warning("db pool prefill failed: %s", e)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._safe_close(conn)
+
+    # ---------- public API ----------
+    @contextmanager
+    def connection(self, reset: bool = False) -> Iterator[Any]:
+        """
+        reset=True for connections that run caller-supplied SQL: session state it
+        may leave behind (SET, temp tables, LISTEN, prepared statements) is dropped
+        with DISCARD ALL before the connection goes back to the pool.
+        """
+        with tracing.span("db.connect"):  # pool wait + (re)connect + health check
+            conn = self._checkout()
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            raise
+        finally:
+            if reset and not self._reset_session(conn):
+                self._discard(conn)
+            else:
+                self._checkin(conn)
+
+    def reap(self) -> int:
+        """Close idle connections above min_size that sat unused longer than max_idle."""
+        now = time.monotonic()
+        victims = []
+        with self._cond:
+            keep = []
+            # oldest first, so the warmest connections survive
+            for conn, ts in self._idle:
+                if self._size - len(victims) > self.min_size and now - ts > self.max_idle:
+                    victims.append(conn)
+                else:
+                    keep.append((conn, ts))
+            self._idle = keep
+            self._size -= len(victims)
+            self._stats["reaped"] += len(victims)
+            if victims:
+                self._cond.notify_all()
+        for conn in victims:
+            self._safe_close(conn)
+        return len(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "closed": self._closed,
+            })
+        out["wait_time_total_ms"] = round(out["wait_time_total_ms"], 3)
+        return out
+
+    # ---------- internals ----------
+    def _connect(self) -> Any:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.conn_kwargs)
+        with self._cond:
+            self._stats["connects"] += 1
+        return conn
+
+    def _healthy(self, conn: Any, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _checkout(self) -> Any:
+        self.reap()
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+                if self._idle:
+                    conn, ts = self._idle.pop()
+                    reuse = True
+                elif self._size < self.max_size:
+                    self._size += 1  # reserve the slot before connecting outside the lock
+                    reuse = False
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no database connection available within {self.wait_timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            if reuse:
+                if self._healthy(conn, time.monotonic() - ts):
+                    break
+                self._discard(conn)
+                continue
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            break
+
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["wait_time_total_ms"] += (time.monotonic() - started) * 1000.0
+        return conn
+
+    def _reset_session(self, conn: Any) -> bool:
+        """DISCARD ALL (outside a transaction); False when the connection is unusable."""
+        if conn.closed:
+            return False
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("DISCARD ALL")
+            finally:
+                conn.autocommit = False
+            conn.prepared.clear()
+            with self._cond:
+                self._stats["resets"] += 1
+            return True
+        except Exception:
+            return False
+
+    def _checkin(self, conn: Any) -> None:
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                close_now = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                close_now = False
+            self._cond.notify()
+        if close_now:
+            self._safe_close(conn)
+
+    def _discard(self, conn: Any) -> None:
+        with self._cond:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+        self._safe_close(conn)
+
+    @staticmethod
+    def _safe_close(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# -----------------------------------------------------
+# Process-wide pool
+# -----------------------------------------------------
+pool = PgPool.from_env()
+
+
+def connection(reset: bool = False):
+    """Borrow a pooled connection: `with db.connection() as conn: ...` (reset: see PgPool.connection)."""
+    return pool.connection(reset)
+
+
+def connect_unpooled() -> Any:
+    """Dedicated connection outside the pool (LISTEN, benchmarks); the caller closes it."""
+    return psycopg2.connect(connection_factory=PooledConnection, **conn_kwargs_from_env())
+
+
+# -----------------------------------------------------
+# Server-side prepared statements (parsed/planned once per pooled connection)
+# -----------------------------------------------------
+def to_dollar_params(sql: str, n_params: int) -> str:
+    """'a = %s AND b = %s' -> 'a = $1 AND b = $2' (only when there are params to bind)."""
+    if not n_params:
+        return sql
+    parts = sql.split("%s")
+    if len(parts) - 1 != n_params:
+        raise ValueError(f"expected {n_params} placeholders, found {len(parts) - 1}")
+    out = [parts[0]]
+    for i, part in enumerate(parts[1:], 1):
+        out.append(f"${i}")
+        out.append(part)
+    return "".join(out)
+
+
+def execute_prepared(cur: Any, name: str, sql: str, params: Optional[List[Any]] = None) -> None:
+    """
+    Execute `sql` (psycopg2 `%s` placeholders) as the prepared statement `name`.
+    The PREPARE is sent once per connection; later calls only send EXECUTE, so Postgres
+    skips parse/analyze and can reuse a generic plan. `name` must be a plain identifier
+    that always maps to the same SQL text.
+    """
+    params = list(params or [])
+    prepared = getattr(cur.connection, "prepared", None)
+    if prepared is None:  # not a pooled connection: plain execute
+        cur.execute(sql, params or None)
+        return
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {to_dollar_params(sql, len(params))}")
+        prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
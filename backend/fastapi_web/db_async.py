@@ -0,0 +1,225 @@
+"""
+Async PostgreSQL access for the FastAPI handlers (asyncpg, own pool).
+
+Opt-in with DB_ASYNC=1: measured on one CPU (bench/http_concurrency.py) it
+was not faster than the psycopg2 pool in the threadpool. The sync pool in db.py
+stays the default and the fallback: when DB_ASYNC is unset, asyncpg is not
+installed, or the async pool failed to open, `pool.enabled` is False and
+callers run the psycopg2 path instead.
+
+SQL is written once with psycopg2-style `%s` placeholders; `db.to_dollar_params`
+turns them into asyncpg's `$1..$n` when parameters are passed. Queries go
+through conn.fetch(), i.e. asyncpg's per-connection statement cache; column
+names come from the records, and for empty results (and the Arrow schema of
+streamed cursors) from one prepare per SQL text, cached here.
+
+A checkout that waits longer than PG_POOL_TIMEOUT raises db.PoolTimeout, same
+as the sync pool, so handlers answer 503 instead of a generic query error.
+"""
+import asyncio
+import contextlib
+import os
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import asyncpg
+except ImportError:  # optional: sync psycopg2 path is used instead
+    asyncpg = None
+
+import tracing
+from db import PoolTimeout, conn_kwargs_from_env, to_dollar_params
+
+log = logging.getLogger("db_async")
+
+
+class AsyncPgPool:
+    def __init__(self, *, min_size: int = 1, max_size: int = 20, wait_timeout: float = 5.0,
+                 max_attribute_cache: int = 512):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.max_attribute_cache = max_attribute_cache
+        self._pool = None
+        self._attributes: Dict[str, tuple] = {}  # SQL text -> statement attributes (name, type)
+        self._timeouts = 0
+
+    @classmethod
+    def from_env(cls) -> "AsyncPgPool":
+        return cls(
+            min_size=int(os.getenv("PG_ASYNC_POOL_MIN", "1")),
+            max_size=int(os.getenv("PG_ASYNC_POOL_MAX", "20")),
+            wait_timeout=float(os.getenv("PG_POOL_TIMEOUT", "5")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    async def open(self) -> None:
+        if asyncpg is None or os.getenv("DB_ASYNC", "0") != "1":
+            log.info("async db path disabled; using the psycopg2 pool")
+            return
+        kw = conn_kwargs_from_env()
+        try:
+            self._pool = await asyncpg.create_pool(
+                database=kw["dbname"],
+                user=kw["user"],
+                password=kw["password"],
+                host=kw["host"],
+                port=int(kw["port"]),
+                timeout=kw["connect_timeout"],
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+        except Exception as e:
+            log.warning("async db pool unavailable, falling back to psycopg2: %s", e)
+            self._pool = None
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        if self._pool is None:
+            return {"enabled": False}
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "enabled": True,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "timeouts": self._timeouts,
+            "attribute_cache": len(self._attributes),
+        }
+
+    async def _checkout(self):
+        try:
+            return await self._pool.acquire(timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(
+                f"no database connection available within {self.wait_timeout}s (max_size={self.max_size})"
+            ) from None
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        conn = await self._checkout()
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    async def _statement_attributes(self, conn, query: str) -> tuple:
+        """One prepare per SQL text, then from the cache."""
+        attrs: Optional[tuple] = self._attributes.get(query)
+        if attrs is None:
+            attrs = (await conn.prepare(query)).get_attributes()
+            if len(self._attributes) >= self.max_attribute_cache:
+                self._attributes.clear()
+            self._attributes[query] = attrs
+        return attrs
+
+    async def _column_names(self, conn, query: str, rows: List[Any]) -> List[str]:
+        if rows:
+            return list(rows[0].keys())
+        return [a.name for a in await self._statement_attributes(conn, query)]
+
+    async def fetch_table(self, sql: str, params: Sequence[Any] = ()) -> Tuple[List[str], List[tuple]]:
+        """(column names, row tuples); empty results keep their column names."""
+        query = to_dollar_params(sql, len(params))
+        with tracing.span("db.query"):
+            async with self.acquire() as conn:
+                rows = await conn.fetch(query, *params)
+                columns = await self._column_names(conn, query, rows)
+        return columns, [tuple(r) for r in rows]
+
+    async def fetch(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        columns, rows = await self.fetch_table(sql, params)
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def fetch_readonly(self, sql: str, *, statement_timeout_ms: int = 5000) -> Tuple[List[str], List[tuple]]:
+        """Run untrusted (LLM-generated) SQL in a read-only transaction with a timeout."""
+        with tracing.span("db.query"):
+            async with self.acquire() as conn:
+                async with conn.transaction(readonly=True):
+                    await conn.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+                    rows = await conn.fetch(sql)
+                    columns = await self._column_names(conn, sql, rows)
+        return columns, [tuple(r) for r in rows]
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(to_dollar_params(sql, len(params)), *params)
+
+    async def open_cursor(self, sql: str, params: Sequence[Any] = (), *, batch: int = 2000) -> "AsyncRowStream":
+        """
+        Start a server-side cursor and fetch the first batch eagerly, so errors surface
+        before the HTTP response starts. `stream.description` holds the column
+        attributes (for columnar.arrow_schema). The caller must `await stream.close()`.
+        """
+        query = to_dollar_params(sql, len(params))
+        conn = await self._checkout()
+        tr = conn.transaction(readonly=True)
+        try:
+            await tr.start()
+            description = await self._statement_attributes(conn, query)
+            cur = await conn.cursor(query, *params)
+            first = await cur.fetch(batch)
+        except BaseException:
+            try:
+                await tr.rollback()
+            except Exception:
+                pass
+            await self._pool.release(conn)
+            raise
+        return AsyncRowStream(self._pool, conn, tr, cur, first, batch, description)
+
+
+class AsyncRowStream:
+    """Batches of tuples from an open asyncpg cursor; releases the connection on close()."""
+
+    def __init__(self, pool, conn, tr, cur, first, batch: int, description):
+        self._pool, self._conn, self._tr, self._cur = pool, conn, tr, cur
+        self.description = description
+        self._first = first
+        self._batch = batch
+        self._closed = False
+
+    async def batches(self) -> AsyncIterator[List[tuple]]:
+        batch = self._first
+        while batch:
+            yield [tuple(r) for r in batch]
+            batch = await self._cur.fetch(self._batch)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._tr.rollback()
+        except Exception:
+            pass
+        await self._pool.release(self._conn)
+
+
+# -----------------------------------------------------
+# Process-wide async pool
+# -----------------------------------------------------
+pool = AsyncPgPool.from_env()
+
+
+def enabled() -> bool:
+    return pool.enabled
+
+
+async def fetch(sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    return await pool.fetch(sql, params)
+
+
+async def fetch_table(sql: str, params: Sequence[Any] = ()) -> Tuple[List[str], List[tuple]]:
+    return await pool.fetch_table(sql, params)
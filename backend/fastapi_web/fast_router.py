@@ -0,0 +1,142 @@
+"""
+Local pre-router for the agent endpoints: turns common, easy-to-classify messages
+into a tool plan without calling the planner LLM.
+
+Two layers, both pure Python:
+- rules: small talk -> no tools; explicit risk words -> investment_packages(risk);
+  a client id in the text -> the client lookups the planner would ask for.
+- a keyword classifier over TOOL_SPECS (description words + per-tool keywords)
+  that picks the tool the message is about and how clearly.
+
+`route()` returns a FastRoute only when confident; None means "ask the LLM".
+The plan uses the same shape and placeholders as route_tool_plan.
+
+Rules only see the current message. When the session has history, a message
+that leans on it ("and for medium risk?", "what about last month", "show his
+transactions", a two-word fragment) is left to the planner, which gets the
+transcript.
+"""
+import re
+import unicodedata
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+_GREETINGS = {
+    "hi", "hello", "hey", "salut", "buna", "ziua", "seara", "dimineata", "thanks", "thank", "you",
+    "multumesc", "mersi", "bye", "goodbye", "ok", "okay", "good", "morning", "evening", "cheers", "great",
+}
+
+# per-tool keywords on top of the TOOL_SPECS description words
+_KEYWORDS = {
+    "investment_packages": {
+        "package", "packages", "pachet", "pachete", "product", "products", "fund", "funds", "etf", "etfs",
+        "invest", "investment", "investments", "investitii", "portfolio", "offer", "offers", "recommend",
+        "options", "bonds", "equities", "buy",
+    },
+    "transaction_history": {
+        "transaction", "transactions", "tranzactii", "tranzactiile", "spending", "spent", "spend", "purchases",
+        "history", "activity", "expenses", "cheltuieli", "bought", "sold", "holdings", "payments",
+    },
+    "database_info": {
+        "profile", "profil", "kyc", "score", "rating", "details", "account", "info", "information",
+        "goals", "age", "who",
+    },
+}
+
+_RISK_WORDS = {
+    "low": "usor", "conservative": "usor", "usor": "usor", "safe": "usor",
+    "medium": "mediu", "mediu": "mediu", "balanced": "mediu", "moderate": "mediu",
+    "high": "ridicat", "ridicat": "ridicat", "aggressive": "ridicat", "growth": "ridicat",
+}
+
+# follow-up markers, only checked when the session has history
+_FOLLOW_UP_OPENERS = (
+    ("and",), ("also",), ("but",), ("then",), ("so",), ("or",), ("what", "about"), ("how", "about"),
+    ("same",), ("si",), ("dar",), ("iar",), ("apoi",), ("sau",), ("la", "fel"),
+)
+_ANAPHORA = {
+    "it", "its", "that", "those", "these", "them", "they", "their", "him", "his", "her", "hers",
+    "same", "instead", "again", "previous", "above", "earlier", "else", "other",
+    "el", "ea", "lui", "ei", "lor", "acesta", "aceasta", "acestea", "asta", "acelasi", "aceeasi",
+}
+_FRAGMENT_TOKENS = 3
+
+# "risk" shows up in both profile and package questions, so it never decides on its own
+_STOPWORDS = {"the", "a", "an", "to", "of", "and", "or", "for", "my", "me", "i", "is", "are", "do", "what", "with",
+              "risk", "fetch", "client"}
+
+
+class FastRoute(NamedTuple):
+    plan: List[Dict[str, Any]]
+    why: str
+    confidence: float
+    rule: str
+
+
+def _tokens(text: str) -> List[str]:
+    s = unicodedata.normalize("NFKD", text or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    return re.findall(r"[a-z0-9_]+", s)
+
+
+class FastRouter:
+    def __init__(self, tool_specs: Dict[str, Dict[str, Any]], *, min_confidence: float = 0.75):
+        self.min_confidence = min_confidence
+        # description words weigh half a keyword
+        self._vocab: Dict[str, Dict[str, float]] = {}
+        for tool, spec in tool_specs.items():
+            if tool == "skip":
+                continue
+            words = {w: 0.5 for w in _tokens(spec.get("description", "")) if w not in _STOPWORDS and len(w) > 2}
+            words.update({w: 1.0 for w in _KEYWORDS.get(tool, ())})
+            self._vocab[tool] = words
+
+    def classify(self, text: str) -> Tuple[Optional[str], float]:
+        """(best tool, confidence in 0..1) from keyword overlap; (None, 0) when nothing matches."""
+        toks = set(_tokens(text))
+        scores = sorted(((sum(w for t, w in vocab.items() if t in toks), tool) for tool, vocab in self._vocab.items()),
+                        reverse=True)
+        if not scores or scores[0][0] == 0:
+            return None, 0.0
+        best, second = scores[0][0], scores[1][0] if len(scores) > 1 else 0.0
+        # share of the score, damped when only description words (weight 0.5) matched
+        confidence = (best / (best + second)) * min(1.0, best)
+        return scores[0][1], round(confidence, 3)
+
+    @staticmethod
+    def is_follow_up(toks: List[str]) -> bool:
+        """Anaphora ("his", "those"), a follow-up opener ("and ...", "what about ...") or a short fragment."""
+        if any(tuple(toks[:len(opener)]) == opener for opener in _FOLLOW_UP_OPENERS):
+            return True
+        return len(toks) <= _FRAGMENT_TOKENS or any(t in _ANAPHORA for t in toks)
+
+    def route(self, text: str, client_id: Optional[int] = None, *, has_history: bool = False) -> Optional[FastRoute]:
+        toks = _tokens(text)
+        if not toks:
+            return None
+        small_talk = len(toks) <= 6 and all(t in _GREETINGS for t in toks)
+        if has_history and not small_talk and self.is_follow_up(toks):
+            return None  # needs the earlier turns: planner
+        if small_talk:
+            return FastRoute([], "small talk, no client data needed", 0.95, "small_talk")
+
+        tool, confidence = self.classify(text)
+        if tool is None or confidence < self.min_confidence:
+            return None
+        cid = str(client_id) if client_id is not None else None
+
+        if tool == "investment_packages":
+            risk = next((_RISK_WORDS[t] for t in toks if t in _RISK_WORDS), None)
+            if risk:
+                return FastRoute([{"tool": tool, "args": {"risk": risk}}],
+                                 f"packages for explicit risk '{risk}'", confidence, "packages_explicit_risk")
+            if cid:
+                plan = [
+                    {"tool": "database_info", "args": {"client_id": cid}},
+                    {"tool": tool, "args": {"risk": "{{database_info.risk_profile}}"}},
+                ]
+                return FastRoute(plan, "packages aligned to the client's risk profile", confidence, "packages_client_risk")
+            return None
+        if cid:
+            return FastRoute([{"tool": tool, "args": {"client_id": cid}}],
+                             f"{tool} for client {cid}", confidence, f"{tool}_client")
+        return None
@@ -0,0 +1,246 @@
+"""
+Gateway in front of the Bedrock runtime client: every model call goes through
+`LLMGateway.invoke` / `LLMGateway.stream`.
+
+- concurrency: at most `limit` calls in flight, sized to the Bedrock quota
+  (LLM_MAX_CONCURRENCY); callers beyond that queue. The limit is adaptive
+  (AIMD): a throttle halves it, each success raises it by one up to the max.
+- retries: throttling / transient errors are retried with full-jitter
+  exponential backoff; botocore's own retries are disabled so the two do not
+  stack.
+- deadlines: each call has an end-to-end deadline (queueing + retries +
+  backoff + the Bedrock call itself). The FastAPI middleware sets one per HTTP
+  request via `request_deadline()`; calls made outside a request use
+  `default_deadline`. The client call runs on a small pool and is waited on
+  only until the deadline: on expiry the caller gets LLMDeadlineExceeded and
+  the slot is released, while the abandoned call ends on its own within the
+  client's read_timeout (counted as "abandoned").
+- stats(): queue depth (current / max), in flight, wait time, retries,
+  throttles, deadline misses.
+
+Handlers run in the threadpool, so the gateway is thread-based (boto3 has no
+async Bedrock client).
+"""
+import contextvars
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from botocore.config import Config
+    from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+except ImportError:  # botocore ships with boto3; only missing in stripped-down tooling environments
+    Config = None
+    ClientError = BotoConnectionError = ReadTimeoutError = ()
+
+RETRYABLE_CODES = {
+    "ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException",
+    "ModelNotReadyException", "InternalServerException",
+}
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException"}
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class LLMError(Exception):
+    """Base class for gateway failures."""
+
+
+class LLMDeadlineExceeded(LLMError):
+    """The request deadline passed while queued, retrying or streaming."""
+
+
+class LLMThrottled(LLMError):
+    """Still throttled after all retries."""
+
+
+def client_config(max_concurrency: int, *, connect_timeout: float = 5.0, read_timeout: float = 60.0):
+    """botocore Config for the Bedrock runtime client used behind the gateway."""
+    if Config is None:
+        return None
+    return Config(
+        retries={"max_attempts": 1, "mode": "standard"},  # retries happen in the gateway
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_pool_connections=max(10, max_concurrency),
+    )
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """Scope an end-to-end deadline (monotonic) over the LLM calls made inside the block."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def set_request_deadline(seconds: Optional[float]) -> None:
+    """Like request_deadline, for callers (middleware) that hand the context to a child task."""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+class LLMGateway:
+    def __init__(self, client: Any, *, max_concurrency: int = 8, max_attempts: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 8.0, default_deadline: float = 60.0):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.default_deadline = default_deadline
+        self._cond = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        # room for max_concurrency live calls plus as many abandoned ones still running out their read_timeout
+        self._calls = ThreadPoolExecutor(max_workers=2 * max_concurrency, thread_name_prefix="llm-call")
+        self._stats = {
+            "calls": 0, "attempts": 0, "retries": 0, "throttles": 0, "errors": 0,
+            "deadline_exceeded": 0, "abandoned": 0, "max_queue_depth": 0, "wait_time_total_ms": 0.0,
+        }
+
+    # ---------- limiter ----------
+    def _stop_at(self) -> float:
+        d = _deadline.get()
+        return d if d is not None else time.monotonic() + self.default_deadline
+
+    def _acquire(self, stop_at: float) -> None:
+        started = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._waiting)
+            try:
+                while self._in_flight >= int(self._limit):
+                    remaining = stop_at - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["deadline_exceeded"] += 1
+                        raise LLMDeadlineExceeded("deadline exceeded while queued for a Bedrock slot")
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+                self._stats["wait_time_total_ms"] += (time.monotonic() - started) * 1000.0
+
+    def _release(self, *, throttled: bool = False, ok: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(1.0, self._limit / 2)
+            elif ok:
+                self._limit = min(float(self.max_concurrency), self._limit + 1)
+            self._cond.notify_all()
+
+    # ---------- calls ----------
+    @staticmethod
+    def _error_code(e: Exception) -> Optional[str]:
+        if ClientError and isinstance(e, ClientError):
+            return e.response.get("Error", {}).get("Code")
+        if (BotoConnectionError or ReadTimeoutError) and isinstance(e, (BotoConnectionError, ReadTimeoutError)):
+            return "ConnectionError"
+        return None
+
+    def _call(self, fn, stop_at: float):
+        """fn() on the call pool, waited on until stop_at at most."""
+        future = self._calls.submit(fn)
+        try:
+            return future.result(timeout=max(0.0, stop_at - time.monotonic()))
+        except FutureTimeout:
+            if not future.cancel():  # already running: it finishes (or times out) on its own
+                with self._cond:
+                    self._stats["abandoned"] += 1
+            with self._cond:
+                self._stats["deadline_exceeded"] += 1
+            raise LLMDeadlineExceeded("deadline exceeded waiting for Bedrock") from None
+
+    def _acquire_and_run(self, fn, stop_at: float):
+        """
+        Take a slot and run fn(), retrying retryable failures with full-jitter backoff.
+        On success the slot is still held: the caller releases it with _release(ok=True).
+        """
+        with self._cond:
+            self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            self._acquire(stop_at)
+            attempt += 1
+            with self._cond:
+                self._stats["attempts"] += 1
+            try:
+                return self._call(fn, stop_at)
+            except LLMDeadlineExceeded:
+                self._release()
+                raise
+            except Exception as e:
+                code = self._error_code(e)
+                throttled = code in THROTTLE_CODES
+                self._release(throttled=throttled)
+                with self._cond:
+                    self._stats["throttles" if throttled else "errors"] += 1
+                if code not in RETRYABLE_CODES and code != "ConnectionError":
+                    raise
+                if attempt >= self.max_attempts:
+                    if throttled:
+                        raise LLMThrottled(f"Bedrock throttled after {attempt} attempts") from e
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if time.monotonic() + delay >= stop_at:
+                    with self._cond:
+                        self._stats["deadline_exceeded"] += 1
+                    raise LLMDeadlineExceeded(f"deadline exceeded after {attempt} attempts ({code})") from e
+                with self._cond:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+
+    def invoke(self, *, model_id: str, body: str) -> Dict[str, Any]:
+        """invoke_model; returns the decoded JSON response body."""
+        def call():
+            response = self.client.invoke_model(modelId=model_id, body=body)
+            return json.loads(response["body"].read())
+        result = self._acquire_and_run(call, self._stop_at())
+        self._release(ok=True)
+        return result
+
+    @contextmanager
+    def stream(self, *, model_id: str, body: str) -> Iterator[Iterator[Dict[str, Any]]]:
+        """
+        invoke_model_with_response_stream; yields an iterator of decoded chunk events.
+        Retries cover opening the stream only; the slot stays taken until the block exits.
+        """
+        stop_at = self._stop_at()
+        response = self._acquire_and_run(
+            lambda: self.client.invoke_model_with_response_stream(modelId=model_id, body=body), stop_at)
+
+        def events():
+            for event in response["body"]:
+                if time.monotonic() > stop_at:
+                    with self._cond:
+                        self._stats["deadline_exceeded"] += 1
+                    raise LLMDeadlineExceeded("deadline exceeded while streaming")
+                chunk = event.get("chunk")
+                if chunk:
+                    yield json.loads(chunk["bytes"])
+
+        ok = False
+        try:
+            yield events()
+            ok = True
+        finally:
+            self._release(ok=ok)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out.update({
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "limit": int(self._limit),
+                "max_concurrency": self.max_concurrency,
+            })
+        out["wait_time_total_ms"] = round(out["wait_time_total_ms"], 3)
+        return out
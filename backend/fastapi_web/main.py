@@ -1,16 +1,42 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import os
+import base64
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
 import boto3
 import json
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 import re
-from typing import Any, Dict, Optional, List, Union
-from psycopg2.extras import RealDictCursor
-import psycopg2
-import requests
-from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, List, NamedTuple, Tuple, Union
+from datetime import date, datetime
+
+import admission
+import batch_advice
+import cache
+import client_cache
+import columnar
+import db
+import db_async
+import fast_router
+import llm_gateway
+import pg_listen
+import pg_remote
+import response_cache
+import schema_catalog
+import sessions
+import slow_queries
+import tool_context
+import tracing
 
 # from testul_xxx import SYSTEM_INSTRUCTIONS
 
@@ -28,6 +54,26 @@ Question_instructions = "You are a helpful financial assistant. Answer the user'
 def health():
     return {"status": "ok"}
 
+# -----------------------------------------------------
+# DB pool lifecycle (one pool per process, see db.py / db_async.py)
+# -----------------------------------------------------
+@app.on_event("startup")
+async def _open_db_pool():
+    await run_in_threadpool(db.pool.open)
+    await db_async.pool.open()
+    await run_in_threadpool(schema.refresh)
+    _listener.start()
+
+@app.on_event("shutdown")
+async def _close_db_pool():
+    _listener.stop()
+    await db_async.pool.close()
+    await run_in_threadpool(db.pool.close)
+
+@app.get("/db/stats")
+def db_stats():
+    return {"pool": db.pool.stats(), "async_pool": db_async.pool.stats()}
+
 # -----------------------------------------------------
 # CORS (permite frontend-ul local)
 # -----------------------------------------------------
@@ -50,59 +96,266 @@ app.add_middleware(
 AWS_REGION = "us-west-2"
 MODEL_ID = "global.anthropic.claude-sonnet-4-20250514-v1:0"
 
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # keep at or below the Bedrock quota
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "60"))
+
+# BEDROCK_ENDPOINT_URL points the client elsewhere, e.g. bench/fake_bedrock.py for offline load tests
 bedrock = boto3.client(
     'bedrock-runtime',
     aws_session_token='',
-    region_name='us-west-2'
+    region_name='us-west-2',
+    endpoint_url=os.getenv("BEDROCK_ENDPOINT_URL") or None,
+    config=llm_gateway.client_config(LLM_MAX_CONCURRENCY,
+                                     read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60")))
+)
+
+# All model calls go through the gateway: bounded + adaptive concurrency, jittered
+# retries on throttling, and the per-request deadline set by the middleware below.
+llm = llm_gateway.LLMGateway(
+    bedrock,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "4")),
+    default_deadline=LLM_REQUEST_DEADLINE,
 )
 
+@app.middleware("http")
+async def _llm_request_deadline(request: Request, call_next):
+    """End-to-end LLM budget per request; clients may shorten it with X-Request-Timeout (seconds)."""
+    budget = LLM_REQUEST_DEADLINE
+    try:
+        budget = min(budget, float(request.headers.get("x-request-timeout", budget)))
+    except ValueError:
+        pass
+    llm_gateway.set_request_deadline(budget)
+    return await call_next(request)
+
+# Registered last, so it wraps everything: Server-Timing per response (stages from
+# tracing.span, see tracing.py) and request counts / latency for /metrics.
+@app.middleware("http")
+async def _trace_request(request: Request, call_next):
+    trace = tracing.start_trace()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        tracing.observe_request("fastapi", request.method, getattr(route, "path", "unmatched"), status,
+                                time.perf_counter() - trace.started)
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: http_requests_total, http_request_duration_seconds, stage_duration_seconds, ..."""
+    return Response(tracing.METRICS.render(), media_type=tracing.PROMETHEUS_CONTENT_TYPE)
+
+def _llm_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, llm_gateway.LLMDeadlineExceeded):
+        return HTTPException(status_code=504, detail=f"Bedrock/Claude deadline exceeded: {str(e)}")
+    if isinstance(e, llm_gateway.LLMThrottled):
+        return HTTPException(status_code=503, detail=f"Bedrock/Claude throttled: {str(e)}",
+                             headers={"Retry-After": "2"})
+    return HTTPException(status_code=500, detail=f"Bedrock/Claude error: {str(e)}")
+
 # -----------------------------------------------------
 # Generic Bedrock caller for custom system prompts
 # -----------------------------------------------------
-def ask_model(system_text: str, user_message: str, *, max_tokens: int = 500, temperature: float = 0.7) -> str:
-    body = {
+# System prompts are sent as a list of text blocks, most static first. With
+# PROMPT_CACHE=1 each block ends with a Bedrock cache point, so the shared prefix
+# (instructions, tool catalog, few-shots, schema brief) is read from the prompt
+# cache instead of re-processed. Prefixes below the model's minimum cacheable
+# length are simply not cached.
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "1").lower() not in ("0", "false", "off", "no")
+_llm_log = logging.getLogger("llm")
+_llm_usage_lock = threading.Lock()
+LLM_USAGE: Dict[str, Dict[str, int]] = {}  # stage -> token counters
+
+def _system_blocks(system_text: Union[str, List[str]]) -> List[Dict[str, Any]]:
+    texts = [system_text] if isinstance(system_text, str) else [t for t in system_text if t]
+    blocks: List[Dict[str, Any]] = []
+    for i, text in enumerate(texts):
+        block: Dict[str, Any] = {"type": "text", "text": text}
+        if PROMPT_CACHE and i >= len(texts) - 4:  # at most 4 cache points per request
+            block["cache_control"] = {"type": "ephemeral"}
+        blocks.append(block)
+    return blocks
+
+def _model_body(system_text: Union[str, List[str]], user_message: str, max_tokens: int, temperature: float) -> str:
+    return json.dumps({
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": max_tokens,
         "temperature": temperature,
         "messages": [
             {"role": "user", "content": user_message}
         ],
-        "system": [
-            {
-                "type": "text",
-                "text": system_text
-            }
-        ]
+        "system": _system_blocks(system_text)
+    })
+
+def record_llm_usage(stage: str, usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Accumulates Bedrock `usage` per stage; input_tokens is the uncached part of the prompt."""
+    u = usage or {}
+    call = {
+        "input_tokens": int(u.get("input_tokens") or 0),
+        "cache_read_input_tokens": int(u.get("cache_read_input_tokens") or 0),
+        "cache_creation_input_tokens": int(u.get("cache_creation_input_tokens") or 0),
+        "output_tokens": int(u.get("output_tokens") or 0),
     }
+    with _llm_usage_lock:
+        agg = LLM_USAGE.setdefault(stage, {"calls": 0, **{k: 0 for k in call}})
+        agg["calls"] += 1
+        for k, v in call.items():
+            agg[k] += v
+    _llm_log.info("llm stage=%s uncached_in=%d cache_read=%d cache_write=%d out=%d", stage,
+                  call["input_tokens"], call["cache_read_input_tokens"],
+                  call["cache_creation_input_tokens"], call["output_tokens"])
+    return call
+
+def ask_model(system_text: Union[str, List[str]], user_message: str, *, max_tokens: int = 500,
+              temperature: float = 0.7, stage: str = "other") -> str:
+    """system_text: one prompt or a list of static blocks (see PROMPT_CACHE); stage labels LLM_USAGE."""
     try:
-        response = bedrock.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps(body)
-        )
-        result = json.loads(response["body"].read())
+        with tracing.span(f"llm.{stage}"):
+            result = llm.invoke(model_id=MODEL_ID, body=_model_body(system_text, user_message, max_tokens, temperature))
+        record_llm_usage(stage, result.get("usage"))
         reply = result["content"][0]["text"].strip()
         return reply
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Bedrock/Claude error: {str(e)}")
+        raise _llm_http_error(e)
+
+def ask_model_stream(system_text: Union[str, List[str]], user_message: str, *, max_tokens: int = 500,
+                     temperature: float = 0.7, stage: str = "other") -> Iterator[str]:
+    """
+    Same request as ask_model, via invoke_model_with_response_stream: yields text
+    deltas as Bedrock produces them. Errors surface as an exception from the iterator.
+    """
+    usage: Dict[str, Any] = {}
+    try:
+        with tracing.span(f"llm.{stage}"), \
+                llm.stream(model_id=MODEL_ID, body=_model_body(system_text, user_message, max_tokens, temperature)) as events:
+            for data in events:
+                kind = data.get("type")
+                if kind == "content_block_delta" and data.get("delta", {}).get("type") == "text_delta":
+                    yield data["delta"]["text"]
+                elif kind == "message_start":
+                    usage.update(data.get("message", {}).get("usage") or {})
+                elif kind == "message_delta":
+                    usage.update(data.get("usage") or {})
+    except Exception as e:
+        raise _llm_http_error(e)
+    record_llm_usage(stage, usage)
+
+@app.get("/llm/stats")
+def llm_stats():
+    """Token counters per stage; cache_read_ratio = share of prompt tokens served from the prompt cache."""
+    with _llm_usage_lock:
+        stages = {k: dict(v) for k, v in LLM_USAGE.items()}
+    for v in stages.values():
+        prompt = v["input_tokens"] + v["cache_read_input_tokens"] + v["cache_creation_input_tokens"]
+        v["cache_read_ratio"] = round(v["cache_read_input_tokens"] / prompt, 4) if prompt else 0.0
+    return {"prompt_cache": PROMPT_CACHE, "model": MODEL_ID, "gateway": llm.stats(), "stages": stages}
+
+# -----------------------------------------------------
+# Server-Sent Events for the chat endpoints
+# Clients opt in with `Accept: text/event-stream`; otherwise the JSON response is unchanged.
+# Events: plan | tool | token ({"text"}) | done (the full JSON response) | error
+# -----------------------------------------------------
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def wants_sse(request: Request) -> bool:
+    return SSE_MEDIA_TYPE in (request.headers.get("accept") or "").lower()
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=columnar.json_default)}\n\n"
+
+def sse_response(events: Iterator[str]) -> StreamingResponse:
+    # sync generator: Starlette iterates it in the threadpool, so blocking Bedrock/DB calls are fine
+    def guarded():
+        try:
+            yield from events
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            yield sse_event("error", {"detail": detail})
+    return StreamingResponse(guarded(), media_type=SSE_MEDIA_TYPE,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def stream_answer(system_text: Union[str, List[str]], user_message: str, *, max_tokens: int,
+                  temperature: float = 0.7, parts: List[str], stage: str = "answerer") -> Iterator[str]:
+    """token events for one answer; the text is accumulated into `parts` for the final done event."""
+    for text in ask_model_stream(system_text, user_message, max_tokens=max_tokens, temperature=temperature,
+                                 stage=stage):
+        parts.append(text)
+        yield sse_event("token", {"text": text})
 
 # -----------------------------------------------------
 # Pydantic model pentru input
 # -----------------------------------------------------
 class ChatInput(BaseModel):
     message: str
+    session_id: Optional[str] = None  # agent endpoints: server-side history (see SESSIONS); omit for a stateless turn
 
 class PromptIn(BaseModel):
     prompt: str
     table_hint: Optional[str] = None  # optional: e.g., "cv"
 
 def get_conn():
-    return psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB", "skepyadb"),
-        user=os.getenv("POSTGRES_USER", "admin"),
-        password=os.getenv("POSTGRES_PASSWORD", "Paroladb"),
-        host=os.getenv("POSTGRES_HOST", "postgres"),
-        port=os.getenv("POSTGRES_PORT", "5432"),
-    )
+    """Borrow a pooled connection (commits on success, returned to the pool on exit)."""
+    return db.connection()
+
+def _fetch_table_sync(sql: str, params: Optional[List[Any]] = None) -> Tuple[List[str], List[tuple]]:
+    with get_conn() as conn, conn.cursor() as cur, tracing.span("db.query"):
+        cur.execute(sql, params or None)
+        rows = cur.fetchall()
+        columns = [desc[0] for desc in cur.description]
+    return columns, rows
+
+def _fetch_dicts_sync(sql: str, params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    columns, rows = _fetch_table_sync(sql, params)
+    return [dict(zip(columns, row)) for row in rows]
+
+async def fetch_table(sql: str, params: Optional[List[Any]] = None) -> Tuple[List[str], List[tuple]]:
+    """(columns, row tuples) via asyncpg when available, else psycopg2 in the threadpool."""
+    if db_async.enabled():
+        return await db_async.fetch_table(sql, params or [])
+    return await run_in_threadpool(_fetch_table_sync, sql, params)
+
+async def fetch_dicts(sql: str, params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    columns, rows = await fetch_table(sql, params)
+    return [dict(zip(columns, row)) for row in rows]
+
+def _db_http_error(e: Exception) -> HTTPException:
+    """503 + Retry-After when neither pool had a free connection in time (load, not a bad query), else 500."""
+    if isinstance(e, db.PoolTimeout):
+        return HTTPException(status_code=503, detail=f"Database busy: {str(e)}", headers={"Retry-After": "1"})
+    return HTTPException(status_code=500, detail=f"Query error: {str(e)}")
+
+# -----------------------------------------------------
+# Opt-in compact formats (Accept header), see columnar.py
+# -----------------------------------------------------
+def negotiate_format(request: Request) -> Optional[str]:
+    """Compact format requested via Accept, or None for the default list of objects. 406 if unavailable."""
+    fmt = columnar.negotiate(request.headers.get("accept"))
+    if fmt is not None and not columnar.available(fmt):
+        raise HTTPException(status_code=406, detail=f"{fmt} is not available on this server")
+    return fmt
+
+def columnar_response(fmt: str, columns: List[str], rows: List[tuple],
+                      extra: Optional[Dict[str, Any]] = None) -> Response:
+    with tracing.span("serialize"):
+        body = columnar.encode(fmt, columns, rows, extra)
+    return Response(body, media_type=fmt)
+
+def json_response(build: Callable[[], Any], headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Default JSON body, built and encoded inside the serialize span (returned as-is,
+    FastAPI would encode it after the handler, outside any span). Same encoding as
+    FastAPI's JSONResponse; pass response headers here, a returned Response ignores
+    the injected `response`.
+    """
+    with tracing.span("serialize"):
+        body = json.dumps(build(), ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                          default=columnar.json_default).encode("utf-8")
+    return Response(body, media_type="application/json", headers=headers)
 
 # ---------- SQL guard & helpers (migrated from bd.py) ----------
 _DANGEROUS = re.compile(
@@ -110,29 +363,22 @@ _DANGEROUS = re.compile(
     re.I,
 )
 
+# Schema catalog: loaded at startup, TTL-cached, invalidated by the DDL event trigger
+# (LISTEN schema_changed) or POST /schema/refresh. See schema_catalog.py.
+schema = schema_catalog.SchemaCatalog(_fetch_dicts_sync, ttl=float(os.getenv("SCHEMA_CACHE_TTL", "300")))
+
+@app.get("/schema")
+def get_schema():
+    return {"version": schema.version, "tables": schema.get(), "stats": schema.stats()}
+
+@app.post("/schema/refresh")
+def refresh_schema():
+    schema.refresh()
+    return {"version": schema.version, "stats": schema.stats()}
+
 def _get_schema_brief(max_cols_per_table: int = 8) -> str:
     """Minimal context about public schema (tables + first columns) to help LLM."""
-    try:
-        with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT table_name, column_name
-                FROM information_schema.columns
-                WHERE table_schema='public'
-                ORDER BY table_name, ordinal_position
-            """)
-            rows = cur.fetchall()
-    except Exception:
-        return ""
-    tables = {}
-    for r in rows:
-        t = r["table_name"]
-        tables.setdefault(t, [])
-        if len(tables[t]) < max_cols_per_table:
-            tables[t].append(r["column_name"])
-    parts = []
-    for t, cols in tables.items():
-        parts.append(f"- {t}({', '.join(cols)})")
-    return "Known tables (schema=public):\n" + "\n".join(parts) if parts else ""
+    return schema.brief(max_cols_per_table)
 
 def _sanitize_sql(sql: str, default_limit: int = 100) -> str:
     s = sql.strip()
@@ -151,6 +397,26 @@ def _sanitize_sql(sql: str, default_limit: int = 100) -> str:
         s = s.rstrip(" ;") + f" LIMIT {default_limit}"
     return s
 
+# Admission control pentru SQL-ul generat (vezi admission.py): EXPLAIN simplu înainte de
+# execuție, allow / rewrite (LIMIT QUERY_ROW_CAP) / reject după QUERY_MAX_COST și QUERY_MAX_ROWS.
+# Verdictul e cache-uit per text SQL (cu literali) + versiunea schemei. QUERY_ADMISSION=on|off
+def _explain_sync(sql: str) -> Any:
+    _, rows = _run_readonly_sync(sql, 2000)
+    return rows[0][0]
+
+ADMISSION = (
+    admission.AdmissionControl.from_env(_explain_sync, version=lambda: schema.version)
+    if os.getenv("QUERY_ADMISSION", "on").lower() not in ("0", "off", "false", "no")
+    else None
+)
+
+_invalidate_schema = schema_catalog.invalidate_handler(schema)
+
+def _on_schema_changed(payload: str) -> None:
+    _invalidate_schema(payload)
+    if ADMISSION is not None:
+        ADMISSION.clear()  # un index nou schimbă planurile, nu și forma schemei
+
 SYSTEM_INSTRUCTIONS = """You are a careful PostgreSQL SQL writer.
 Return ONLY one read-only SQL statement that begins with SELECT or WITH.
 No markdown, no comments, no explanations — only the SQL.
@@ -159,53 +425,146 @@ If the request cannot be answered with a single read-only SELECT/WITH, output:
 SELECT 'unsupported' AS error;
 """
 
+# mini few-shot in Romanian (static: lives in the cached system prefix, not in the user turn)
+NL_SQL_EXAMPLES = """Examples (RO):
+- "cate inregistrari are &lt;tabel&gt;?" -> SELECT COUNT(*) AS total FROM public.&lt;tabel&gt;;
+- "arata 5 randuri din &lt;tabel&gt;" -> SELECT * FROM public.&lt;tabel&gt; LIMIT 5;
+- "toate inregistrarile din &lt;tabel&gt; pentru user_id=3" -> SELECT * FROM public.&lt;tabel&gt; WHERE user_id=3;
+"""
+
+@tracing.traced("nl_to_sql")
 def nl_to_sql(prompt: str, table_hint: Optional[str]) -> str:
-    # Build a more informed system prompt with the current schema (improves SQL quality)
-    schema_ctx = _get_schema_brief()
-    sys_text = SYSTEM_INSTRUCTIONS if not schema_ctx else (SYSTEM_INSTRUCTIONS + "\n\n" + schema_ctx)
+    # System prefix, most static first: instructions + few-shot, then the current schema
+    # (changes only with the schema version), so both stay cacheable (PROMPT_CACHE).
+    sys_blocks = [SYSTEM_INSTRUCTIONS + "\n" + NL_SQL_EXAMPLES, _get_schema_brief()]
 
     # Lightly enrich the user prompt without changing meaning (improves clarity)
     user_text = prompt.strip()
     if table_hint:
         user_text += f"\nMain table (hint): {table_hint}"
-    # mini few-shot in Romanian
-    user_text += """
-Examples (RO):
-- "cate inregistrari are &lt;tabel&gt;?" -> SELECT COUNT(*) AS total FROM public.&lt;tabel&gt;;
-- "arata 5 randuri din &lt;tabel&gt;" -> SELECT * FROM public.&lt;tabel&gt; LIMIT 5;
-- "toate inregistrarile din &lt;tabel&gt; pentru user_id=3" -> SELECT * FROM public.&lt;tabel&gt; WHERE user_id=3;
-"""
 
     # Use the existing ask_model wrapper (keeps prompts intact; avoids a second Bedrock client)
-    raw_sql = ask_model(sys_text, user_text, max_tokens=500, temperature=0.0)
+    raw_sql = ask_model(sys_blocks, user_text, max_tokens=500, temperature=0.0, stage="nl_to_sql")
     return _sanitize_sql(raw_sql, default_limit=100)
 
+# -----------------------------------------------------
+# NL -> SQL translation cache
+# nl_to_sql runs at temperature 0, so the same question against the same schema
+# yields the same SQL. Keyed by normalized prompt + table_hint + schema version.
+# NL_SQL_CACHE=memory|sqlite|off; sqlite survives restarts and is shared by workers.
+# -----------------------------------------------------
+NL_SQL_CACHE = cache.make_cache(
+    os.getenv("NL_SQL_CACHE", "memory"),
+    path=os.getenv("NL_SQL_CACHE_PATH", "nl_sql_cache.sqlite3"),
+    max_entries=int(os.getenv("NL_SQL_CACHE_MAX", "2048")),
+    ttl=float(os.getenv("NL_SQL_CACHE_TTL", "86400")),
+)
+# one request header skips every response-level cache (/prompt NL->SQL, /chat)
+CACHE_BYPASS_HEADER = "x-cache-bypass"
+
+def cache_bypassed(request: Request) -> bool:
+    return request.headers.get(CACHE_BYPASS_HEADER, "").lower() in ("1", "true", "yes")
+
+def normalize_prompt(text: str) -> str:
+    """Case, diacritics, whitespace and trailing punctuation do not change the SQL."""
+    s = unicodedata.normalize("NFKD", text or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = " ".join(s.lower().split())
+    return s.rstrip(" ?!.;")
+
+def _nl_sql_key(prompt: str, table_hint: Optional[str]) -> str:
+    raw = json.dumps([normalize_prompt(prompt), (table_hint or "").strip().lower(), schema.version])
+    return "nl_sql:" + hashlib.sha256(raw.encode()).hexdigest()
+
+def cached_nl_to_sql(prompt: str, table_hint: Optional[str], *, bypass: bool = False) -> Tuple[str, str]:
+    """
+    Returns (sql, cache_status) with cache_status in HIT | MISS | BYPASS | OFF.
+    BYPASS skips the lookup but still stores the fresh translation.
+    """
+    if NL_SQL_CACHE is None:
+        return nl_to_sql(prompt, table_hint), "OFF"
+    key = _nl_sql_key(prompt, table_hint)
+    if not bypass:
+        hit = NL_SQL_CACHE.get(key)
+        if hit is not None:
+            return hit, "HIT"
+    sql = nl_to_sql(prompt, table_hint)
+    NL_SQL_CACHE.set(key, sql)
+    return sql, "BYPASS" if bypass else "MISS"
+
+# -----------------------------------------------------
+# Per-client cache for agent tools and /fn/* (see client_cache.py)
+# Invalidated per client by NOTIFY client_changed (triggers in init.sql).
+# CLIENT_CACHE=memory|off
+# -----------------------------------------------------
+CLIENT_CACHE = (
+    client_cache.ClientCache(
+        max_entries=int(os.getenv("CLIENT_CACHE_MAX", "2048")),
+        ttl=float(os.getenv("CLIENT_CACHE_TTL", "300")),
+    )
+    if os.getenv("CLIENT_CACHE", "memory").lower() not in ("off", "none", "0", "false")
+    else None
+)
+
+def client_lookup(client_id: int, q: "PreparedQuery") -> Tuple[List[Dict[str, Any]], str]:
+    """Rows for a per-client PreparedQuery through CLIENT_CACHE. Returns (rows, HIT | MISS | OFF)."""
+    load = lambda: _pg_query(q.sql, q.params, prepare_name=q.name)
+    if CLIENT_CACHE is None:
+        return load(), "OFF"
+    return CLIENT_CACHE.get_or_load(client_id, q.name, q.params, load)
+
+# one LISTEN connection for every invalidation channel
+_listener = pg_listen.ChannelListener(db.connect_unpooled, {
+    schema_catalog.SCHEMA_CHANNEL: _on_schema_changed,
+    client_cache.CLIENT_CHANNEL: CLIENT_CACHE.on_notify if CLIENT_CACHE is not None else (lambda _payload: None),
+})
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "nl_sql": NL_SQL_CACHE.stats() if NL_SQL_CACHE is not None else {"enabled": False},
+        "clients": CLIENT_CACHE.stats() if CLIENT_CACHE is not None else {"enabled": False},
+        "chat": CHAT_CACHE.stats() if CHAT_CACHE is not None else {"enabled": False},
+        "admission": ADMISSION.stats() if ADMISSION is not None else {"enabled": False},
+    }
+
 # -----------------------------------------------------
 # Tool-call stubs (replace with real implementations)
 # -----------------------------------------------------
+def client_profile_output(client_id: Any, row: Dict[str, Any]) -> Dict[str, Any]:
+    """database_info output for a clients row (client_id, name, risk_rating)."""
+    return {
+        "client_id": client_id,
+        "name": row.get("name"),
+        "risk_profile": normalize_risk(row.get("risk_rating") or "mediu"),
+        "goals": [],
+        "currency": "RON"
+    }
+
+def transaction_history_output(client_id: Any, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """transaction_history output for transactions rows (transaction_date, amount, category), newest first."""
+    recent = [
+        # tool output is json.dumps-ed into the answerer prompt: plain str/float only
+        {"date": str(r["transaction_date"]), "amount": float(r["amount"]), "category": r.get("category") or ""}
+        for r in rows
+    ]
+    return {"client_id": client_id, "recent_transactions": recent, "holdings_estimate": []}
+
 def tool_database_info(args: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Stub: fetch client metadata / KYC profile from DB.
+    Fetch client metadata / risk profile from DB (cached per client, see CLIENT_CACHE).
     Expected args: {"client_id": "..."} (extend as needed)
+    Falls back to the placeholder profile when the id is not numeric or the DB call fails.
     """
     client_id = args.get("client_id", "unknown")
-    # TODO [integration]: If you want to use real DB data, uncomment the lines below and adapt mapping as needed.
-    # from bd import build_sql_client_risk, _pg_query
-    # try:
-    #     sql = build_sql_client_risk(int(client_id))
-    #     rows = _pg_query(sql)
-    #     if isinstance(rows, list) and rows:
-    #         r = rows[0]
-    #         return {
-    #             "client_id": client_id,
-    #             "name": r.get("name"),
-    #             "risk_profile": r.get("risk_rating") or "mediu",
-    #             "goals": [],
-    #             "currency": "RON"
-    #         }
-    # except Exception as _e:
-    #     # fall back to stub below if DB call fails
-    #     pass
+    try:
+        cid = int(client_id)
+        rows, _ = client_lookup(cid, build_sql_client_risk(cid))
+        if rows:
+            return client_profile_output(client_id, rows[0])
+    except Exception:
+        # fall back to stub below if DB call fails
+        pass
     return {
         "client_id": client_id,
         "name": "John / Jane Doe",
@@ -216,23 +575,18 @@ def tool_database_info(args: Dict[str, Any]) -> Dict[str, Any]:
 
 def tool_transaction_history(args: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Stub: fetch recent transactions / holdings.
+    Fetch recent transactions from DB (cached per client, see CLIENT_CACHE).
     Expected args: {"client_id": "...", "limit": 50}
+    Falls back to the placeholder history when the id is not numeric or the DB call fails.
     """
     client_id = args.get("client_id", "unknown")
     limit = int(args.get("limit", 20))
-    # TODO [integration]: Use real transactions via SQL builder and PG API gateway.
-    # from bd import TxRequest, build_sql_client_transactions, _pg_query
-    # try:
-    #     req = TxRequest(client_id=int(client_id), limit=limit)
-    #     sql = build_sql_client_transactions(req)
-    #     rows = _pg_query(sql)
-    #     # Map your DB rows to the expected payload below (recent_transactions/holdings_estimate).
-    #     # Example mapping (adjust to your schema):
-    #     # recent = [{"date": r["transaction_date"], "type": r.get("type",""), "symbol": r.get("symbol",""), "qty": r.get("qty", 0), "price": r.get("price", 0.0)} for r in rows]
-    #     # return {"client_id": client_id, "recent_transactions": recent, "holdings_estimate": []}
-    # except Exception as _e:
-    #     pass
+    try:
+        cid = int(client_id)
+        rows, _ = client_lookup(cid, build_sql_client_transactions(TxRequest(client_id=cid, limit=limit)))
+        return transaction_history_output(client_id, rows)
+    except Exception:
+        pass
     return {
         "client_id": client_id,
         "recent_transactions": [
@@ -245,6 +599,56 @@ def tool_transaction_history(args: Dict[str, Any]) -> Dict[str, Any]:
         ]
     }
 
+# -----------------------------------------------------
+# Answerer context: tool outputs as compact JSON under a token budget (see tool_context.py)
+# Row lists over ANSWER_CONTEXT_MAX_ROWS become a summary + ANSWER_CONTEXT_SAMPLE_ROWS rows.
+# -----------------------------------------------------
+def _summarize_transactions(tool: str, key: str, args: Dict[str, Any], rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Per month / category totals for the same window the tool fetched, computed in Postgres."""
+    if key != "recent_transactions":
+        return None
+    try:
+        cid = int(args.get("client_id"))
+    except (TypeError, ValueError):
+        return None  # stub data: generic summary
+    q = PreparedQuery("tx_summary", """
+        WITH t AS (
+            SELECT transaction_date, amount, category
+            FROM public.transactions
+            WHERE client_id = %s::int
+            ORDER BY transaction_date DESC, id DESC
+            LIMIT %s::int
+        )
+        SELECT to_char(date_trunc('month', transaction_date), 'YYYY-MM') AS month,
+               COALESCE(category, '') AS category,
+               COUNT(*)::int AS n, SUM(amount)::float8 AS total,
+               MIN(amount)::float8 AS min, MAX(amount)::float8 AS max
+        FROM t GROUP BY 1, 2 ORDER BY 1 DESC, total DESC
+    """, (cid, int(args.get("limit", 20))))
+    by_month, _ = client_lookup(cid, q)
+    return {"count": len(rows), "by_month_category": by_month}
+
+ANSWER_CONTEXT = tool_context.ToolContextBuilder(
+    budget_tokens=int(os.getenv("ANSWER_CONTEXT_BUDGET", "1500")),
+    max_rows=int(os.getenv("ANSWER_CONTEXT_MAX_ROWS", "20")),
+    sample_rows=int(os.getenv("ANSWER_CONTEXT_SAMPLE_ROWS", "5")),
+    summarizers={"transaction_history": _summarize_transactions},
+)
+
+CONTEXT_STATS = {"turns": 0, "tokens": 0, "raw_tokens": 0, "summarized": 0, "truncated": 0}
+
+def _count_context(report: Dict[str, Any]) -> Dict[str, Any]:
+    with _agent_stats_lock:
+        CONTEXT_STATS["turns"] += 1
+        CONTEXT_STATS["tokens"] += report["tokens"]
+        CONTEXT_STATS["raw_tokens"] += report["raw_tokens"]
+        CONTEXT_STATS["summarized"] += len(report["summarized"])
+        CONTEXT_STATS["truncated"] += int(report["truncated"])
+    _llm_log.info("answerer context: %s/%s tokens (raw %s), summarized=%s truncated=%s",
+                  report["tokens"], report["budget_tokens"], report["raw_tokens"],
+                  report["summarized"], report["truncated"])
+    return report
+
 def tool_investment_packages(args: Dict[str, Any]) -> Dict[str, Any]:
     """
     Stub: fetch curated investment packages.
@@ -269,12 +673,15 @@ def skip_tool_use(args: Dict[str, Any]) -> Dict[str, Any]:
     """Explicit no-op tool to keep the interface uniform."""
     return {"skipped": True}
 
-# Map router tool names to functions
+# Map router tool names to functions (each call timed as span "tool.<name>")
 TOOL_REGISTRY = {
-    "database_info": tool_database_info,
-    "transaction_history": tool_transaction_history,
-    "investment_packages": tool_investment_packages,
-    "skip": skip_tool_use
+    name: tracing.traced(f"tool.{name}")(fn)
+    for name, fn in {
+        "database_info": tool_database_info,
+        "transaction_history": tool_transaction_history,
+        "investment_packages": tool_investment_packages,
+        "skip": skip_tool_use
+    }.items()
 }
 
 # Human-readable tool specs (used to brief the router LLM)
@@ -392,6 +799,128 @@ def _resolve_args(args: Any, context: Dict[str, Any]) -> Any:
         return [_resolve_args(v, context) for v in args]
     return _resolve_placeholders(args, context)
 
+# -----------------------------------------------------
+# Plan executor: steps form a DAG through their {{tool.field}} / {{last...}}
+# placeholders; independent steps run concurrently on TOOL_EXECUTOR.
+# -----------------------------------------------------
+TOOL_STEP_TIMEOUT = float(os.getenv("TOOL_STEP_TIMEOUT", "10"))
+# context-propagating, so tool spans land in the request's trace
+TOOL_EXECUTOR = tracing.ContextThreadPoolExecutor(max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")),
+                                                  thread_name_prefix="tool")
+_PLACEHOLDER = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+
+def _placeholder_roots(args: Any) -> set:
+    """Top-level context keys referenced by placeholders anywhere in args ('database_info', 'last', ...)."""
+    if isinstance(args, dict):
+        return set().union(*(_placeholder_roots(v) for v in args.values())) if args else set()
+    if isinstance(args, list):
+        return set().union(*(_placeholder_roots(v) for v in args)) if args else set()
+    if isinstance(args, str):
+        return {m.split(".", 1)[0].strip() for m in _PLACEHOLDER.findall(args)}
+    return set()
+
+def plan_dependencies(plan: List[Dict[str, Any]]) -> List[set]:
+    """
+    deps[i] = indexes of earlier steps whose output step i reads. Mirrors the sequential
+    context: {{tool...}} is the latest earlier step of that tool, {{last...}} the previous step.
+    """
+    deps: List[set] = []
+    for i, step in enumerate(plan):
+        d = set()
+        for root in _placeholder_roots(step.get("args", {})):
+            if root == "last":
+                if i > 0:
+                    d.add(i - 1)
+                continue
+            earlier = [j for j in range(i) if plan[j]["tool"] == root]
+            if earlier:
+                d.add(earlier[-1])
+        deps.append(d)
+    return deps
+
+# -----------------------------------------------------
+# Speculative prefetch (AGENT_SPECULATE=1): when the message names a client, the
+# database_info / transaction_history lookups start while the planner LLM is still
+# running. A plan step with the same tool and (default) args takes the running
+# result instead of starting its own call; unclaimed lookups are counted as waste.
+# -----------------------------------------------------
+AGENT_SPECULATE = os.getenv("AGENT_SPECULATE", "0").lower() in ("1", "true", "yes", "on")
+_CLIENT_ID_IN_TEXT = re.compile(r"\bclient\w*(?:[\s_-]*id)?\s*[:#=]?\s*(\d+)\b", re.IGNORECASE)
+_TOOL_DEFAULT_ARGS = {"transaction_history": {"limit": 20}}
+_agent_stats_lock = threading.Lock()
+SPECULATION_STATS = {"requests": 0, "started": 0, "hits": 0, "wasted": 0}
+
+def _count_speculation(name: str, n: int = 1) -> None:
+    with _agent_stats_lock:
+        SPECULATION_STATS[name] += n
+
+def client_id_in_text(text: str) -> Optional[int]:
+    m = _CLIENT_ID_IN_TEXT.search(text or "")
+    return int(m.group(1)) if m else None
+
+def _tool_call_key(tool: str, args: Dict[str, Any]) -> str:
+    full = {**_TOOL_DEFAULT_ARGS.get(tool, {}), **(args or {})}
+    return tool + ":" + json.dumps({k: str(v) for k, v in full.items()}, sort_keys=True)
+
+class Speculation:
+    """
+    Tool calls started ahead of the plan; `take` hands one over to the executor at most once.
+    `cached` holds outputs from earlier turns of the session (by call key): those are handed
+    over as completed futures and never re-run.
+    """
+
+    TOOLS = ("database_info", "transaction_history")
+
+    def __init__(self, client_id: Optional[int] = None, cached: Optional[Dict[str, Any]] = None):
+        self._futures: Dict[str, Any] = {}
+        self._cached = dict(cached or {})
+        if client_id is None:
+            return
+        _count_speculation("requests")
+        for tool in self.TOOLS:
+            args = {"client_id": str(client_id)}
+            key = _tool_call_key(tool, args)
+            if key in self._cached:
+                continue
+            self._futures[key] = TOOL_EXECUTOR.submit(TOOL_REGISTRY[tool], args)
+            _count_speculation("started")
+
+    def take(self, tool: str, args: Dict[str, Any]) -> Optional[Any]:
+        key = _tool_call_key(tool, args)
+        if key in self._cached:
+            fut: Future = Future()
+            fut.set_result(self._cached.pop(key))
+            _count_session_reuse()
+            return fut
+        fut = self._futures.pop(key, None)
+        if fut is not None:
+            _count_speculation("hits")
+        return fut
+
+    def close(self) -> None:
+        wasted, self._futures = self._futures, {}
+        for fut in wasted.values():
+            fut.cancel()
+        if wasted:
+            _count_speculation("wasted", len(wasted))
+
+    def __enter__(self) -> "Speculation":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def speculate(user_message: str, cached: Optional[Dict[str, Any]] = None) -> Speculation:
+    return Speculation(client_id_in_text(user_message) if AGENT_SPECULATE else None, cached)
+
+def _step_context(plan: List[Dict[str, Any]], i: int, outputs: Dict[int, Any]) -> Dict[str, Any]:
+    context: Dict[str, Any] = {}  # exposes keys by tool name and "last"
+    for j in range(i):
+        if j in outputs:
+            context[plan[j]["tool"]] = outputs[j]
+    context["last"] = outputs.get(i - 1)
+    return context
+
 def _tools_catalog_text() -> str:
     lines = []
     for name, spec in TOOL_SPECS.items():
@@ -399,38 +928,55 @@ def _tools_catalog_text() -> str:
         lines.append(f"- {name}: {spec.get('description','')} | args: {args_schema}")
     return "\n".join(lines)
 
-def route_tool_plan(user_message: str) -> Dict[str, Any]:
+# -----------------------------------------------------
+# Fast path: fast_router answers the routing question locally for common intents
+# (small talk, packages for an explicit risk, lookups for a named client); follow-ups
+# that lean on the session history go to the planner.
+# FAST_ROUTER=0 always asks the LLM. Decisions carry "router": "fast:<rule>" | "llm".
+# -----------------------------------------------------
+FAST_ROUTER = (
+    fast_router.FastRouter(TOOL_SPECS, min_confidence=float(os.getenv("FAST_ROUTER_MIN_CONFIDENCE", "0.75")))
+    if os.getenv("FAST_ROUTER", "1").lower() not in ("0", "false", "off", "no")
+    else None
+)
+ROUTER_STATS: Dict[str, Any] = {"fast": 0, "llm": 0, "rules": {}}
+
+def _count_route(path: str) -> str:
+    with _agent_stats_lock:
+        if path == "llm":
+            ROUTER_STATS["llm"] += 1
+        else:
+            ROUTER_STATS["fast"] += 1
+            ROUTER_STATS["rules"][path] = ROUTER_STATS["rules"].get(path, 0) + 1
+    return "llm" if path == "llm" else f"fast:{path}"
+
+def fast_route(user_message: str, *, max_steps: int = 3, history: str = "") -> Optional[fast_router.FastRoute]:
+    if FAST_ROUTER is None:
+        return None
+    route = FAST_ROUTER.route(user_message, client_id_in_text(user_message), has_history=bool(history.strip()))
+    if route is None or len(route.plan) > max_steps:
+        return None
+    return route
+
+@tracing.traced("planner")
+def route_tool_plan(user_message: str, history: str = "") -> Dict[str, Any]:
     """
     Agent 1 (planner): produce a multi-step plan (0..3 steps) of tool calls.
-    Returns a dict: {"plan": [{"tool":..., "args": {...}}, ...], "why": "...", "confidence": float}
+    Returns a dict: {"plan": [{"tool":..., "args": {...}}, ...], "why": "...", "confidence": float, "router": str}
     Use 'skip' with an empty plan when no tools are needed.
+    `history` (session transcript) lets follow-ups refer to earlier turns.
     """
-    tools_text = _tools_catalog_text()
-    router_user_prompt = f'''
-You are a tool-routing planner.
-
-TOOLS AVAILABLE:
-{tools_text}
+    fast = fast_route(user_message, history=history)
+    if fast is not None:
+        return {"plan": fast.plan, "why": fast.why, "confidence": fast.confidence, "router": _count_route(fast.rule)}
 
-Return STRICT JSON only, no prose, matching this schema:
-{{
-  "plan": [{{"tool": "database_info" | "transaction_history" | "investment_packages" | "skip", "args": {{}} }}],
-  "why": "short reason",
-  "confidence": 0.0
-}}
-
-Rules:
-- Prefer the minimal set of steps (0..3).
-- Use "skip" (and an empty plan) when the user's question can be answered without tools.
-- If risk alignment is needed and unknown, first call "database_info" to fetch the client's risk_profile, then call "investment_packages" with {{"risk": "{{database_info.risk_profile}}"}}.
-- Only include tools listed above. Keep args concise; omit defaults.
-- Do NOT include any explanations outside the JSON.
-
-User message:
+    router_user_prompt = f'''
+{history_block(history)}User message:
 """{user_message}"""
     '''.strip()
 
-    raw = ask_model(Reasoning_instructions, router_user_prompt, max_tokens=400, temperature=0.0)
+    raw = ask_model([Reasoning_instructions, _planner_instructions()], router_user_prompt,
+                    max_tokens=400, temperature=0.0, stage="planner")
     parsed = parse_router_json(raw)
     if not isinstance(parsed, dict) or "plan" not in parsed:
         parsed = {"plan": [], "why": "fallback", "confidence": 0.0}
@@ -452,89 +998,250 @@ User message:
     return {
         "plan": clean_plan,
         "why": parsed.get("why", ""),
-        "confidence": float(parsed.get("confidence", 0.0)) if str(parsed.get("confidence", "")).replace('.', '', 1).isdigit() else 0.0
+        "confidence": float(parsed.get("confidence", 0.0)) if str(parsed.get("confidence", "")).replace('.', '', 1).isdigit() else 0.0,
+        "router": _count_route("llm")
     }
 
-def run_agentic_flow_v2(user_message: str) -> Dict[str, Any]:
-    """
-    Execute a multi-step plan from Agent 1, collect results, then have Agent 2 answer.
-    - Executes steps sequentially with simple placeholder resolution between steps.
-    - Attaches all tool outputs as supplemental context for the final answerer.
-    """
-    decision = route_tool_plan(user_message)
-    plan: List[Dict[str, Any]] = decision.get("plan", [])
-    results: List[Dict[str, Any]] = []
-    context: Dict[str, Any] = {}  # exposes keys by tool name and "last"
+def _planner_instructions() -> str:
+    """Static planner prompt (tool catalog + output contract); byte-identical across calls so it caches."""
+    tools_text = _tools_catalog_text()
+    return f'''
+You are a tool-routing planner.
 
-    for step in plan:
-        tool_name = step["tool"]
-        raw_args = step.get("args", {})
-        args = _resolve_args(raw_args, {**context, "last": context.get("last")})
-        try:
-            payload = TOOL_REGISTRY[tool_name](args)
-        except Exception as e:
-            payload = {"error": f"Tool '{tool_name}' failed: {e}", "args": args}
-        results.append({"tool": tool_name, "args": args, "output": payload})
-        # update context
-        context[tool_name] = payload
-        context["last"] = payload
+TOOLS AVAILABLE:
+{tools_text}
 
-    supplemental = ""
+Return STRICT JSON only, no prose, matching this schema:
+{{
+  "plan": [{{"tool": "database_info" | "transaction_history" | "investment_packages" | "skip", "args": {{}} }}],
+  "why": "short reason",
+  "confidence": 0.0
+}}
+
+Rules:
+- Prefer the minimal set of steps (0..3).
+- Use "skip" (and an empty plan) when the user's question can be answered without tools.
+- If risk alignment is needed and unknown, first call "database_info" to fetch the client's risk_profile, then call "investment_packages" with {{"risk": "{{database_info.risk_profile}}"}}.
+- Only include tools listed above. Keep args concise; omit defaults.
+- Do NOT include any explanations outside the JSON.
+    '''.strip()
+
+def execute_tool_plan(plan: List[Dict[str, Any]],
+                      prefetched: Optional[Speculation] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Runs the plan as a DAG (see plan_dependencies): a step starts as soon as the steps it
+    references are done, independent steps run concurrently. Each step gets TOOL_STEP_TIMEOUT
+    seconds; a late step is reported as an error (its thread cannot be interrupted and
+    finishes in the background). Steps matching a `prefetched` call reuse it.
+    Yields (step_index, {"tool", "args", "output"}) in completion order.
+    """
+    deps = plan_dependencies(plan)
+    outputs: Dict[int, Any] = {}
+    waiting = list(range(len(plan)))
+    running: Dict[Any, Tuple[int, Any, float]] = {}  # future -> (step, args, deadline)
+    while waiting or running:
+        for i in [i for i in waiting if deps[i] <= outputs.keys()]:
+            waiting.remove(i)
+            args = _resolve_args(plan[i].get("args", {}), _step_context(plan, i, outputs))
+            fut = prefetched.take(plan[i]["tool"], args) if prefetched is not None else None
+            if fut is None:
+                fut = TOOL_EXECUTOR.submit(TOOL_REGISTRY[plan[i]["tool"]], args)
+            running[fut] = (i, args, time.monotonic() + TOOL_STEP_TIMEOUT)
+        next_deadline = min(d for _, _, d in running.values())
+        done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for fut, (i, args, deadline) in list(running.items()):
+            tool_name = plan[i]["tool"]
+            if fut in done:
+                try:
+                    payload = fut.result()
+                except Exception as e:
+                    payload = {"error": f"Tool '{tool_name}' failed: {e}", "args": args}
+            elif now >= deadline:
+                fut.cancel()
+                payload = {"error": f"Tool '{tool_name}' timed out after {TOOL_STEP_TIMEOUT:g}s", "args": args}
+            else:
+                continue
+            del running[fut]
+            outputs[i] = payload
+            yield i, {"tool": tool_name, "args": args, "output": payload}
+
+def run_tool_plan(plan: List[Dict[str, Any]], prefetched: Optional[Speculation] = None) -> List[Dict[str, Any]]:
+    """All step results, in plan order."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(plan)
+    for i, result in execute_tool_plan(plan, prefetched):
+        results[i] = result
+    return results
+
+def answerer_prompt_v2(user_message: str, plan: List[Dict[str, Any]], results: List[Dict[str, Any]],
+                       history: str = "") -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Returns (prompt, context report); the report is None when no tool ran."""
+    supplemental, report = "", None
     if results:
-        supplemental = "\n\n[Supplemental data extracted via tools]\n" + json.dumps(
-            {"plan": plan, "results": results},
-            ensure_ascii=False, indent=2
-        )
+        with tracing.span("serialize.context"):
+            text, report = ANSWER_CONTEXT.build(plan, results)
+        supplemental = "\n\n[Supplemental data extracted via tools]\n" + text
+        _count_context(report)
 
     answerer_user_prompt = f"""\
 Answer the next user's question. Mentor them and be specific. If supplemental data is provided, use it to tailor the answer; otherwise proceed normally.
 
-User question:
+{history_block(history)}User question:
 \"\"\"{user_message}\"\"\"
 {supplemental}
 """
-    final_text = ask_model(Question_instructions, answerer_user_prompt, max_tokens=900, temperature=0.7)
+    return answerer_user_prompt, report
+
+def run_agentic_flow_v2(user_message: str, turn: Optional["Turn"] = None) -> Dict[str, Any]:
+    """
+    Execute a multi-step plan from Agent 1, collect results, then have Agent 2 answer.
+    - Executes steps as a DAG: placeholder references order dependent steps, the rest run in parallel.
+    - Attaches all tool outputs as supplemental context for the final answerer.
+    - With AGENT_SPECULATE=1, client lookups overlap the planner call (see Speculation).
+    - With a session turn, the planner and answerer see the windowed history and
+      tool outputs from earlier turns are reused (see SESSIONS).
+    """
+    turn = turn or NO_TURN
+    with speculate(user_message, turn.tools) as spec:
+        decision = route_tool_plan(user_message, turn.history)
+        plan: List[Dict[str, Any]] = decision.get("plan", [])
+        results = run_tool_plan(plan, spec)
+    prompt, context = answerer_prompt_v2(user_message, plan, results, turn.history)
+    final_text = ask_model(Question_instructions, prompt, max_tokens=900, temperature=0.7, stage="answerer")
+    close_turn(turn, user_message, final_text, results)
 
     return {
         "plan": plan,
         "results": results,
         "final_answer": final_text,
         "why": decision.get("why", ""),
-        "confidence": decision.get("confidence", 0.0)
+        "confidence": decision.get("confidence", 0.0),
+        "router": decision.get("router", "llm"),
+        "context": context
     }
 
+def stream_agentic_flow_v2(user_message: str, turn: Optional["Turn"] = None) -> Iterator[str]:
+    """SSE variant of run_agentic_flow_v2: plan event, one tool event per step, answer tokens, done."""
+    turn = turn or NO_TURN
+    with speculate(user_message, turn.tools) as spec:
+        decision = route_tool_plan(user_message, turn.history)
+        plan: List[Dict[str, Any]] = decision.get("plan", [])
+        yield sse_event("plan", {"tool_plan": plan, "why": decision.get("why", ""),
+                                 "confidence": decision.get("confidence", 0.0),
+                                 "router": decision.get("router", "llm")})
+        results: List[Optional[Dict[str, Any]]] = [None] * len(plan)
+        for i, result in execute_tool_plan(plan, spec):
+            results[i] = result
+            yield sse_event("tool", {"step": i, **result})
+    parts: List[str] = []
+    prompt, context = answerer_prompt_v2(user_message, plan, results, turn.history)
+    yield from stream_answer(Question_instructions, prompt, max_tokens=900, parts=parts)
+    final_text = "".join(parts).strip()
+    close_turn(turn, user_message, final_text, results)
+    yield sse_event("done", {
+        "response": final_text,
+        "tool_plan": plan,
+        "tool_results": results,
+        "why": decision.get("why", ""),
+        "confidence": decision.get("confidence", 0.0),
+        "router": decision.get("router", "llm"),
+        "context": context
+    })
+
 # -----------------------------------------------------
 # Agentic orchestration: Router (Agent 1) + Answerer (Agent 2)
+def _run_readonly_sync(sql: str, statement_timeout_ms: int = 5000) -> Tuple[List[str], List[tuple]]:
+    # SQL generat de LLM: set_config(..., false), advisory locks sau LISTEN trec de tranzacția
+    # read-only, deci conexiunea primește DISCARD ALL înainte să revină în pool
+    with db.connection(reset=True) as conn, conn.cursor() as cur, tracing.span("db.query"):
+        # session-level safety
+        cur.execute("SET LOCAL default_transaction_read_only = on;")
+        cur.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)};")
+        cur.execute(sql)
+        return [desc[0] for desc in cur.description], cur.fetchall()
+
+# Slow-query log pentru SQL-ul generat de LLM (vezi slow_queries.py); GET /queries/slow
+# SLOW_QUERY_LOG=on|off, SLOW_QUERY_MS = pragul, EXPLAIN eșantionat în fundal
+SLOW_QUERIES = slow_queries.SlowQueryLog(
+    lambda: db.connection(reset=True),  # EXPLAIN ANALYZE re-rulează SQL-ul generat
+    threshold_ms=float(os.getenv("SLOW_QUERY_MS", "500")),
+    max_fingerprints=int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "500")),
+    max_samples=int(os.getenv("SLOW_QUERY_SAMPLES", "3")),
+    explain_rate=float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1")),
+    explain_interval=float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60")),
+    explain_timeout_ms=int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "10000")),
+) if os.getenv("SLOW_QUERY_LOG", "on").lower() not in ("0", "off", "false", "no") else None
+
+@app.get("/queries/slow")
+def slow_query_report(limit: int = Query(20, ge=1, le=500), plans: bool = False):
+    """Slow /prompt queries grouped by fingerprint, by total time; plans=true includes the EXPLAIN JSON."""
+    if SLOW_QUERIES is None:
+        return {"enabled": False}
+    return {"stats": SLOW_QUERIES.stats(), "fingerprints": SLOW_QUERIES.top(limit, include_plans=plans)}
+
+@app.delete("/queries/slow")
+def reset_slow_queries():
+    if SLOW_QUERIES is not None:
+        SLOW_QUERIES.reset()
+    return {"ok": True}
+
 @app.post("/prompt")
-def run_prompt(body: PromptIn):
-    sql = nl_to_sql(body.prompt, body.table_hint)
+async def run_prompt(body: PromptIn, request: Request, response: Response):
+    fmt = negotiate_format(request)
+    bypass = cache_bypassed(request)
+    sql, cache_status = await run_in_threadpool(cached_nl_to_sql, body.prompt, body.table_hint, bypass=bypass)
+    response.headers["X-NL-SQL-Cache"] = cache_status
 
     low = sql.lower().lstrip()
     if not (low.startswith("select") or low.startswith("with")):
         # enforce read-only contract: run only SELECT/WITH
         raise HTTPException(status_code=400, detail="Generated query is not read-only (SELECT/WITH).")
 
+    admitted = "OFF"
+    if ADMISSION is not None:
+        try:
+            with tracing.span("admission"):
+                verdict = await run_in_threadpool(ADMISSION.check, sql)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail={"error": str(e), "sql": sql})
+        admitted = verdict.action.upper()
+        if verdict.action == admission.REJECT:
+            raise HTTPException(status_code=400, detail={
+                "error": f"Generated query rejected: {verdict.reason}",
+                "sql": sql,
+                "estimate": {"cost": verdict.cost, "rows": verdict.rows},
+            })
+        sql = verdict.sql
+    response.headers["X-Query-Admission"] = admitted
+
+    started = time.perf_counter()
     try:
-        with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # session-level safety
-            cur.execute("SET LOCAL default_transaction_read_only = on;")
-            cur.execute("SET LOCAL statement_timeout = 5000;")  # 5s
-            cur.execute(sql)
-            rows = cur.fetchall()
-        return {"sql": sql, "rows": rows}
+        if db_async.enabled():
+            columns, rows = await db_async.pool.fetch_readonly(sql, statement_timeout_ms=5000)  # 5s
+        else:
+            columns, rows = await run_in_threadpool(_run_readonly_sync, sql, 5000)
     except Exception as e:
+        if SLOW_QUERIES is not None:
+            SLOW_QUERIES.record("prompt", sql, time.perf_counter() - started, error=e)
+        if isinstance(e, db.PoolTimeout):
+            raise _db_http_error(e)
         # return error + sql for debugging
         raise HTTPException(status_code=500, detail={"error": str(e), "sql": sql})
+    if SLOW_QUERIES is not None:
+        SLOW_QUERIES.record("prompt", sql, time.perf_counter() - started, rows=len(rows))
+    if fmt:
+        resp = columnar_response(fmt, columns, rows, {"sql": sql})
+        resp.headers["X-NL-SQL-Cache"] = cache_status
+        resp.headers["X-Query-Admission"] = admitted
+        return resp
+    return json_response(lambda: {"sql": sql, "rows": [dict(zip(columns, row)) for row in rows]},
+                         {"X-NL-SQL-Cache": cache_status, "X-Query-Admission": admitted})
 
 
 # -----------------[ Local DB toolkit (decoupled from bd.py) ]-----------------
 # Baza corectă (service name din Docker). Poți suprascrie cu .env: PG_API_BASE=http://skepya-api:8080
 PG_API_BASE = os.getenv("PG_API_BASE", "http://skepya-api:8080")
 
-# helper: escape pentru string literal SQL
-def _sqlesc(s: str) -> str:
-    return s.replace("'", "''")
-
 # helper: parse ISO (acceptă '2025-10-01' sau '2025-10-01T00:00:00Z')
 def _date_iso(dt: Optional[str]) -> Optional[str]:
     if not dt:
@@ -545,23 +1252,52 @@ def _date_iso(dt: Optional[str]) -> Optional[str]:
     except Exception:
         return None
 
-def _pg_query(sql: str):
-    # încearcă în ordine câteva baze (ENV > service name > localhost)
-    bases = [
-        PG_API_BASE,
-        "http://skepya-api:8080",
-        "http://localhost:8080",
-    ]
-    last_err = None
-    for base in bases:
+# Mod de execuție pentru _pg_query:
+# - "inprocess" (implicit): direct pe pool-ul local, fără hop HTTP
+# - "remote": prin serviciul Flask /query (sesiune keep-alive, circuit breaker per bază, deadline per apel)
+PG_QUERY_MODE = os.getenv("PG_QUERY_MODE", "inprocess").lower()
+
+_pg_remote = pg_remote.RemoteQueryClient(
+    # încearcă în ordine câteva baze (ENV > service name > localhost); ultima bună are prioritate
+    [PG_API_BASE, "http://skepya-api:8080", "http://localhost:8080"],
+    deadline=float(os.getenv("PG_QUERY_DEADLINE", "10")),
+    attempt_timeout=float(os.getenv("PG_QUERY_ATTEMPT_TIMEOUT", "5")),
+    failure_threshold=int(os.getenv("PG_QUERY_BREAKER_FAILURES", "3")),
+    reset_timeout=float(os.getenv("PG_QUERY_BREAKER_RESET", "30")),
+)
+
+def _pg_query_inprocess(sql: str, params: Optional[List[Any]] = None, prepare_name: Optional[str] = None):
+    """Same contract as the Flask /query service: list of row dicts, commit on success."""
+    with get_conn() as conn, conn.cursor() as cur, tracing.span("db.query"):
+        if prepare_name:
+            db.execute_prepared(cur, prepare_name, sql, params)
+        else:
+            cur.execute(sql, params or None)
+        if not cur.description:
+            return []
+        columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+def _pg_query(sql: str, params: Optional[List[Any]] = None, *,
+              prepare_name: Optional[str] = None, deadline: Optional[float] = None):
+    """
+    Run one statement and return row dicts. `params` bind to %s placeholders; with
+    `prepare_name` the in-process mode runs it as a per-connection prepared statement.
+    """
+    if PG_QUERY_MODE != "remote":
         try:
-            r = requests.post(f"{base}/query", json={"sql": sql}, timeout=10)
-            if r.status_code == 200:
-                return r.json()
-            last_err = f"{r.status_code} {r.text}"
+            return _pg_query_inprocess(sql, params, prepare_name)
         except Exception as e:
-            last_err = str(e)
-    raise HTTPException(status_code=500, detail={"error": last_err, "sql": sql})
+            raise HTTPException(status_code=500, detail={"error": str(e), "sql": sql})
+    try:
+        with tracing.span("db.remote_query"):
+            return _pg_remote.query(sql, params, deadline=deadline)
+    except pg_remote.QueryError as e:
+        raise HTTPException(status_code=500, detail=e.detail)
+
+@app.get("/pg/stats")
+def pg_query_stats():
+    return {"mode": PG_QUERY_MODE, "remote": _pg_remote.stats()}
 
 # ----------------- MODELE INPUT -----------------
 
@@ -578,71 +1314,92 @@ class RiskRequest(BaseModel):
     client_id: int
 
 # ----------------- SQL BUILDERS -----------------
+# Builders return parameterized statements. Every TxRequest maps to one of three
+# fixed shapes, so each shape is PREPAREd once per pooled connection and reused.
 
-def build_sql_client_transactions(p: TxRequest) -> str:
-    # Coloane reale: public.transactions(client_id, transaction_date, amount, category)
-    where = [f"t.client_id = {int(p.client_id)}"]
-
-    df = _date_iso(p.date_from)
-    dt = _date_iso(p.date_to)
-    if df:
-        where.append(f"t.transaction_date >= '{_sqlesc(df)}'")
-    if dt:
-        where.append(f"t.transaction_date <= '{_sqlesc(dt)}'")  # inclusiv
-
-    if p.category:
-        where.append(f"t.category ILIKE '%{_sqlesc(p.category)}%'")
-
-    if p.min_amount is not None:
-        where.append(f"t.amount >= {float(p.min_amount)}")
+class PreparedQuery(NamedTuple):
+    name: str            # prepared statement name, one per distinct SQL text
+    sql: str             # psycopg2 %s placeholders
+    params: List[Any]
 
-    if p.max_amount is not None:
-        where.append(f"t.amount <= {float(p.max_amount)}")
-
-    where_sql = " AND ".join(where)
-
-    return f"""
+_TX_SELECT = """
     SELECT
       t.id,
       t.transaction_date,
       t.amount,
       t.category
     FROM public.transactions t
-    WHERE {where_sql}
+    WHERE t.client_id = %s::int"""
+
+_TX_ORDER = """
     ORDER BY t.transaction_date DESC, t.id DESC
-    LIMIT {int(p.limit)}
-    """.strip()
+    LIMIT %s::int"""
 
-def build_sql_client_risk(client_id: int) -> str:
+_TX_DATES = """
+      AND t.transaction_date BETWEEN %s::date AND %s::date"""
+
+_TX_FILTERS = """
+      AND (%s::text IS NULL OR t.category ILIKE %s::text)
+      AND (%s::numeric IS NULL OR t.amount >= %s::numeric)
+      AND (%s::numeric IS NULL OR t.amount <= %s::numeric)"""
+
+def build_sql_client_transactions(p: TxRequest) -> PreparedQuery:
+    # Coloane reale: public.transactions(client_id, transaction_date, amount, category)
+    df = _date_iso(p.date_from)
+    dt = _date_iso(p.date_to)
+    has_dates = bool(df or dt)
+    has_filters = bool(p.category) or p.min_amount is not None or p.max_amount is not None
+
+    params: List[Any] = [int(p.client_id)]
+    if not has_dates and not has_filters:
+        return PreparedQuery("tx_by_client", (_TX_SELECT + _TX_ORDER).strip(), params + [int(p.limit)])
+
+    # intervalul deschis folosește ±infinity, ca predicatul să rămână un range pe index
+    params += [df or "-infinity", dt or "infinity"]  # date_to inclusiv
+    if not has_filters:
+        return PreparedQuery("tx_by_client_dates", (_TX_SELECT + _TX_DATES + _TX_ORDER).strip(),
+                             params + [int(p.limit)])
+
+    category = f"%{p.category}%" if p.category else None  # filtrare parțială (ILIKE)
+    min_amount = float(p.min_amount) if p.min_amount is not None else None
+    max_amount = float(p.max_amount) if p.max_amount is not None else None
+    params += [category, category, min_amount, min_amount, max_amount, max_amount]
+    return PreparedQuery("tx_by_client_filtered", (_TX_SELECT + _TX_DATES + _TX_FILTERS + _TX_ORDER).strip(),
+                         params + [int(p.limit)])
+
+def build_sql_client_risk(client_id: int) -> PreparedQuery:
     # Coloane reale: public.clients(id, name, risk_rating, ...)
-    cid = int(client_id)
-    return f"""
+    return PreparedQuery("client_risk", """
     SELECT
       c.id AS client_id,
       c.name,
       c.risk_rating
     FROM public.clients c
-    WHERE c.id = {cid}
+    WHERE c.id = %s::int
     LIMIT 1
-    """.strip()
+    """.strip(), [int(client_id)])
 
 @app.post("/fn/transactions")
-def fn_transactions(body: TxRequest):
-    sql = build_sql_client_transactions(body)
+async def fn_transactions(body: TxRequest):
+    q = build_sql_client_transactions(body)
     try:
-        rows = _pg_query(sql)
-        return {"sql": sql, "rows": rows}
+        rows, status = await run_in_threadpool(client_lookup, body.client_id, q)
     except Exception as e:
-        raise HTTPException(status_code=500, detail={"error": str(e), "sql": sql})
+        if isinstance(e, db.PoolTimeout):
+            raise _db_http_error(e)
+        raise HTTPException(status_code=500, detail={"error": str(e), "sql": q.sql})
+    return json_response(lambda: {"sql": q.sql, "params": q.params, "rows": rows}, {"X-Client-Cache": status})
 
 @app.post("/fn/risk")
-def fn_risk(body: RiskRequest):
-    sql = build_sql_client_risk(body.client_id)
+async def fn_risk(body: RiskRequest):
+    q = build_sql_client_risk(body.client_id)
     try:
-        rows = _pg_query(sql)
-        return {"sql": sql, "rows": rows}
+        rows, status = await run_in_threadpool(client_lookup, body.client_id, q)
     except Exception as e:
-        raise HTTPException(status_code=500, detail={"error": str(e), "sql": sql})
+        if isinstance(e, db.PoolTimeout):
+            raise _db_http_error(e)
+        raise HTTPException(status_code=500, detail={"error": str(e), "sql": q.sql})
+    return json_response(lambda: {"sql": q.sql, "params": q.params, "rows": rows}, {"X-Client-Cache": status})
 
 def normalize_risk(value: Optional[str]) -> str:
     """
@@ -660,21 +1417,43 @@ def normalize_risk(value: Optional[str]) -> str:
     return mapping.get(v, "mediu")
 # -----------------------------------------------------
 
-def route_tool_decision(user_message: str) -> Dict[str, Any]:
+@tracing.traced("router")
+def route_tool_decision(user_message: str, history: str = "") -> Dict[str, Any]:
     """
     Agent 1: decides whether a function call is needed and with what args.
-    Returns a dict: {"tool": "...", "args": {...}, "why": "...", "confidence": float}
+    Returns a dict: {"tool": "...", "args": {...}, "why": "...", "confidence": float, "router": str}
     """
+    fast = fast_route(user_message, max_steps=1, history=history)  # this flow runs a single tool
+    if fast is not None:
+        step = fast.plan[0] if fast.plan else {"tool": "skip", "args": {}}
+        return {"tool": step["tool"], "args": step["args"], "why": fast.why, "confidence": fast.confidence,
+                "router": _count_route(fast.rule)}
     router_user_prompt = f'''
+{history_block(history)}User message:
+"""{user_message}"""
+    '''.strip()
+
+    raw = ask_model([Reasoning_instructions, ROUTER_DECISION_INSTRUCTIONS], router_user_prompt,
+                    max_tokens=300, temperature=0.0, stage="router")
+    parsed = parse_router_json(raw) or {"tool": "skip", "args": {}, "why": "fallback", "confidence": 0.0}
+    # Validate keys
+    tool = parsed.get("tool", "skip")
+    args = parsed.get("args", {}) if isinstance(parsed.get("args", {}), dict) else {}
+    why = parsed.get("why", "")
+    conf = float(parsed.get("confidence", 0.0)) if str(parsed.get("confidence", "")).replace('.', '', 1).isdigit() else 0.0
+    return {"tool": tool, "args": args, "why": why, "confidence": conf, "router": _count_route("llm")}
+
+# Static single-tool router prompt (cached system prefix, see PROMPT_CACHE)
+ROUTER_DECISION_INSTRUCTIONS = '''
 You are a tool-routing planner.
 
 Return STRICT JSON only, no prose, matching this schema:
-{{
+{
   "tool": "database_info" | "transaction_history" | "investment_packages" | "skip",
-  "args": {{ }},
+  "args": { },
   "why": "short reason",
   "confidence": 0.0
-}}
+}
 
 The decision rule:
 - If the user's question can be properly answered without up-to-date client data, choose "skip".
@@ -682,112 +1461,265 @@ The decision rule:
 - Choose "transaction_history" if you need recent activity/holdings to answer precisely.
 - Choose "investment_packages" if the user is asking what packages exist or wants product details.
 - When choosing investment packages, if the client's risk category is known or provided by the user, include args like {"risk": "usor|mediu|ridicat"} to align with it.
+'''.strip()
 
-User message:
-"""{user_message}"""
-    '''.strip()
-
-    raw = ask_model(Reasoning_instructions, router_user_prompt, max_tokens=300, temperature=0.0)
-    parsed = parse_router_json(raw) or {"tool": "skip", "args": {}, "why": "fallback", "confidence": 0.0}
-    # Validate keys
-    tool = parsed.get("tool", "skip")
-    args = parsed.get("args", {}) if isinstance(parsed.get("args", {}), dict) else {}
-    why = parsed.get("why", "")
-    conf = float(parsed.get("confidence", 0.0)) if str(parsed.get("confidence", "")).replace('.', '', 1).isdigit() else 0.0
-    return {"tool": tool, "args": args, "why": why, "confidence": conf}
-
-def run_agentic_flow(user_message: str) -> Dict[str, Any]:
-    """
-    Orchestrates the two-agent flow. Agent 1 picks a tool (or skip),
-    its output (if any) is appended as context for Agent 2 to craft the final answer.
-    """
-    decision = route_tool_decision(user_message)
+def run_decided_tool(decision: Dict[str, Any], cached: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     tool_name = decision["tool"]
     tool_args = decision["args"]
 
     tool_payload: Optional[Dict[str, Any]] = None
-    if tool_name in TOOL_REGISTRY:
+    key = _tool_call_key(tool_name, tool_args)
+    if cached and key in cached:
+        _count_session_reuse()
+        tool_payload = cached[key]
+    elif tool_name in TOOL_REGISTRY:
         try:
             tool_payload = TOOL_REGISTRY[tool_name](tool_args)
         except Exception as e:
             tool_payload = {"error": f"Tool '{tool_name}' failed: {e}"}
     else:
         tool_payload = {"warning": f"Unknown tool '{tool_name}', skipping."}
-
-    # Prepare the final user message for Agent 2 (Answerer)
-    supplemental = ""
-    if tool_name != "skip" and tool_payload is not None:
-        supplemental = "\n\n[Supplemental data extracted via tool-call]\n" + json.dumps(tool_payload, ensure_ascii=False, indent=2)
+    return tool_payload
+
+def answerer_prompt(user_message: str, decision: Dict[str, Any], tool_payload: Optional[Dict[str, Any]],
+                    history: str = "") -> Tuple[str, Optional[Dict[str, Any]]]:
+    # Prepare the final user message for Agent 2 (Answerer); returns (prompt, context report or None)
+    supplemental, report = "", None
+    if decision["tool"] != "skip" and tool_payload is not None:
+        with tracing.span("serialize.context"):
+            text, report = ANSWER_CONTEXT.build_single(decision["tool"], decision.get("args") or {}, tool_payload)
+        supplemental = "\n\n[Supplemental data extracted via tool-call]\n" + text
+        _count_context(report)
 
     answerer_user_prompt = f"""\
 Answer the next user's question. Mentor them and be specific. If supplemental data is provided, use it to tailor the answer, otherwise proceed normally.
 
-User question:
+{history_block(history)}User question:
 \"\"\"{user_message}\"\"\"
 {supplemental}
 """
-    final_text = ask_model(Question_instructions, answerer_user_prompt, max_tokens=700, temperature=0.7)
+    return answerer_user_prompt, report
+
+def run_agentic_flow(user_message: str, turn: Optional["Turn"] = None) -> Dict[str, Any]:
+    """
+    Orchestrates the two-agent flow. Agent 1 picks a tool (or skip),
+    its output (if any) is appended as context for Agent 2 to craft the final answer.
+    With a session turn, both agents see the windowed history (see SESSIONS).
+    """
+    turn = turn or NO_TURN
+    decision = route_tool_decision(user_message, turn.history)
+    tool_payload = run_decided_tool(decision, turn.tools)
+    prompt, context = answerer_prompt(user_message, decision, tool_payload, turn.history)
+    final_text = ask_model(Question_instructions, prompt, max_tokens=700, temperature=0.7, stage="answerer")
+    close_turn(turn, user_message, final_text, [{"tool": decision["tool"], "args": decision["args"], "output": tool_payload}])
 
     return {
         "decision": decision,
         "tool_output": tool_payload,
-        "final_answer": final_text
+        "final_answer": final_text,
+        "context": context
     }
+
+def stream_agentic_flow(user_message: str, turn: Optional["Turn"] = None) -> Iterator[str]:
+    """SSE variant of run_agentic_flow: plan (the router decision), tool, answer tokens, done."""
+    turn = turn or NO_TURN
+    decision = route_tool_decision(user_message, turn.history)
+    yield sse_event("plan", {"tool_decision": decision})
+    tool_payload = run_decided_tool(decision, turn.tools)
+    yield sse_event("tool", {"tool": decision["tool"], "output": tool_payload})
+    parts: List[str] = []
+    prompt, context = answerer_prompt(user_message, decision, tool_payload, turn.history)
+    yield from stream_answer(Question_instructions, prompt, max_tokens=700, parts=parts)
+    final_text = "".join(parts).strip()
+    close_turn(turn, user_message, final_text, [{"tool": decision["tool"], "args": decision["args"], "output": tool_payload}])
+    yield sse_event("done", {
+        "response": final_text,
+        "tool_decision": decision,
+        "tool_output_preview": tool_payload,
+        "context": context
+    })
 # -----------------------------------------------------
 # Funcția care apelează modelul Claude
 # -----------------------------------------------------
 
 def ask_claude(message: str) -> str:
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 500,
-        "temperature": 0.7,
-        "messages": [
-            {"role": "user", "content": message}
-        ],
-        "system": [
-        {
-            "type": "text",
-            "text": Question_instructions
-        }
-    ]
-    }
+    return ask_model(Question_instructions, message, max_tokens=CHAT_MAX_TOKENS, temperature=CHAT_TEMPERATURE,
+                     stage="chat")
+
+# -----------------------------------------------------
+# /chat response cache (see response_cache.py)
+# /chat has no history or client data, so the same question gets an equivalent answer.
+# Keyed by normalized message + model + system prompt hash + settings; concurrent
+# identical misses share one Bedrock call. CHAT_CACHE=off|memory|sqlite (default off).
+# Status in the X-Chat-Cache header; `X-Cache-Bypass: 1` forces a fresh answer.
+# -----------------------------------------------------
+CHAT_MAX_TOKENS = 500
+CHAT_TEMPERATURE = 0.7
+
+_chat_backend = cache.make_cache(
+    os.getenv("CHAT_CACHE", "off"),
+    path=os.getenv("CHAT_CACHE_PATH", "chat_cache.sqlite3"),
+    max_entries=int(os.getenv("CHAT_CACHE_MAX", "1024")),
+    ttl=float(os.getenv("CHAT_CACHE_TTL", "600")),
+)
+CHAT_CACHE = response_cache.ResponseCache(_chat_backend) if _chat_backend is not None else None
+
+def _chat_key(message: str) -> str:
+    return response_cache.response_key(normalize_prompt(message), model_id=MODEL_ID, system_text=Question_instructions,
+                                       max_tokens=CHAT_MAX_TOKENS, temperature=CHAT_TEMPERATURE)
+
+def cached_ask_claude(message: str, *, bypass: bool = False) -> Tuple[str, str]:
+    """Returns (reply, cache_status) with cache_status in HIT | MISS | SHARED | BYPASS | OFF."""
+    if CHAT_CACHE is None:
+        return ask_claude(message), "OFF"
+    return CHAT_CACHE.get_or_compute(_chat_key(message), lambda: ask_claude(message), bypass=bypass)
+
+def stream_chat(message: str, *, bypass: bool = False) -> Iterator[str]:
+    """
+    SSE /chat: a cached answer is replayed as one token event; a fresh one is streamed
+    and stored once complete (streams do not collapse onto each other).
+    """
+    key = _chat_key(message) if CHAT_CACHE is not None else None
+    hit = CHAT_CACHE.get(key) if key is not None and not bypass else None
+    if hit is not None:
+        yield sse_event("token", {"text": hit})
+        yield sse_event("done", {"response": hit, "cache": "HIT"})
+        return
+    parts: List[str] = []
+    yield from stream_answer(Question_instructions, message, max_tokens=CHAT_MAX_TOKENS,
+                             temperature=CHAT_TEMPERATURE, parts=parts, stage="chat")
+    reply = "".join(parts).strip()
+    status = "OFF"
+    if key is not None:
+        CHAT_CACHE.set(key, reply)
+        status = "BYPASS" if bypass else "MISS"
+    yield sse_event("done", {"response": reply, "cache": status})
 
-    try:
-        response = bedrock.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps(body)
-        )
-        result = json.loads(response["body"].read())
-        reply = result["content"][0]["text"].strip()
-        return reply
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Bedrock/Claude error: {str(e)}")
 # -----------------------------------------------------
 # Endpoint de chat
 # -----------------------------------------------------
 
 @app.post("/chat")
-def chat_endpoint(input: ChatInput):
-    reply = ask_claude(input.message)
+def chat_endpoint(input: ChatInput, request: Request, response: Response):
+    bypass = cache_bypassed(request)
+    if wants_sse(request):
+        return sse_response(stream_chat(input.message, bypass=bypass))
+    reply, status = cached_ask_claude(input.message, bypass=bypass)
+    response.headers["X-Chat-Cache"] = status
     return {"response": reply}
 # -----------------------------------------------------
+# Conversation sessions for the agent endpoints (see sessions.py)
+# ChatInput.session_id opts in: the last SESSION_WINDOW_TURNS turns plus a rolling
+# summary of older ones go into the router/planner and answerer prompts, and tool
+# outputs are reused across turns for SESSION_TOOL_TTL seconds.
+# SESSION_STORE=memory|sqlite|postgres|off
+# -----------------------------------------------------
+SESSION_SUMMARY_INSTRUCTIONS = (
+    "You keep a running summary of a conversation between a bank client and a financial assistant. "
+    "Merge the previous summary and the new turns into one short paragraph (at most 120 words): "
+    "client ids and names, risk profile, goals, products discussed, open questions. Facts only, no advice."
+)
+
+def _summarize_turns(previous: str, turns: List[Dict[str, str]]) -> str:
+    transcript = "\n".join(f"User: {t['user']}\nAssistant: {t['assistant']}" for t in turns)
+    return ask_model(SESSION_SUMMARY_INSTRUCTIONS,
+                     f"Previous summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}",
+                     max_tokens=250, temperature=0.0, stage="summary")
+
+def _session_backend():
+    kind = os.getenv("SESSION_STORE", "memory").lower()
+    ttl = float(os.getenv("SESSION_TTL", "86400"))
+    if kind == "postgres":
+        return sessions.PgSessionBackend(get_conn, ttl=ttl)
+    return cache.make_cache(kind, path=os.getenv("SESSION_PATH", "sessions.sqlite3"),
+                            max_entries=int(os.getenv("SESSION_MAX", "4096")), ttl=ttl)
+
+_session_store_backend = _session_backend()
+SESSIONS = (
+    sessions.SessionStore(
+        _session_store_backend,
+        window_turns=int(os.getenv("SESSION_WINDOW_TURNS", "4")),
+        turn_chars=int(os.getenv("SESSION_TURN_CHARS", "1200")),
+        summary_chars=int(os.getenv("SESSION_SUMMARY_CHARS", "1200")),
+        tool_ttl=float(os.getenv("SESSION_TOOL_TTL", "120")),
+        summarize=_summarize_turns,
+    )
+    if _session_store_backend is not None
+    else None
+)
+# summaries are folded in after the response, off the request path
+SESSION_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session")
+
+class Turn(NamedTuple):
+    session_id: Optional[str]
+    history: str             # bounded transcript (summary + window), "" when stateless
+    tools: Dict[str, Any]    # tool outputs from earlier turns, by _tool_call_key
+
+NO_TURN = Turn(None, "", {})
+
+def history_block(history: str) -> str:
+    return f"[Conversation so far]\n{history}\n\n" if history else ""
+
+def _count_session_reuse() -> None:
+    if SESSIONS is not None:
+        SESSIONS.note_tool_reuse()
+
+def open_turn(session_id: Optional[str]) -> Turn:
+    if not session_id or SESSIONS is None:
+        return NO_TURN
+    try:
+        state = SESSIONS.load(session_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Session store unavailable: {e}")
+    return Turn(session_id, SESSIONS.history_text(state), SESSIONS.tool_outputs(state))
+
+def close_turn(turn: Turn, user_message: str, answer: str, calls: List[Optional[Dict[str, Any]]]) -> None:
+    """Records the turn; failed tool calls are not kept for reuse."""
+    if turn.session_id is None or SESSIONS is None:
+        return
+    outputs = {
+        _tool_call_key(c["tool"], c["args"]): c["output"]
+        for c in calls
+        if c and c["tool"] in TOOL_REGISTRY and c["tool"] != "skip" and isinstance(c.get("output"), dict)
+        and "error" not in c["output"] and "warning" not in c["output"]
+    }
+    try:
+        if SESSIONS.record(turn.session_id, user_message, answer, outputs):
+            SESSION_EXECUTOR.submit(SESSIONS.compact, turn.session_id)
+    except Exception as e:
+        # the answer is already there; losing one turn of history is not worth failing it
+        _llm_log.warning("session %s: could not record turn: %s", turn.session_id, e)
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if SESSIONS is None:
+        raise HTTPException(status_code=404, detail="Sessions are disabled (SESSION_STORE=off).")
+    SESSIONS.delete(session_id)
+    return {"deleted": session_id}
+
+# -----------------------------------------------------
 # Agentic chat endpoint (Router + Answerer)
 # -----------------------------------------------------
 
 @app.post("/agent_chat")
-def agent_chat(input: ChatInput):
+def agent_chat(input: ChatInput, request: Request):
     """
     Runs the two-agent orchestration:
     - Agent 1: decides whether to call a tool (or skip).
     - Agent 2: crafts the final response (always).
     Returns both the decision and the final answer for transparency.
+    With `Accept: text/event-stream` the same data arrives as SSE, answer token by token.
     """
-    result = run_agentic_flow(input.message)
+    turn = open_turn(input.session_id)
+    if wants_sse(request):
+        return sse_response(stream_agentic_flow(input.message, turn))
+    result = run_agentic_flow(input.message, turn)
     return {
+        "session_id": input.session_id,
         "response": result["final_answer"],
         "tool_decision": result["decision"],
-        "tool_output_preview": result["tool_output"]
+        "tool_output_preview": result["tool_output"],
+        "context": result["context"]
     }
 # -----------------------------------------------------
 # Agentic chat endpoint v2 (Planner with multi-step plan + Answerer)
@@ -796,133 +1728,422 @@ def agent_chat(input: ChatInput):
 # -----------------[ DB endpoints migrated from bd.py ]-----------------
 
 @app.post("/agent_chat_v2")
-def agent_chat_v2(input: ChatInput):
+def agent_chat_v2(input: ChatInput, request: Request):
     """
     Runs the enhanced orchestration:
     - Agent 1 (planner): returns a multi-step plan (0..3 steps).
-    - Executor: runs each tool with placeholder resolution between steps.
+    - Executor: runs independent tools in parallel, dependent ones after the steps they reference.
     - Agent 2 (answerer): crafts the final response using all collected data.
     Returns the plan, the per-step results, and the final answer.
+    With `Accept: text/event-stream` the same data arrives as SSE, answer token by token.
     """
-    result = run_agentic_flow_v2(input.message)
+    turn = open_turn(input.session_id)
+    if wants_sse(request):
+        return sse_response(stream_agentic_flow_v2(input.message, turn))
+    result = run_agentic_flow_v2(input.message, turn)
     return {
+        "session_id": input.session_id,
         "response": result["final_answer"],
         "tool_plan": result["plan"],
         "tool_results": result["results"],
         "why": result["why"],
-        "confidence": result["confidence"]
+        "confidence": result["confidence"],
+        "router": result["router"],
+        "context": result["context"]
     }
 
-def get_db_connection():
+@app.get("/agent/stats")
+def agent_stats():
+    """
+    speculation: hits = lookups a plan step reused, wasted = lookups no step asked for.
+    router: turns routed locally (fast, per rule) vs by the planner LLM.
+    context: answerer tool context, estimated tokens sent vs the old indented JSON (raw_tokens).
+    sessions: turns recorded, summaries folded in, tool outputs reused across turns.
+    """
+    with _agent_stats_lock:
+        spec = dict(SPECULATION_STATS)
+        context = dict(CONTEXT_STATS)
+        router = {"fast": ROUTER_STATS["fast"], "llm": ROUTER_STATS["llm"], "rules": dict(ROUTER_STATS["rules"])}
+    spec["enabled"] = AGENT_SPECULATE
+    spec["hit_ratio"] = round(spec["hits"] / spec["started"], 4) if spec["started"] else 0.0
+    routed = router["fast"] + router["llm"]
+    router["enabled"] = FAST_ROUTER is not None
+    router["fast_ratio"] = round(router["fast"] / routed, 4) if routed else 0.0
+    context["budget_tokens"] = ANSWER_CONTEXT.budget_tokens
+    context["avg_tokens"] = round(context["tokens"] / context["turns"], 1) if context["turns"] else 0.0
+    return {
+        "speculation": spec,
+        "router": router,
+        "context": context,
+        "sessions": SESSIONS.stats() if SESSIONS is not None else {"enabled": False},
+    }
+
+# -----------------------------------------------------
+# Batch advice for a set of clients (see batch_advice.py)
+# Fixed plan (profile, transactions, packages for the client's risk) fed to the
+# same answerer as /agent_chat_v2; data comes from bulk queries, answers fan out
+# over ADVICE_BATCH_WORKERS threads and land in app.client_advice (checkpoint).
+# -----------------------------------------------------
+ADVICE_BATCH_QUESTION = (
+    "Review my profile and recent transactions and recommend which investment packages fit me, "
+    "with concrete next steps."
+)
+
+def advise_client(client_id: int, profile: Optional[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> str:
+    if profile is None:
+        raise ValueError(f"client {client_id} not found")
+    cid = str(client_id)
+    info = client_profile_output(cid, profile)
+    plan = [
+        {"tool": "database_info", "args": {"client_id": cid}},
+        {"tool": "transaction_history", "args": {"client_id": cid, "limit": ADVICE_BATCH.tx_per_client}},
+        {"tool": "investment_packages", "args": {"risk": info["risk_profile"]}},
+    ]
+    outputs = [info, transaction_history_output(cid, transactions), tool_investment_packages(plan[2]["args"])]
+    results = [{**step, "output": out} for step, out in zip(plan, outputs)]
+    prompt, _ = answerer_prompt_v2(ADVICE_BATCH_QUESTION, plan, results)
+    return ask_model(Question_instructions, prompt, max_tokens=900, temperature=0.7, stage="batch_advice")
+
+ADVICE_BATCH = batch_advice.BatchAdvisor(
+    get_conn, advise_client,
+    workers=int(os.getenv("ADVICE_BATCH_WORKERS", str(LLM_MAX_CONCURRENCY))),
+    chunk_size=int(os.getenv("ADVICE_BATCH_CHUNK", "100")),
+    tx_per_client=int(os.getenv("ADVICE_BATCH_TX_PER_CLIENT", "20")),
+)
+# jobs run one at a time, each with its own worker pool
+ADVICE_JOBS = ThreadPoolExecutor(max_workers=1, thread_name_prefix="advice-job")
+
+class AdviceBatchIn(BaseModel):
+    client_ids: Optional[List[int]] = None  # omit for every client
+
+def _submit_advice_job(job_id: str) -> None:
+    def run():
+        try:
+            ADVICE_BATCH.run(job_id)
+        except Exception as e:
+            _llm_log.error("advice job %s failed: %s", job_id, e)
+    ADVICE_JOBS.submit(run)
+
+@app.post("/advice/batch", status_code=202)
+def advice_batch(body: AdviceBatchIn):
+    """Starts a batch advice job; poll GET /advice/batch/{job_id} for progress and clients/minute."""
     try:
-        conn = psycopg2.connect(
-            dbname=os.getenv("POSTGRES_DB", "skepyadb"),
-            user=os.getenv("POSTGRES_USER", "admin"),
-            password=os.getenv("POSTGRES_PASSWORD", "Paroladb"),
-            host=os.getenv("POSTGRES_HOST", "host.docker.internal"),  # schimbat aici
-            port=os.getenv("POSTGRES_PORT", "5432"),
-        )
-        return conn
+        job_id = ADVICE_BATCH.create_job(body.client_ids)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
-
+        raise HTTPException(status_code=500, detail=str(e))
+    _submit_advice_job(job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.post("/advice/batch/{job_id}/resume", status_code=202)
+def advice_batch_resume(job_id: str):
+    """Re-runs a job: clients already done are skipped, failed ones retried."""
+    if ADVICE_BATCH.progress(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    if ADVICE_BATCH.is_running(job_id):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is already running")
+    _submit_advice_job(job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/advice/batch/{job_id}")
+def advice_batch_progress(job_id: str):
+    progress = ADVICE_BATCH.progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return progress
+
+@app.get("/advice/batch/{job_id}/results")
+def advice_batch_results(job_id: str, limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    return {"job_id": job_id, "results": ADVICE_BATCH.results(job_id, limit=limit, offset=offset)}
 
 @app.get("/investments")
-def get_investments():
+async def get_investments():
     """
     Returnează lista investițiilor din tabelul 'invesments'
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
+        columns, rows = await fetch_table("""
             SELECT id, investment, risk_score, description
             FROM invesments
             ORDER BY id ASC;
         """)
+    except Exception as e:
+        raise _db_http_error(e)
+    return json_response(lambda: [dict(zip(columns, row)) for row in rows])
 
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
+@app.get("/top-clients")
+async def get_top_clients(n: int = Query(10, ge=1, le=100)):
+    """
+    Returnează clienții cu cele mai multe tranzacții (din transaction_rollups, nu din transactions).
+    """
+    return await get_aggregate_top_clients(n)
 
-        cur.close()
-        conn.close()
+# -----------------[ /aggregates: dashboard rollups ]-----------------
+# Citite din transaction_rollups (client_id, month, category), întreținut de trigger-e
+# în init.sql; costul e O(luni x categorii), nu O(toate tranzacțiile).
 
-        return results
+async def _rollup_rows(sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+    try:
+        return await fetch_dicts(sql, params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
+        raise _db_http_error(e)
 
-@app.get("/top-clients")
-def get_top_clients():
+def _month_start(month: Optional[str]) -> Optional[date]:
+    """'2025-10' -> date(2025, 10, 1)."""
+    if not month:
+        return None
+    try:
+        y, m = month.split("-")[:2]
+        return date(int(y), int(m), 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="month must be YYYY-MM")
+
+@app.get("/aggregates/monthly")
+async def get_aggregate_monthly(client_id: Optional[int] = None):
     """
-    Returnează clienții cu cele mai multe tranzacții.
+    Totaluri lunare (crescător după lună), pentru un client sau pentru toți.
     """
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT c.id, c.name, COUNT(t.id) AS transaction_count
-            FROM clients c
-            LEFT JOIN transactions t ON t.client_id = c.id
-            GROUP BY c.id, c.name
-            ORDER BY transaction_count DESC
-            LIMIT 10;
-        """)
+    sql = """
+        SELECT to_char(month, 'YYYY-MM') AS month, SUM(total) AS total, SUM(tx_count) AS count
+        FROM transaction_rollups
+        WHERE tx_count > 0 AND (%s::int IS NULL OR client_id = %s)
+        GROUP BY month
+        ORDER BY month ASC
+    """
+    return await _rollup_rows(sql, [client_id, client_id])
 
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
+@app.get("/aggregates/monthly-change")
+async def get_aggregate_monthly_change(client_id: int):
+    """
+    Ultima lună cu tranzacții vs. luna precedentă cu tranzacții (ca în useMonthlySpending).
+    """
+    rows = await _rollup_rows("""
+        SELECT to_char(month, 'YYYY-MM') AS month, SUM(total) AS total
+        FROM transaction_rollups
+        WHERE client_id = %s AND tx_count > 0
+        GROUP BY month
+        ORDER BY month DESC
+        LIMIT 2
+    """, [client_id])
+    current = rows[0] if rows else None
+    previous = rows[1] if len(rows) > 1 else None
+    total = float(current["total"]) if current else 0.0
+    prev_total = float(previous["total"]) if previous else 0.0
+    return {
+        "client_id": client_id,
+        "month": current["month"] if current else None,
+        "total": total,
+        "previous_month": previous["month"] if previous else None,
+        "previous_total": prev_total,
+        "change_pct": ((total - prev_total) / prev_total * 100) if prev_total > 0 else 0.0,
+    }
 
-        cur.close()
-        conn.close()
+@app.get("/aggregates/categories")
+async def get_aggregate_categories(client_id: Optional[int] = None, month: Optional[str] = None):
+    """
+    Totaluri pe categorii, opțional filtrate pe client și lună (YYYY-MM).
+    """
+    month_start = _month_start(month)
+    sql = """
+        SELECT category, SUM(total) AS total, SUM(tx_count) AS count
+        FROM transaction_rollups
+        WHERE tx_count > 0
+          AND (%s::int IS NULL OR client_id = %s)
+          AND (%s::date IS NULL OR month = %s)
+        GROUP BY category
+        ORDER BY total DESC
+    """
+    return await _rollup_rows(sql, [client_id, client_id, month_start, month_start])
 
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
+@app.get("/aggregates/top-clients")
+async def get_aggregate_top_clients(n: int = Query(10, ge=1, le=100)):
+    """
+    Top N clienți după numărul de tranzacții.
+    """
+    sql = """
+        SELECT c.id, c.name,
+               COALESCE(r.transaction_count, 0) AS transaction_count,
+               COALESCE(r.total_amount, 0) AS total_amount
+        FROM clients c
+        LEFT JOIN (
+            SELECT client_id, SUM(tx_count) AS transaction_count, SUM(total) AS total_amount
+            FROM transaction_rollups
+            GROUP BY client_id
+        ) r ON r.client_id = c.id
+        ORDER BY transaction_count DESC, c.id ASC
+        LIMIT %s
+    """
+    return await _rollup_rows(sql, [n])
 
-@app.get("/transactions")
-def get_all_transactions():
+@app.post("/aggregates/rebuild")
+def rebuild_aggregates():
     """
-    Returnează toate tranzacțiile din baza de date.
+    Recalculează transaction_rollups de la zero (bază existentă / după import fără trigger-e).
+    Blochează scrierile în transactions cât rulează, ca trigger-ele să nu dubleze rânduri.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("LOCK TABLE transactions IN SHARE MODE")
+            cur.execute("DELETE FROM transaction_rollups")
+            cur.execute("""
+                INSERT INTO transaction_rollups (client_id, month, category, total, tx_count)
+                SELECT client_id, date_trunc('month', transaction_date)::date, COALESCE(category, ''),
+                       SUM(amount), COUNT(*)
+                FROM transactions
+                GROUP BY 1, 2, 3
+            """)
+            rebuilt = cur.rowcount
+        return {"rebuilt_groups": rebuilt}
+    except Exception as e:
+        raise _db_http_error(e)
 
-        cur.execute("""
-            SELECT id, client_id, transaction_date, amount, category
-            FROM transactions
-            ORDER BY transaction_date DESC;
-        """)
+# -----------------[ /transactions: keyset pages + streaming ]-----------------
+TX_PAGE_DEFAULT = 100
+TX_PAGE_MAX = 1000
+TX_STREAM_BATCH = int(os.getenv("TX_STREAM_BATCH", "2000"))
+TX_COLUMNS = ["id", "client_id", "transaction_date", "amount", "category"]
 
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
+def _encode_tx_cursor(tx_date: Any, tx_id: int) -> str:
+    raw = json.dumps([tx_date.isoformat() if isinstance(tx_date, date) else str(tx_date), int(tx_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_tx_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        tx_date, tx_id = json.loads(raw)
+        return date.fromisoformat(tx_date), int(tx_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def _tx_query(client_id: Optional[int], after: Optional[tuple], limit: Optional[int]):
+    """SELECT for transactions newest-first; `after` = (transaction_date, id) of the last row seen."""
+    where, params = [], []
+    if client_id is not None:
+        where.append("client_id = %s")
+        params.append(client_id)
+    if after is not None:
+        where.append("(transaction_date, id) < (%s::date, %s::int)")
+        params.extend(after)
+    sql = f"SELECT {', '.join(TX_COLUMNS)} FROM transactions"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY transaction_date DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+def _stream_rows(sql: str, params: List[Any], *, media_type: str) -> StreamingResponse:
+    """
+    Run `sql` on a server-side (named) cursor and stream one encoded chunk per TX_STREAM_BATCH rows.
+    The query is executed before returning, so connection/SQL errors still become a 500
+    instead of a truncated 200. Memory stays at one batch regardless of table size.
+    The encoder is built from the cursor description (typed Arrow schema).
+    """
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(get_conn())
+        cur = stack.enter_context(conn.cursor(name="tx_stream"))
+        cur.itersize = TX_STREAM_BATCH
+        cur.execute(sql, params)
+        first = cur.fetchmany(TX_STREAM_BATCH)
+        encoder = columnar.stream_encoder(media_type, TX_COLUMNS, cur.description)
+    except Exception as e:
+        stack.close()
+        raise _db_http_error(e)
+
+    def gen():
+        with stack:
+            yield encoder.start()
+            batch = first
+            while batch:
+                yield encoder.batch(batch)
+                batch = cur.fetchmany(TX_STREAM_BATCH)
+            yield encoder.finish()
+
+    # background close is a no-op when gen() finished; it releases the connection
+    # if the client disconnected before the body was ever iterated
+    return StreamingResponse(gen(), media_type=media_type, background=BackgroundTask(stack.close))
+
+async def _stream_rows_async(sql: str, params: List[Any], *, media_type: str) -> StreamingResponse:
+    """asyncpg twin of _stream_rows: same eager first batch, same chunk encoding."""
+    try:
+        stream = await db_async.pool.open_cursor(sql, params, batch=TX_STREAM_BATCH)
+    except Exception as e:
+        raise _db_http_error(e)
+    try:
+        encoder = columnar.stream_encoder(media_type, TX_COLUMNS, stream.description)
+    except Exception as e:
+        await stream.close()
+        raise HTTPException(status_code=500, detail=f"Encoding error: {str(e)}")
 
-        cur.close()
-        conn.close()
+    async def gen():
+        try:
+            yield encoder.start()
+            async for batch in stream.batches():
+                yield encoder.batch(batch)
+            yield encoder.finish()
+        finally:
+            await stream.close()
 
-        return results
+    return StreamingResponse(gen(), media_type=media_type, background=BackgroundTask(stream.close))
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
+@app.get("/transactions")
+async def get_all_transactions(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=TX_PAGE_MAX),
+    cursor: Optional[str] = None,
+    client_id: Optional[int] = None,
+    fmt: Optional[str] = Query(None, alias="format"),
+):
+    """
+    Returnează tranzacțiile, cele mai noi primele (transaction_date DESC, id DESC).
+    - ?limit=N[&cursor=...]  -> o pagină {"items": [...], "next_cursor": "..."} (keyset, fără OFFSET)
+    - ?format=ndjson sau Accept: application/x-ndjson -> stream NDJSON, câte un rând pe linie
+    - fără parametri -> lista completă, ca înainte, dar trimisă în bucăți din cursor server-side
+    Toate variantele acceptă ?client_id= și formatele compacte din columnar.py (Accept);
+    pentru pagini, layout-ul columnar poartă și next_cursor / limit.
+    """
+    compact = negotiate_format(request)
+    if limit is not None or cursor is not None:
+        after = _decode_tx_cursor(cursor) if cursor else None
+        page_size = limit or TX_PAGE_DEFAULT
+        sql, params = _tx_query(client_id, after, page_size + 1)
+        try:
+            columns, rows = await fetch_table(sql, params)
+        except Exception as e:
+            raise _db_http_error(e)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = _encode_tx_cursor(rows[-1][2], rows[-1][0]) if has_more else None
+        if compact:
+            return columnar_response(compact, columns, rows, {"next_cursor": next_cursor, "limit": page_size})
+        return json_response(lambda: {
+            "items": [dict(zip(columns, row)) for row in rows],
+            "next_cursor": next_cursor,
+            "limit": page_size,
+        })
+
+    sql, params = _tx_query(client_id, None, None)
+    if compact:
+        media_type = compact
+    elif (fmt or "").lower() == "ndjson" or columnar.NDJSON in request.headers.get("accept", ""):
+        media_type = columnar.NDJSON
+    else:
+        media_type = columnar.JSON
+    if db_async.enabled():
+        return await _stream_rows_async(sql, params, media_type=media_type)
+    return await run_in_threadpool(lambda: _stream_rows(sql, params, media_type=media_type))
 
 @app.get("/clients")
-def get_clients():
+async def get_clients(request: Request):
     """
     Returnează toți clienții din baza de date.
     """
+    compact = negotiate_format(request)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM clients;")
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        cur.close()
-        conn.close()
-        return results
+        columns, rows = await fetch_table("SELECT * FROM clients;")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query error: {e}")
+        raise _db_http_error(e)
+    if compact:
+        return columnar_response(compact, columns, rows)
+    return json_response(lambda: [dict(zip(columns, row)) for row in rows])
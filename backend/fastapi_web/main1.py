@@ -2,10 +2,11 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from psycopg2.extras import RealDictCursor
-import psycopg2
 import os
 import boto3
 
+import db
+
 app = FastAPI()
 from dotenv import load_dotenv
 load_dotenv()
@@ -15,6 +16,14 @@ from fastapi.middleware.cors import CORSMiddleware
 def health():
     return {"status": "ok"}
 
+@app.on_event("startup")
+def _open_db_pool():
+    db.pool.open()
+
+@app.on_event("shutdown")
+def _close_db_pool():
+    db.pool.close()
+
 origins = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -32,14 +41,8 @@ MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "us.anthropic.claude-sonnet-4-20250514-
 
 bedrock = boto3.client("bedrock", region_name=AWS_REGION)
 
-def get_conn():
-    return psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB", "skepyadb"),
-        user=os.getenv("POSTGRES_USER", "admin"),
-        password=os.getenv("POSTGRES_PASSWORD", "Paroladb"),
-        host=os.getenv("POSTGRES_HOST", "postgres"),
-        port=os.getenv("POSTGRES_PORT", "5432"),
-    )
+def get_conn(reset: bool = False):
+    return db.connection(reset)
 
 class PromptIn(BaseModel):
     prompt: str
@@ -80,7 +83,8 @@ def run_prompt(body: PromptIn):
         raise HTTPException(status_code=400, detail="Generated query is not a SELECT.")
 
     try:
-        with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # SQL generat de LLM: DISCARD ALL înainte ca conexiunea să revină în pool
+        with get_conn(reset=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(sql)
             rows = cur.fetchall()
         return {"sql": sql, "rows": rows}
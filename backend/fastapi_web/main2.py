@@ -1,12 +1,12 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import os
 import boto3
 import json
-import psycopg2
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 
+import db
+
 # -----------------------------------------------------
 # FastAPI setup
 # -----------------------------------------------------
@@ -17,6 +17,17 @@ load_dotenv()
 def health():
     return {"status": "ok"}
 
+# ca înainte de pool: POSTGRES_HOST implicit host.docker.internal (main.py / main1.py: postgres)
+pool = db.PgPool.from_env(default_host="host.docker.internal")
+
+@app.on_event("startup")
+def _open_db_pool():
+    pool.open()
+
+@app.on_event("shutdown")
+def _close_db_pool():
+    pool.close()
+
 # -----------------------------------------------------
 # CORS (permite frontend-ul local)
 # -----------------------------------------------------
@@ -72,20 +83,10 @@ def ask_claude(message: str) -> str:
         raise HTTPException(status_code=500, detail=f"Bedrock/Claude error: {str(e)}")
 
 # -----------------------------------------------------
-# PostgreSQL connection helper
+# PostgreSQL connection helper (pooled, see db.py)
 # -----------------------------------------------------
 def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            dbname=os.getenv("POSTGRES_DB", "skepyadb"),
-            user=os.getenv("POSTGRES_USER", "admin"),
-            password=os.getenv("POSTGRES_PASSWORD", "Paroladb"),
-            host=os.getenv("POSTGRES_HOST", "host.docker.internal"),  # schimbat aici
-            port=os.getenv("POSTGRES_PORT", "5432"),
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
+    return pool.connection()
 
 # -----------------------------------------------------
 # Endpoint de chat
@@ -104,23 +105,15 @@ def get_investments():
     Returnează lista investițiilor din tabelul 'invesments'
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT id, investment, risk_score, description
-            FROM invesments
-            ORDER BY id ASC;
-        """)
-
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-
-        cur.close()
-        conn.close()
-
-        return results
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, investment, risk_score, description
+                FROM invesments
+                ORDER BY id ASC;
+            """)
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
@@ -130,26 +123,18 @@ def get_top_clients():
     Returnează clienții cu cele mai multe tranzacții.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT c.id, c.name, COUNT(t.id) AS transaction_count
-            FROM clients c
-            LEFT JOIN transactions t ON t.client_id = c.id
-            GROUP BY c.id, c.name
-            ORDER BY transaction_count DESC
-            LIMIT 10;
-        """)
-
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-
-        cur.close()
-        conn.close()
-
-        return results
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.id, c.name, COUNT(t.id) AS transaction_count
+                FROM clients c
+                LEFT JOIN transactions t ON t.client_id = c.id
+                GROUP BY c.id, c.name
+                ORDER BY transaction_count DESC
+                LIMIT 10;
+            """)
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
@@ -159,24 +144,15 @@ def get_all_transactions():
     Returnează toate tranzacțiile din baza de date.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT id, client_id, transaction_date, amount, category
-            FROM transactions
-            ORDER BY transaction_date DESC;
-        """)
-
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-
-        cur.close()
-        conn.close()
-
-        return results
-
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, client_id, transaction_date, amount, category
+                FROM transactions
+                ORDER BY transaction_date DESC;
+            """)
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
@@ -186,14 +162,10 @@ def get_clients():
     Returnează toți clienții din baza de date.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM clients;")
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        cur.close()
-        conn.close()
-        return results
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT * FROM clients;")
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {e}")
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Background LISTEN on one or more Postgres NOTIFY channels.
+
+One dedicated (unpooled) connection serves every channel; each notification
+calls the channel's handler with the payload. After a (re)connect every handler
+is called once with None: notifications sent while we were disconnected are
+lost, so handlers treat None as "invalidate everything".
+
+Channels fed by init.sql:
+    schema_changed   DDL event trigger (payload: command tag)
+    client_changed   writes on clients / transactions (payload: client id)
+"""
+import logging
+import select
+import threading
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger("pg_listen")
+
+Handler = Callable[[Optional[str]], None]
+
+
+class ChannelListener:
+    def __init__(self, connect: Callable[[], Any], handlers: Dict[str, Handler], *, poll_interval: float = 5.0):
+        self._connect = connect
+        self.handlers = dict(handlers)
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _dispatch(self, channel: str, payload: Optional[str]) -> None:
+        handler = self.handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            handler(payload)
+        except Exception as e:
+            log.warning("handler for %s failed: %s", channel, e)
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    for channel in self.handlers:
+                        cur.execute(f"LISTEN {channel};")
+                # changes made while we were disconnected are unknown: start from a clean slate
+                for channel in self.handlers:
+                    self._dispatch(channel, None)
+                backoff = 1.0
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        self._dispatch(n.channel, n.payload)
+            except Exception as e:
+                log.warning("listener error (retry in %.0fs): %s", backoff, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
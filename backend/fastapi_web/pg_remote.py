@@ -0,0 +1,141 @@
+"""
+HTTP client for the Flask /query service (remote mode of `_pg_query`).
+
+- one keep-alive `requests.Session` for all calls
+- the base that answered last is tried first
+- a circuit breaker per base: after `failure_threshold` transport failures the
+  base is skipped for `reset_timeout` seconds, then one probe is let through
+- a per-call deadline bounds the total time across all bases, instead of a
+  fixed timeout per attempt
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+
+
+class QueryError(Exception):
+    """The query failed (SQL error or no reachable base). `detail` is safe to return to clients."""
+
+    def __init__(self, detail: Dict[str, Any]):
+        super().__init__(detail.get("error"))
+        self.detail = detail
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, *, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # half-open: a single probe at a time
+            if self._probe_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RemoteQueryClient:
+    # statuses that mean "this base is unhealthy", as opposed to "this SQL failed"
+    _BASE_FAILURE_STATUSES = {502, 503, 504}
+
+    def __init__(self, bases: List[str], *, deadline: float = 10.0, attempt_timeout: float = 5.0,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0):
+        # keep order, drop duplicates (PG_API_BASE usually equals the service-name default)
+        self.bases = list(dict.fromkeys(b.rstrip("/") for b in bases if b))
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.session = requests.Session()
+        self.breakers = {b: CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+                         for b in self.bases}
+        self._last_good: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failovers": 0, "short_circuited": 0, "deadline_exceeded": 0}
+
+    def _ordered_bases(self) -> List[str]:
+        last = self._last_good
+        return ([last] if last else []) + [b for b in self.bases if b != last]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def query(self, sql: str, params: Optional[List[Any]] = None, *, deadline: Optional[float] = None) -> Any:
+        self._count("calls")
+        stop_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        last_err: Optional[str] = None
+        tried = 0
+        for base in self._ordered_bases():
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                self._count("deadline_exceeded")
+                last_err = last_err or "deadline exceeded"
+                break
+            breaker = self.breakers[base]
+            if not breaker.allow():
+                self._count("short_circuited")
+                continue
+            if tried:
+                self._count("failovers")
+            tried += 1
+            try:
+                payload = {"sql": sql, "params": params} if params else {"sql": sql}
+                r = self.session.post(f"{base}/query", json=payload,
+                                      timeout=min(self.attempt_timeout, remaining))
+            except requests.RequestException as e:
+                breaker.record_failure()
+                last_err = f"{base}: {e}"
+                continue
+            if r.status_code in self._BASE_FAILURE_STATUSES:
+                breaker.record_failure()
+                last_err = f"{base}: {r.status_code} {r.text[:200]}"
+                continue
+            breaker.record_success()
+            self._last_good = base
+            if r.status_code == 200:
+                return r.json()
+            # the service answered: the SQL itself failed and would fail on any base
+            raise QueryError({"error": f"{r.status_code} {r.text}", "sql": sql})
+        raise QueryError({"error": last_err or "no /query base available (all circuits open)", "sql": sql})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+        out["last_good"] = self._last_good
+        out["bases"] = {b: self.breakers[b].state for b in self.bases}
+        return out
@@ -0,0 +1,112 @@
+"""
+Response cache for stateless LLM calls (/chat).
+
+- key: normalized message + model id + hash of the system prompt + generation
+  settings, so a prompt or model change never serves an old answer
+- storage: any cache.make_cache backend (TTL + LRU bound)
+- single-flight: concurrent misses on the same key wait for the first caller
+  instead of each paying a generation; N identical requests -> one Bedrock call.
+  A failure is handed to every waiter and nothing is stored.
+
+get_or_compute returns (value, status) with status HIT | MISS | SHARED
+(SHARED = collapsed onto another request's in-flight call) | BYPASS.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """At most one in-flight fn() per key; other callers for that key get its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (value, shared); shared=False for the caller that actually ran fn."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def response_key(message: str, *, model_id: str, system_text: Any, **settings: Any) -> str:
+    system_hash = hashlib.sha256(json.dumps(system_text, ensure_ascii=False).encode()).hexdigest()
+    raw = json.dumps([message, model_id, system_hash, sorted(settings.items())], ensure_ascii=False)
+    return "chat:" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, backend: Any):
+        self.backend = backend  # cache.MemoryCache | cache.SQLiteCache
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = {"shared": 0, "bypassed": 0}
+
+    def get(self, key: str) -> Any:
+        return self.backend.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], *, bypass: bool = False) -> Tuple[Any, str]:
+        """BYPASS skips the lookup (and the collapsing) but still stores the fresh value."""
+        if bypass:
+            value = compute()
+            self.backend.set(key, value)
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return value, "BYPASS"
+        hit = self.backend.get(key)
+        if hit is not None:
+            return hit, "HIT"
+
+        def load():
+            # re-check: a leader that finished between our miss and joining the flight has stored it
+            value = self.backend.get(key)
+            if value is None:
+                value = compute()
+                self.backend.set(key, value)
+            return value
+
+        value, shared = self._flight.do(key, load)
+        if shared:
+            with self._lock:
+                self._stats["shared"] += 1
+        return value, "SHARED" if shared else "MISS"
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.backend.stats()
+        with self._lock:
+            out.update(self._stats)
+        out["in_flight"] = self._flight.in_flight()
+        return out
@@ -0,0 +1,138 @@
+"""
+In-process catalog of the public schema (tables, columns, types, row estimates).
+
+Loaded once, served from memory, reloaded when the TTL expires or after
+`invalidate()`. In the FastAPI app invalidation is driven by a LISTEN on the
+`schema_changed` channel (fed by the DDL event trigger in init.sql): the app's
+shared pg_listen.ChannelListener calls `invalidate_handler(catalog)` for
+SCHEMA_CHANNEL. POST /schema/refresh invalidates by hand;
+demo.py uses the same catalog over /query with TTL only.
+
+The catalog does not talk to Postgres itself: it is built from a
+`run_query(sql) -> list[dict]` callable, so each entry point plugs in its own
+connection path.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("schema_catalog")
+
+SCHEMA_CHANNEL = "schema_changed"
+
+_COLUMNS_SQL = """
+    SELECT table_name, column_name, data_type, is_nullable
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, ordinal_position
+"""
+
+_ESTIMATES_SQL = """
+    SELECT c.relname AS table_name, GREATEST(c.reltuples, 0)::bigint AS row_estimate
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')
+"""
+
+
+class SchemaCatalog:
+    def __init__(self, run_query: Callable[[str], List[Dict[str, Any]]], *, ttl: float = 300.0):
+        self._run_query = run_query
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._version = ""
+        self._loaded_at = 0.0
+        self._stale = True
+        self._stats = {"loads": 0, "load_errors": 0, "invalidations": 0, "hits": 0}
+
+    # ---------- cache control ----------
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stale = True
+            self._stats["invalidations"] += 1
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return self._load_locked()
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        """{table: {"columns": [{"name","type","nullable"}], "row_estimate": int}}"""
+        with self._lock:
+            if self._stale or time.monotonic() - self._loaded_at > self.ttl:
+                return self._load_locked()
+            self._stats["hits"] += 1
+            return self._tables
+
+    def _load_locked(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            cols = self._run_query(_COLUMNS_SQL)
+            estimates = {r["table_name"]: int(r["row_estimate"] or 0) for r in self._run_query(_ESTIMATES_SQL)}
+        except Exception as e:
+            # keep serving the previous catalog; retry on the next call
+            self._stats["load_errors"] += 1
+            log.warning("schema catalog load failed: %s", e)
+            return self._tables
+        tables: Dict[str, Dict[str, Any]] = {}
+        for r in cols:
+            t = tables.setdefault(r["table_name"], {"columns": [], "row_estimate": estimates.get(r["table_name"], 0)})
+            t["columns"].append({
+                "name": r["column_name"],
+                "type": r["data_type"],
+                "nullable": r["is_nullable"] == "YES",
+            })
+        self._tables = tables
+        # row estimates drift with ANALYZE; only the shape of the schema defines the version
+        shape = {t: [(c["name"], c["type"]) for c in v["columns"]] for t, v in tables.items()}
+        self._version = hashlib.sha1(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:12]
+        self._loaded_at = time.monotonic()
+        self._stale = False
+        self._stats["loads"] += 1
+        return tables
+
+    # ---------- views ----------
+    @property
+    def version(self) -> str:
+        self.get()
+        return self._version
+
+    def table_names(self) -> List[str]:
+        return sorted(self.get())
+
+    def describe(self, table: str) -> Optional[List[Dict[str, Any]]]:
+        """Columns in the information_schema shape used by demo.py, or None for unknown tables."""
+        t = self.get().get(table.strip())
+        if t is None:
+            return None
+        return [
+            {"column_name": c["name"], "data_type": c["type"], "is_nullable": "YES" if c["nullable"] else "NO"}
+            for c in t["columns"]
+        ]
+
+    def brief(self, max_cols_per_table: int = 8) -> str:
+        """Minimal context about public schema (tables + first columns) to help LLM."""
+        tables = self.get()
+        parts = []
+        for name in sorted(tables):
+            t = tables[name]
+            cols = ", ".join(f"{c['name']} {c['type']}" for c in t["columns"][:max_cols_per_table])
+            parts.append(f"- {name}({cols}) ~{t['row_estimate']} rows")
+        return "Known tables (schema=public):\n" + "\n".join(parts) if parts else ""
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                "version": self._version,
+                "tables": len(self._tables),
+                "age_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+                "ttl_s": self.ttl,
+            })
+        return out
+
+
+def invalidate_handler(catalog: SchemaCatalog) -> Callable[[Optional[str]], None]:
+    return lambda _payload: catalog.invalidate()
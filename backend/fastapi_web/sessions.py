@@ -0,0 +1,193 @@
+"""
+Server-side conversation sessions for the agent endpoints.
+
+A session is one JSON document, stored under `session:<id>`:
+
+    {"summary": "...", "turns": [{"user", "assistant"}, ...], "turn_count": n,
+     "tools": {call_key: {"output", "at"}}}
+
+What the model sees per turn is bounded no matter how long the conversation:
+- the last `window_turns` turns, each cut to `turn_chars`
+- a rolling summary (<= `summary_chars`) of everything older; turns that slide
+  out of the window are folded into it by `summarize(summary, turns)` (an LLM
+  call in main.py), off the request path, with a plain-text fallback
+- tool outputs from earlier turns, reused for identical calls for `tool_ttl` s
+
+Backends: anything with the cache.MemoryCache get/set/delete/stats surface
+(memory or sqlite via cache.make_cache), or PgSessionBackend (table
+app.chat_sessions, see init.sql).
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# (previous summary, turns leaving the window) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+def _clip(text: str, limit: int) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[: max(0, limit - 3)].rstrip() + "..."
+
+
+class PgSessionBackend:
+    """Sessions in Postgres (app.chat_sessions), shared by every worker; rows idle longer than ttl are ignored and pruned."""
+
+    def __init__(self, connection: Callable[[], Any], *, ttl: float = 86400.0):
+        self._connection = connection  # db.connection
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT state FROM app.chat_sessions"
+                " WHERE session_id = %s AND updated_at > now() - make_interval(secs => %s)",
+                (key, self.ttl),
+            )
+            row = cur.fetchone()
+        self._count("hits" if row else "misses")
+        if row is None:
+            return default
+        return row[0] if not isinstance(row[0], str) else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO app.chat_sessions (session_id, state, updated_at) VALUES (%s, %s::jsonb, now())"
+                " ON CONFLICT (session_id) DO UPDATE SET state = EXCLUDED.state, updated_at = now()",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+            cur.execute("DELETE FROM app.chat_sessions WHERE updated_at < now() - make_interval(secs => %s)",
+                        (self.ttl,))
+        self._count("sets")
+
+    def delete(self, key: str) -> None:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM app.chat_sessions WHERE session_id = %s", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+        out.update({"backend": "postgres", "ttl_s": self.ttl})
+        return out
+
+
+class SessionStore:
+    LOCK_STRIPES = 64
+
+    def __init__(self, backend: Any, *, window_turns: int = 4, turn_chars: int = 1200, summary_chars: int = 1200,
+                 tool_ttl: float = 120.0, max_tools: int = 16, summarize: Optional[Summarizer] = None):
+        self.backend = backend
+        self.window_turns = window_turns
+        self.turn_chars = turn_chars
+        self.summary_chars = summary_chars
+        self.tool_ttl = tool_ttl
+        self.max_tools = max_tools
+        self.summarize = summarize
+        # read-modify-write per session is serialized in-process; striped so the lock set stays bounded
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._stats_lock = threading.Lock()
+        self._stats = {"turns": 0, "compactions": 0, "summary_fallbacks": 0, "tool_reuse": 0}
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        return self._locks[int(hashlib.sha1(session_id.encode()).hexdigest()[:8], 16) % self.LOCK_STRIPES]
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    # ---------- read ----------
+    def load(self, session_id: str) -> Dict[str, Any]:
+        state = self.backend.get(self._key(session_id))
+        if not isinstance(state, dict):
+            return {"summary": "", "turns": [], "turn_count": 0, "tools": {}}
+        return json.loads(json.dumps(state))  # the memory backend hands out its own object
+
+    def history_text(self, state: Dict[str, Any]) -> str:
+        """Bounded transcript for the prompts; empty for a new session."""
+        lines: List[str] = []
+        if state.get("summary"):
+            lines.append(f"Summary of earlier turns: {state['summary']}")
+        for t in state.get("turns", [])[-self.window_turns:]:
+            lines.append(f"User: {t['user']}")
+            lines.append(f"Assistant: {t['assistant']}")
+        return "\n".join(lines)
+
+    def tool_outputs(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Still-fresh tool outputs from earlier turns, by call key."""
+        now = time.time()
+        return {k: v["output"] for k, v in state.get("tools", {}).items() if now - v["at"] <= self.tool_ttl}
+
+    def note_tool_reuse(self, n: int = 1) -> None:
+        self._count("tool_reuse", n)
+
+    # ---------- write ----------
+    def record(self, session_id: str, user: str, assistant: str, tool_outputs: Optional[Dict[str, Any]] = None) -> bool:
+        """Appends a turn; returns True when turns slid out of the window and compact() should run."""
+        with self._lock_for(session_id):
+            state = self.load(session_id)
+            state["turns"].append({"user": _clip(user, self.turn_chars), "assistant": _clip(assistant, self.turn_chars)})
+            state["turn_count"] = state.get("turn_count", 0) + 1
+            now = time.time()
+            tools = {k: v for k, v in state.get("tools", {}).items() if now - v["at"] <= self.tool_ttl}
+            for k, output in (tool_outputs or {}).items():
+                tools[k] = {"output": output, "at": now}
+            # newest first when over the cap
+            state["tools"] = dict(sorted(tools.items(), key=lambda kv: kv[1]["at"], reverse=True)[: self.max_tools])
+            self.backend.set(self._key(session_id), state)
+        self._count("turns")
+        return len(state["turns"]) > self.window_turns
+
+    def compact(self, session_id: str) -> None:
+        """Folds turns older than the window into the rolling summary; the LLM call runs without the lock."""
+        with self._lock_for(session_id):
+            state = self.load(session_id)
+        previous = state.get("summary", "")
+        overflow = state["turns"][: -self.window_turns] if self.window_turns else state["turns"]
+        if not overflow:
+            return
+        summary = None
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(previous, overflow)
+            except Exception:
+                summary = None
+        if summary:
+            summary = _clip(summary, self.summary_chars)
+        else:
+            # keep the most recent questions when the plain-text summary overflows
+            self._count("summary_fallbacks")
+            summary = " ".join([previous] + [f"User asked: {t['user']}" for t in overflow]).strip()
+            if len(summary) > self.summary_chars:
+                summary = "..." + summary[-(self.summary_chars - 3):]
+        with self._lock_for(session_id):
+            state = self.load(session_id)
+            if state.get("summary", "") != previous or state["turns"][: len(overflow)] != overflow:
+                return  # another compaction got there first
+            state["summary"] = summary
+            state["turns"] = state["turns"][len(overflow):]
+            self.backend.set(self._key(session_id), state)
+        self._count("compactions")
+
+    def delete(self, session_id: str) -> None:
+        with self._lock_for(session_id):
+            self.backend.delete(self._key(session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.backend.stats()
+        with self._stats_lock:
+            out.update(self._stats)
+        out.update({"window_turns": self.window_turns, "tool_ttl_s": self.tool_ttl})
+        return out
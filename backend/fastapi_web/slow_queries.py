@@ -0,0 +1,172 @@
+"""
+Slow-query log for ad-hoc SQL (LLM-generated /prompt queries in fastapi_web,
+/query in postgres-api). Stdlib only, plus tracing.py; both services ship it.
+
+- fingerprint(sql) normalizes literals, placeholders, IN lists, comments and
+  whitespace, so "... WHERE id = 7" and "... WHERE id = 12" are one entry.
+- SlowQueryLog.record() keeps queries that took >= threshold_ms (or hit the
+  statement timeout), aggregated per fingerprint: calls, total/max time, rows,
+  timeouts and the last few samples with their SQL text.
+- Samples are EXPLAINed in the background on a single thread (never on the
+  request path): the first slow call of a fingerprint always, later ones with
+  probability explain_rate, at most once per explain_interval seconds per
+  fingerprint. SELECT/WITH get EXPLAIN (ANALYZE, BUFFERS); timed-out queries
+  and anything else only get the plain plan (re-running them would time out
+  again or have side effects). Explains run in a read-only transaction with
+  their own statement timeout.
+- The store is bounded: at most max_fingerprints entries (the least recently
+  seen are dropped) and max_samples samples each.
+
+top(n) ranks fingerprints by total time spent, which is where an index or a
+prompt tweak pays off most. Each kept query also bumps slow_queries_total
+(tracing.METRICS, by source).
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import tracing
+
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"%s|%\(\w+\)s|\$\d+")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WS = re.compile(r"\s+")
+
+
+def normalize(sql: str) -> str:
+    s = _COMMENT.sub(" ", sql)
+    s = _STRING.sub("?", s)
+    s = _PARAM.sub("?", s)
+    s = _NUMBER.sub("?", s)
+    s = _LIST.sub("(?, ...)", s)
+    return _WS.sub(" ", s).strip().rstrip(";").strip().lower()
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.sha1(normalize(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def is_timeout(error: Optional[BaseException]) -> bool:
+    """statement_timeout cancellation, from psycopg2 or asyncpg."""
+    return error is not None and "statement timeout" in str(error)
+
+
+class SlowQueryLog:
+    def __init__(self, connection: Callable[[], Any], *, threshold_ms: float = 500.0, max_fingerprints: int = 500,
+                 max_samples: int = 3, explain_rate: float = 0.1, explain_interval: float = 60.0,
+                 explain_timeout_ms: int = 10000):
+        self._connection = connection  # db.connection
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.max_samples = max_samples
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self.explain_timeout_ms = explain_timeout_ms
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # fingerprint -> aggregate, LRU order
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        self._explaining = False
+        self._stats = {"recorded": 0, "evicted": 0, "explained": 0, "explain_errors": 0, "explain_skipped": 0}
+
+    def record(self, source: str, sql: str, seconds: float, *, rows: Optional[int] = None,
+               params: Optional[Sequence[Any]] = None, error: Optional[BaseException] = None) -> bool:
+        """Call after every execution; returns True when the query was slow enough to be kept."""
+        ms = seconds * 1000.0
+        timed_out = is_timeout(error)
+        if ms < self.threshold_ms and not timed_out:
+            return False
+        fp = fingerprint(sql)
+        now = time.time()
+        sample = {"at": now, "ms": round(ms, 1), "rows": rows, "sql": sql,
+                  "error": str(error) if error is not None else None, "plan": None}
+        with self._lock:
+            e = self._entries.pop(fp, None)
+            if e is None:
+                e = {"fingerprint": fp, "query": normalize(sql), "source": source, "calls": 0, "total_ms": 0.0,
+                     "max_ms": 0.0, "rows": 0, "timeouts": 0, "first_seen": now, "last_explain": None,
+                     "samples": deque(maxlen=self.max_samples)}
+            self._entries[fp] = e
+            e["calls"] += 1
+            e["total_ms"] += ms
+            e["max_ms"] = max(e["max_ms"], ms)
+            e["rows"] += rows or 0
+            e["timeouts"] += int(timed_out)
+            e["last_seen"] = now
+            e["samples"].append(sample)
+            explain = self._want_explain(e, now)
+            if explain:
+                e["last_explain"] = now
+                self._explaining = True
+            while len(self._entries) > self.max_fingerprints:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+            self._stats["recorded"] += 1
+        tracing.METRICS.inc("slow_queries_total", {"source": source},
+                            help="Queries over the slow-query threshold (or timed out).")
+        if explain:
+            analyze = not timed_out and sql.lstrip().lower().startswith(("select", "with"))
+            self._explainer.submit(self._explain, sample, sql, params, analyze)
+        return True
+
+    def _want_explain(self, e: Dict[str, Any], now: float) -> bool:
+        if self._explaining:  # one at a time: a burst of slow queries must not double the load
+            self._stats["explain_skipped"] += 1
+            return False
+        if e["last_explain"] is None:
+            return True
+        return now - e["last_explain"] >= self.explain_interval and random.random() < self.explain_rate
+
+    def _explain(self, sample: Dict[str, Any], sql: str, params: Optional[Sequence[Any]], analyze: bool) -> None:
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        try:
+            with self._connection() as conn, conn.cursor() as cur:
+                cur.execute("SET TRANSACTION READ ONLY")
+                cur.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                cur.execute(f"EXPLAIN ({options}) {sql}", params or None)
+                plan = cur.fetchone()[0]
+                conn.rollback()
+            with self._lock:
+                sample["plan"] = plan
+                sample["plan_analyzed"] = analyze
+                self._stats["explained"] += 1
+        except Exception as e:
+            with self._lock:
+                sample["plan_error"] = str(e)
+                self._stats["explain_errors"] += 1
+        finally:
+            with self._lock:
+                self._explaining = False
+
+    def top(self, n: int = 20, *, include_plans: bool = False) -> List[Dict[str, Any]]:
+        """Fingerprints by total time, heaviest first."""
+        with self._lock:
+            entries = [dict(e, samples=[dict(s) for s in e["samples"]]) for e in self._entries.values()]
+        entries.sort(key=lambda e: e["total_ms"], reverse=True)
+        out = []
+        for e in entries[:n]:
+            e.pop("last_explain", None)
+            e["total_ms"] = round(e["total_ms"], 1)
+            e["max_ms"] = round(e["max_ms"], 1)
+            e["mean_ms"] = round(e["total_ms"] / e["calls"], 1)
+            e["mean_rows"] = round(e["rows"] / e["calls"], 1)
+            if not include_plans:
+                for s in e["samples"]:
+                    s["has_plan"] = s.pop("plan") is not None
+            out.append(e)
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "fingerprints": len(self._entries), "threshold_ms": self.threshold_ms,
+                    "explain_rate": self.explain_rate}
@@ -0,0 +1,80 @@
+import os
+import sys
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar  # noqa: E402
+
+pa = pytest.importorskip("pyarrow")
+
+# psycopg2 cursor.description entries for TX_COLUMNS (transactions.amount is NUMERIC(14,2))
+Column = namedtuple("Column", "name type_code precision scale")
+TX_DESCRIPTION = [
+    Column("id", 23, None, None),
+    Column("client_id", 23, None, None),
+    Column("transaction_date", 1082, None, None),
+    Column("amount", 1700, 14, 2),
+    Column("category", 1043, None, None),
+]
+TX_COLUMNS = [c.name for c in TX_DESCRIPTION]
+
+
+def _read(chunks):
+    return pa.ipc.open_stream(b"".join(chunks)).read_all()
+
+
+def test_arrow_stream_keeps_schema_across_batches():
+    batches = [
+        # narrow decimals, all-NULL category and client_id
+        [(1, None, date(2026, 1, 1), Decimal("99.10"), None),
+         (2, None, date(2026, 1, 2), Decimal("5.5"), None)],
+        # wider decimals and the first non-NULL values
+        [(3, 7, date(2026, 1, 3), Decimal("100.00"), "food"),
+         (4, 8, date(2026, 1, 4), Decimal("123456789012.34"), "rent")],
+        # NULLs in typed columns
+        [(5, 9, None, None, "travel")],
+    ]
+    table = _read(columnar.encode_stream(columnar.ARROW, TX_COLUMNS, batches, TX_DESCRIPTION))
+
+    assert table.schema.field("id").type == pa.int32()
+    assert table.schema.field("transaction_date").type == pa.date32()
+    assert table.schema.field("amount").type == pa.decimal128(14, 2)
+    assert table.schema.field("category").type == pa.string()
+    assert table.num_rows == 5
+    assert table.column("amount").to_pylist() == [
+        Decimal("99.10"), Decimal("5.50"), Decimal("100.00"), Decimal("123456789012.34"), None,
+    ]
+    assert table.column("client_id").to_pylist() == [None, None, 7, 8, 9]
+    assert table.column("transaction_date").to_pylist()[-1] is None
+
+
+def test_arrow_stream_empty_result_is_typed():
+    table = _read(columnar.encode_stream(columnar.ARROW, TX_COLUMNS, [], TX_DESCRIPTION))
+    assert table.num_rows == 0
+    assert table.schema.field("amount").type == pa.decimal128(14, 2)
+
+
+def test_arrow_schema_unconstrained_numeric_and_asyncpg_attributes():
+    Type = namedtuple("Type", "oid name")
+    Attribute = namedtuple("Attribute", "name type")
+    description = [
+        Column("total", 1700, 65535, 65535),  # sum(amount): no typmod
+        Attribute("amount", Type(1700, "numeric")),  # asyncpg: typmod not exposed
+        Attribute("meta", Type(3802, "jsonb")),
+    ]
+    schema = columnar.arrow_schema(description)
+    assert [f.type for f in schema] == [pa.float64(), pa.float64(), pa.string()]
+
+    rows = [(Decimal("1.25"), Decimal("2.50"), {"a": 1})]
+    table = _read(columnar.encode_stream(columnar.ARROW, ["total", "amount", "meta"], [rows], description))
+    assert table.to_pylist() == [{"total": 1.25, "amount": 2.5, "meta": '{"a": 1}'}]
+
+
+def test_arrow_stream_requires_description():
+    with pytest.raises(ValueError):
+        columnar.stream_encoder(columnar.ARROW, TX_COLUMNS)
@@ -0,0 +1,125 @@
+"""
+Builds the "[Supplemental data ...]" block the answerer sees from tool outputs.
+
+- compact JSON (no indent, no spaces), same value encoding as the API
+- row lists longer than `max_rows` are replaced by a summary plus a few
+  representative rows; a tool can plug in its own (SQL-computed) summary
+  through `summarizers`, otherwise a generic count / min / max / sum is used
+- the result is kept under `budget_tokens`: first samples shrink, then the
+  text is cut, with a marker so the model knows data is missing
+
+Token counts are estimates (~4 characters per token): good enough for a
+budget, and it needs no tokenizer.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from columnar import json_default
+
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "...[truncated to fit the context budget]"
+
+# (tool, key, args, rows) -> summary dict, or None to use the generic summary
+Summarizer = Callable[[str, str, Dict[str, Any], List[Dict[str, Any]]], Optional[Dict[str, Any]]]
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=json_default)
+
+
+def generic_summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Row count plus min / max / sum of every numeric column."""
+    numeric: Dict[str, List[float]] = {}
+    for r in rows:
+        for k, v in r.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                numeric.setdefault(k, []).append(float(v))
+    return {
+        "count": len(rows),
+        "numeric": {k: {"min": min(v), "max": max(v), "sum": round(sum(v), 2)} for k, v in numeric.items()},
+    }
+
+
+def _is_row_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(r, dict) for r in value)
+
+
+class ToolContextBuilder:
+    def __init__(self, *, budget_tokens: int = 1500, max_rows: int = 20, sample_rows: int = 5,
+                 summarizers: Optional[Dict[str, Summarizer]] = None):
+        self.budget_tokens = budget_tokens
+        self.max_rows = max_rows
+        self.sample_rows = sample_rows
+        self.summarizers = summarizers or {}  # tool name -> Summarizer
+
+    def _summaries(self, results: List[Dict[str, Any]]) -> Dict[Tuple[int, str], Dict[str, Any]]:
+        """Summary per oversized row list, keyed by (step index, output key); computed once per build."""
+        out: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        for i, res in enumerate(results):
+            output = res.get("output")
+            if not isinstance(output, dict):
+                continue
+            for key, value in output.items():
+                if not (_is_row_list(value) and len(value) > self.max_rows):
+                    continue
+                summary = None
+                summarizer = self.summarizers.get(res.get("tool", ""))
+                if summarizer is not None:
+                    try:
+                        summary = summarizer(res.get("tool", ""), key, res.get("args") or {}, value)
+                    except Exception:
+                        summary = None
+                out[(i, key)] = summary if summary is not None else generic_summary(value)
+        return out
+
+    @staticmethod
+    def _condense(results: List[Dict[str, Any]], summaries: Dict[Tuple[int, str], Dict[str, Any]],
+                  sample_rows: int) -> List[Dict[str, Any]]:
+        out = []
+        for i, res in enumerate(results):
+            output = res.get("output")
+            if isinstance(output, dict) and any(k[0] == i for k in summaries):
+                output = {
+                    key: {"total_rows": len(value), "summary": summaries[(i, key)], "sample": value[:sample_rows]}
+                    if (i, key) in summaries else value
+                    for key, value in output.items()
+                }
+            out.append({**res, "output": output})
+        return out
+
+    def _fit(self, results: List[Dict[str, Any]], render: Callable[[List[Dict[str, Any]]], Any],
+             raw: Any) -> Tuple[str, Dict[str, Any]]:
+        """render(condensed results) -> value to serialize; shrinks samples, then cuts, to fit the budget."""
+        raw_tokens = estimate_tokens(json.dumps(raw, ensure_ascii=False, indent=2, default=json_default))
+        summaries = self._summaries(results)
+        text = ""
+        for sample_rows in (self.sample_rows, 1, 0):
+            text = compact_json(render(self._condense(results, summaries, sample_rows)))
+            if estimate_tokens(text) <= self.budget_tokens:
+                break
+        truncated = estimate_tokens(text) > self.budget_tokens
+        if truncated:
+            keep = max(0, self.budget_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+            text = text[:keep] + TRUNCATION_MARKER
+        report = {
+            "budget_tokens": self.budget_tokens,
+            "tokens": estimate_tokens(text),
+            "raw_tokens": raw_tokens,  # the previous indent=2 serialization
+            "summarized": [f"{i}.{results[i].get('tool')}.{key}" for i, key in summaries],
+            "truncated": truncated,
+        }
+        return text, report
+
+    def build(self, plan: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """Multi-step flow: {"plan", "results"} with large row sets condensed. Returns (text, report)."""
+        return self._fit(results, lambda condensed: {"plan": plan, "results": condensed},
+                         {"plan": plan, "results": results})
+
+    def build_single(self, tool: str, args: Dict[str, Any], output: Any) -> Tuple[str, Dict[str, Any]]:
+        """Single-tool flow: just the (condensed) tool output. Returns (text, report)."""
+        return self._fit([{"tool": tool, "args": args, "output": output}],
+                         lambda condensed: condensed[0]["output"], output)
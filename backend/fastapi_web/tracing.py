@@ -0,0 +1,198 @@
+"""
+Per-stage latency tracing and Prometheus metrics, shared by fastapi_web and
+postgres-api (no dependencies).
+
+- span("stage") times a block. The duration goes into the
+  stage_duration_seconds histogram (stage_errors_total on exception) and, when
+  a request is being traced, into its Trace, which the HTTP middleware sends
+  back as a Server-Timing header:
+
+      Server-Timing: planner;dur=812.4, tool.database_info;dur=14.2,
+                     db.query;dur=9.8;desc="x2", llm.answerer;dur=2310.0, total;dur=3150.9
+
+  Repeated spans of one request are summed (desc="xN").
+- ContextThreadPoolExecutor runs tasks in the submitter's context, so spans in
+  worker threads (DAG tool steps, speculative lookups) land in the right trace.
+- observe_request() feeds http_requests_total / http_request_duration_seconds;
+  METRICS.render() is the text exposition format for /metrics.
+
+Streaming responses send their headers first: spans after that only reach the
+metrics.
+"""
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, Any]]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _fmt_float(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+
+class Metrics:
+    """Counters and histograms keyed by (name, labels); rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], List[float]] = {}  # bucket counts..., sum, count
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, value: float = 1.0, help: str = "") -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._meta.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict[str, Any]] = None, help: str = "") -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._meta.setdefault(name, ("histogram", help))
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = [0.0] * (len(self.buckets) + 2)
+            for i, le in enumerate(self.buckets):
+                if seconds <= le:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            meta = dict(self._meta)
+            counters = dict(self._counters)
+            hists = {k: list(v) for k, v in self._hists.items()}
+        lines: List[str] = []
+        for name in sorted(meta):
+            kind, help_text = meta[name]
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (n, labels), v in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_fmt_labels(labels)} {_fmt_float(v)}")
+                continue
+            for (n, labels), h in sorted(hists.items()):
+                if n != name:
+                    continue
+                for le, count in zip(self.buckets + (float("inf"),), h[:-2] + [h[-1]]):
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', _fmt_float(le)),))} {_fmt_float(count)}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_float(h[-2])}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {_fmt_float(h[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class Trace:
+    """Spans of one request: name -> [total_ms, count], in first-seen order."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._spans: Dict[str, List[float]] = {}
+
+    def add(self, name: str, ms: float) -> None:
+        with self._lock:
+            s = self._spans.setdefault(name, [0.0, 0])
+            s[0] += ms
+            s[1] += 1
+
+    def spans(self) -> Dict[str, Tuple[float, int]]:
+        with self._lock:
+            return {k: (v[0], int(v[1])) for k, v in self._spans.items()}
+
+    def server_timing(self) -> str:
+        parts = []
+        for name, (ms, n) in self.spans().items():
+            token = re.sub(r"[^A-Za-z0-9_.\-]", "_", name)
+            parts.append(f'{token};dur={ms:.1f}' + (f';desc="x{n}"' if n > 1 else ""))
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000.0:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace() -> Trace:
+    """New trace for the current request context (set it before handing work to other threads)."""
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except GeneratorExit:
+        raise  # a closed stream (client went away) is not a stage error
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        METRICS.observe("stage_duration_seconds", elapsed, {"stage": name}, help="Time spent per pipeline stage.")
+        if failed:
+            METRICS.inc("stage_errors_total", {"stage": name}, help="Stages that raised.")
+        trace = _current.get()
+        if trace is not None:
+            trace.add(name, elapsed * 1000.0)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of span()."""
+    def wrap(fn: Callable) -> Callable:
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        inner.__name__ = getattr(fn, "__name__", name)
+        inner.__doc__ = getattr(fn, "__doc__", None)
+        inner.__wrapped__ = fn
+        return inner
+    return wrap
+
+
+def observe_request(service: str, method: str, route: str, status: int, seconds: float) -> None:
+    labels = {"service": service, "method": method, "route": route}
+    METRICS.inc("http_requests_total", {**labels, "status": status}, help="HTTP requests by route and status.")
+    METRICS.observe("http_request_duration_seconds", seconds, labels, help="HTTP request latency.")
+    if status >= 500:
+        METRICS.inc("http_request_errors_total", labels, help="HTTP requests answered with a 5xx.")
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks run in a copy of the submitting context (trace, LLM deadline)."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -54,3 +54,200 @@ VALUES
 ('PostgreSQL', 'Intermediar', 1),
 ('Docker', 'Intermediar', 1);
 
+
+-- ---------------------------------------------------------------
+-- Date FinAI (clients / transactions / invesments) folosite de fastapi_web
+-- ---------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS clients (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100),
+    age INT,
+    gender VARCHAR(20),
+    education_level VARCHAR(50),
+    marital_status VARCHAR(30),
+    income NUMERIC(14, 2),
+    credit_score INT,
+    loan_amount NUMERIC(14, 2),
+    loan_purpose VARCHAR(50),
+    employment_status VARCHAR(30),
+    years_at_current_job INT,
+    payment_history VARCHAR(30),
+    debt_to_income_ratio NUMERIC(6, 4),
+    assets_value NUMERIC(14, 2),
+    number_of_dependents INT,
+    city VARCHAR(100),
+    state VARCHAR(100),
+    country VARCHAR(100),
+    previous_defaults INT,
+    marital_status_change INT,
+    risk_rating VARCHAR(20)
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id SERIAL PRIMARY KEY,
+    client_id INT NOT NULL REFERENCES clients(id),
+    transaction_date DATE NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    category VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS invesments (
+    id SERIAL PRIMARY KEY,
+    investment VARCHAR(100),
+    risk_score VARCHAR(20),
+    description TEXT
+);
+
+-- keyset pagination pentru /transactions: ORDER BY transaction_date DESC, id DESC
+CREATE INDEX IF NOT EXISTS transactions_date_id_idx
+    ON transactions (transaction_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS transactions_client_date_id_idx
+    ON transactions (client_id, transaction_date DESC, id DESC);
+
+-- ---------------------------------------------------------------
+-- Rollup lunar (client_id, month, category) pentru /aggregates/*
+-- Întreținut incremental de trigger-ele de pe transactions (statement-level,
+-- cu transition tables, ca un COPY mare să facă un singur upsert agregat).
+-- ---------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS transaction_rollups (
+    client_id INT NOT NULL,
+    month DATE NOT NULL,                      -- prima zi a lunii
+    category VARCHAR(50) NOT NULL DEFAULT '',
+    total NUMERIC(16, 2) NOT NULL DEFAULT 0,
+    tx_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (client_id, month, category)
+);
+CREATE INDEX IF NOT EXISTS transaction_rollups_month_idx ON transaction_rollups (month);
+
+CREATE OR REPLACE FUNCTION transaction_rollups_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO transaction_rollups AS r (client_id, month, category, total, tx_count)
+        SELECT client_id, date_trunc('month', transaction_date)::date, COALESCE(category, ''),
+               -SUM(amount), -COUNT(*)
+        FROM old_rows
+        GROUP BY 1, 2, 3
+        ON CONFLICT (client_id, month, category) DO UPDATE
+            SET total = r.total + EXCLUDED.total, tx_count = r.tx_count + EXCLUDED.tx_count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO transaction_rollups AS r (client_id, month, category, total, tx_count)
+        SELECT client_id, date_trunc('month', transaction_date)::date, COALESCE(category, ''),
+               SUM(amount), COUNT(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3
+        ON CONFLICT (client_id, month, category) DO UPDATE
+            SET total = r.total + EXCLUDED.total, tx_count = r.tx_count + EXCLUDED.tx_count;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_rollup_ins ON transactions;
+CREATE TRIGGER transactions_rollup_ins AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transaction_rollups_apply();
+
+DROP TRIGGER IF EXISTS transactions_rollup_upd ON transactions;
+CREATE TRIGGER transactions_rollup_upd AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transaction_rollups_apply();
+
+DROP TRIGGER IF EXISTS transactions_rollup_del ON transactions;
+CREATE TRIGGER transactions_rollup_del AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transaction_rollups_apply();
+
+-- ---------------------------------------------------------------
+-- Notificare la scrieri per client: fastapi_web ascultă pe canalul
+-- client_changed și golește cache-ul acelui client (client_cache.py).
+-- Payload = client_id; un NOTIFY per client per statement.
+-- ---------------------------------------------------------------
+CREATE OR REPLACE FUNCTION notify_client_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('client_changed', c::text) FROM (SELECT DISTINCT client_id AS c FROM old_rows) s;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('client_changed', c::text) FROM (SELECT DISTINCT client_id AS c FROM new_rows) s;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_notify_ins ON transactions;
+CREATE TRIGGER transactions_notify_ins AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_client_changed();
+
+DROP TRIGGER IF EXISTS transactions_notify_upd ON transactions;
+CREATE TRIGGER transactions_notify_upd AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_client_changed();
+
+DROP TRIGGER IF EXISTS transactions_notify_del ON transactions;
+CREATE TRIGGER transactions_notify_del AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_client_changed();
+
+-- profilul clientului (risk_rating, nume) e cache-uit la fel
+CREATE OR REPLACE FUNCTION notify_client_row_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('client_changed', OLD.id::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clients_notify ON clients;
+CREATE TRIGGER clients_notify AFTER UPDATE OR DELETE ON clients
+    FOR EACH ROW EXECUTE FUNCTION notify_client_row_changed();
+
+-- ---------------------------------------------------------------
+-- Sesiuni de conversație pentru /agent_chat* (SESSION_STORE=postgres).
+-- Schema separată: catalogul folosit de nl_to_sql vede doar public.
+-- ---------------------------------------------------------------
+CREATE SCHEMA IF NOT EXISTS app;
+
+CREATE TABLE IF NOT EXISTS app.chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    state      JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_updated_at_idx ON app.chat_sessions (updated_at);
+
+-- ---------------------------------------------------------------
+-- Joburi de advice în lot (POST /advice/batch, batch_advice.py).
+-- client_advice e și checkpoint-ul: la reluare se sar clienții 'done'.
+-- ---------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS app.advice_jobs (
+    job_id      TEXT PRIMARY KEY,
+    client_ids  INT[] NOT NULL,
+    status      TEXT NOT NULL,  -- pending | running | done | failed
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at  TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS app.client_advice (
+    job_id     TEXT NOT NULL REFERENCES app.advice_jobs (job_id) ON DELETE CASCADE,
+    client_id  INT NOT NULL,
+    status     TEXT NOT NULL,   -- done | error
+    advice     TEXT,
+    error      TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (job_id, client_id)
+);
+
+-- ---------------------------------------------------------------
+-- Notificare la DDL: fastapi_web ascultă pe canalul schema_changed
+-- și invalidează catalogul de schemă folosit de nl_to_sql.
+-- ---------------------------------------------------------------
+CREATE OR REPLACE FUNCTION notify_schema_changed() RETURNS event_trigger AS $$
+BEGIN
+    PERFORM pg_notify('schema_changed', tg_tag);
+END
+$$ LANGUAGE plpgsql;
+
+DROP EVENT TRIGGER IF EXISTS schema_changed_notify;
+CREATE EVENT TRIGGER schema_changed_notify ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_changed();
@@ -1,9 +1,20 @@
 # demo.py — Bedrock Tool Use + doar /query (schema corectă + toolResult în mesaje)
 import os
+import re
+import sys
 import requests
 import boto3
 import json
 
+try:
+  import admission
+  import schema_catalog
+except ImportError:
+  # rulat direct din repo: catalogul comun și admission control sunt în fastapi_web/
+  sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fastapi_web"))
+  import admission
+  import schema_catalog
+
 REGION   = os.getenv("AWS_REGION", "us-west-2")
 MODEL_ID = os.getenv("BEDROCK_MODEL_ID")
 API_BASE = os.getenv("PG_API_BASE", "http://localhost:8080")  # serverul tău Flask cu /query
@@ -73,44 +84,61 @@ def _post_query(sql: str):
   r.raise_for_status()
   return r.json()
 
+# catalogul de schemă e încărcat o dată prin /query și ținut în memorie (TTL),
+# așa că list_tables / describe_table nu mai scanează information_schema la fiecare tool call
+schema = schema_catalog.SchemaCatalog(_post_query, ttl=float(os.getenv("SCHEMA_CACHE_TTL", "300")))
+
 def call_list_tables():
-  sql = """
-    SELECT table_name
-    FROM information_schema.tables
-    WHERE table_schema = 'public'
-    ORDER BY table_name
-    LIMIT 100;
-  """
-  data = _post_query(sql)
-  tables = [row.get("table_name") for row in data] if isinstance(data, list) else []
-  return {"tables": tables}
+  return {"tables": schema.table_names()[:100]}
 
 def call_describe_table(table: str):
-  # simplu (atenție: aici nu interpolăm inputul în SQL real în producție; folosește parametri!)
-  table = table.strip()
-  sql = f"""
-    SELECT column_name, data_type, is_nullable
-    FROM information_schema.columns
-    WHERE table_schema = 'public' AND table_name = '{table}'
-    ORDER BY ordinal_position;
-  """
-  rows = _post_query(sql)
-  return {"rows": rows}
+  rows = schema.describe(table or "")
+  if rows is None:
+    # poate tabela e nouă: reîncărcăm catalogul o dată înainte să răspundem gol
+    schema.invalidate()
+    rows = schema.describe(table or "")
+  return {"rows": rows or []}
+
+# EXPLAIN (fără execuție) înainte de SELECT-urile modelului: costul/rândurile estimate peste
+# QUERY_MAX_COST / QUERY_MAX_ROWS sunt respinse sau limitate (vezi admission.py);
+# verdictul e ținut per text SQL (cu literali), deci interogările repetate nu mai plătesc EXPLAIN-ul
+ADMISSION = admission.AdmissionControl.from_env(lambda sql: _post_query(sql)[0], version=lambda: schema.version) \
+  if os.getenv("QUERY_ADMISSION", "on").lower() not in ("0", "off", "false", "no") else None
+
+# ca _sanitize_sql din fastapi_web: WITH e tot SQL de citire, dar un CTE poate ascunde DML
+_DANGEROUS = re.compile(
+  r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE|MERGE|CALL|COPY|DO)\b",
+  re.I,
+)
 
 def call_execute_query(sql: str):
   s = (sql or "").strip().lower()
-  if not (s.startswith("select") or s.startswith("explain")):
-    return {"error": "Allowed only SELECT/EXPLAIN."}
+  if not s.startswith(("select", "with", "explain")):
+    return {"error": "Allowed only SELECT/WITH/EXPLAIN."}
+  if _DANGEROUS.search(s):
+    return {"error": "Only read queries are allowed."}
   if "limit" not in s:
     sql = sql.rstrip(" ;") + " LIMIT 100"
+  if ADMISSION is not None and s.startswith(("select", "with")):
+    verdict = ADMISSION.check(sql)
+    print("[ADMISSION]", verdict.action, round(verdict.cost), round(verdict.rows), verdict.reason)
+    if verdict.action == admission.REJECT:
+      return {"error": f"Query rejected: {verdict.reason}. Add selective filters or aggregate before returning rows."}
+    sql = verdict.sql
   rows = _post_query(sql)
   return {"rows": rows}
 
-def handle_tool_use(tool_use):
+def handle_tool_use(tool_use, seen=None):
   name = tool_use["name"]
   args = tool_use.get("input") or {}
   print("[TOOL USE]", name, args)
 
+  # același tool cu aceleași argumente în aceeași conversație: refolosim rezultatul
+  key = name + ":" + json.dumps(args, sort_keys=True)
+  if seen is not None and key in seen:
+    print("[TOOL REUSE]", key[:200])
+    return {"toolUseId": tool_use["toolUseId"], "content": [{"json": seen[key]}]}
+
   if name == "list_tables":
     data = call_list_tables()                       # dict
   elif name == "describe_table":
@@ -123,15 +151,37 @@ def handle_tool_use(tool_use):
   # Bedrock cere obiect JSON în toolResult.content.json (nu listă)
   payload = data if isinstance(data, dict) else {"rows": data}
   print("[TOOL RES]", json.dumps(payload)[:600])
+  if seen is not None and "error" not in payload:
+    seen[key] = payload
 
   return {
     "toolUseId": tool_use["toolUseId"],
     "content": [{"json": payload}]   # ✅ mereu obiect JSON
   }
 
+# rezultatele din rundele vechi au fost deja citite de model: păstrăm doar un rezumat,
+# ca istoricul retrimis la fiecare rundă să nu crească cu fiecare SELECT
+KEEP_TOOL_ROUNDS = int(os.getenv("DEMO_KEEP_TOOL_ROUNDS", "1"))
+
+def _shrink_old_tool_results(messages):
+  rounds = [m for m in messages if m["role"] == "user" and any("toolResult" in c for c in m["content"])]
+  for m in rounds[:-KEEP_TOOL_ROUNDS] if KEEP_TOOL_ROUNDS else rounds:
+    for c in m["content"]:
+      tr = c.get("toolResult")
+      payload = tr["content"][0].get("json", {}) if tr else {}
+      if not tr or "omitted" in payload:
+        continue
+      brief = {"omitted": "already shown earlier"}
+      if isinstance(payload.get("rows"), list):
+        brief["row_count"] = len(payload["rows"])
+      if "error" in payload:
+        brief["error"] = payload["error"]
+      tr["content"] = [{"json": brief}]
+
 # -------- bucla corectă de Tool Use (FĂRĂ param 'toolResults') ----------
 def converse_with_tools(user_text: str):
   messages = [{"role": "user", "content": [{"text": user_text}]}]
+  seen = {}  # rezultatele tool-urilor din conversația curentă
 
   response = br.converse(
     modelId=MODEL_ID,
@@ -151,7 +201,7 @@ def converse_with_tools(user_text: str):
       return "\n".join(final_texts).strip()
 
     # 1) executăm tool-urile
-    results = [handle_tool_use(tu) for tu in tool_uses]
+    results = [handle_tool_use(tu, seen) for tu in tool_uses]
 
     # 2) actualizăm istoricul:
     #    a) adăugăm mesajul assistant (cel care conține toolUse)
@@ -162,7 +212,8 @@ def converse_with_tools(user_text: str):
       "content": [{"toolResult": r} for r in results]
     })
 
-    # 3) cerem continuarea modelului
+    # 3) cerem continuarea modelului, cu rezultatele vechi comprimate
+    _shrink_old_tool_results(messages)
     response = br.converse(
       modelId=MODEL_ID,
       system=[{"text": SYSTEM_PROMPT}],
@@ -1,32 +1,82 @@
-from flask import Flask, request, jsonify
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask import Flask, Response, g, request, jsonify
+import atexit
 import os
+import sys
+import time
+
+try:
+    import db
+    import columnar
+    import tracing
+    import slow_queries
+except ImportError:
+    # rulat direct din repo: folosim modulele comune din fastapi_web/ (db.py, columnar.py, tracing.py, slow_queries.py)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fastapi_web"))
+    import db
+    import columnar
+    import tracing
+    import slow_queries
 
 app = Flask(__name__)
 
-# Citim variabilele de mediu
-DB_USER = os.getenv("POSTGRES_USER", "admin")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "Paroladb")
-DB_HOST = os.getenv("POSTGRES_HOST", "postgres")
-DB_PORT = os.getenv("POSTGRES_PORT", "5432")
-DB_NAME = os.getenv("POSTGRES_DB", "skepyadb")
+# Pool-ul citește POSTGRES_* și PG_POOL_* din mediu (vezi db.py)
+db.pool.open()
+atexit.register(db.pool.close)
 
 def get_connection():
-    return psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+    return db.connection()
+
+# Server-Timing pe fiecare răspuns (db.connect / db.query / serialize) și
+# metrici Prometheus pe /metrics, la fel ca în fastapi_web (vezi tracing.py)
+@app.before_request
+def _start_trace():
+    g.trace = tracing.start_trace()
+
+@app.after_request
+def _finish_trace(response):
+    trace = g.get("trace")
+    if trace is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        tracing.observe_request("postgres-api", request.method, route, response.status_code,
+                                time.perf_counter() - trace.started)
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(tracing.METRICS.render(), mimetype=tracing.PROMETHEUS_CONTENT_TYPE)
+
+# Slow-query log pentru /query (aceleași SLOW_QUERY_* ca în fastapi_web, vezi slow_queries.py)
+SLOW_QUERIES = slow_queries.SlowQueryLog(
+    lambda: db.connection(reset=True),  # EXPLAIN ANALYZE re-rulează SQL-ul primit
+    threshold_ms=float(os.getenv("SLOW_QUERY_MS", "500")),
+    max_fingerprints=int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "500")),
+    max_samples=int(os.getenv("SLOW_QUERY_SAMPLES", "3")),
+    explain_rate=float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1")),
+    explain_interval=float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60")),
+    explain_timeout_ms=int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "10000")),
+) if os.getenv("SLOW_QUERY_LOG", "on").lower() not in ("0", "off", "false", "no") else None
+
+@app.route("/queries/slow", methods=["GET"])
+def slow_query_report():
+    if SLOW_QUERIES is None:
+        return jsonify({"enabled": False})
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 500)
+    plans = request.args.get("plans", "false").lower() in ("1", "true", "yes")
+    return jsonify({"stats": SLOW_QUERIES.stats(), "fingerprints": SLOW_QUERIES.top(limit, include_plans=plans)})
+
+@app.route("/queries/slow", methods=["DELETE"])
+def reset_slow_queries():
+    if SLOW_QUERIES is not None:
+        SLOW_QUERIES.reset()
+    return jsonify({"ok": True})
 
 @app.route("/health", methods=["GET"])
 def health():
     try:
-        conn = get_connection()
-        conn.close()
-        return jsonify({"status": "ok"})
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        return jsonify({"status": "ok", "pool": db.pool.stats()})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -34,20 +84,38 @@ def health():
 def query():
     data = request.get_json()
     sql = data.get("sql")
+    params = data.get("params")  # opțional: valori pentru placeholder-ele %s
 
     if not sql:
         return jsonify({"error": "Missing SQL query"}), 400
+    if params is not None and not isinstance(params, list):
+        return jsonify({"error": "params must be a list"}), 400
+
+    # format compact opțional (Accept), vezi columnar.py; implicit listă de obiecte
+    fmt = columnar.negotiate(request.headers.get("Accept"))
+    if fmt and not columnar.available(fmt):
+        return jsonify({"error": f"{fmt} is not available on this server"}), 406
 
+    started, elapsed = time.perf_counter(), None
     try:
-        conn = get_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(sql)
-        result = cur.fetchall() if cur.description else []
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify(result)
+        # SQL arbitrar pe conexiuni din pool: reset=True face DISCARD ALL la returnare,
+        # ca SET / temp tables / LISTEN să nu ajungă la următoarele cereri
+        with db.connection(reset=True) as conn, conn.cursor() as cur:
+            with tracing.span("db.query"):
+                cur.execute(sql, params or None)
+                columns = [d[0] for d in cur.description] if cur.description else []
+                rows = cur.fetchall() if cur.description else []
+                affected = len(rows) if cur.description else cur.rowcount
+        elapsed = time.perf_counter() - started
+        if SLOW_QUERIES is not None:
+            SLOW_QUERIES.record("query", sql, elapsed, rows=affected, params=params)
+        with tracing.span("serialize"):
+            if fmt:
+                return Response(columnar.encode(fmt, columns, rows), mimetype=fmt)
+            return jsonify([dict(zip(columns, row)) for row in rows])
     except Exception as e:
+        if SLOW_QUERIES is not None and elapsed is None:  # failed in the database, not while serializing
+            SLOW_QUERIES.record("query", sql, time.perf_counter() - started, params=params, error=e)
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
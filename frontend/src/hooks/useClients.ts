@@ -1,18 +1,19 @@
 import { useEffect, useMemo, useState } from "react";
 import { getAllClients, Client } from "../service/clientsService";
-import { useTransactions } from "./useTransactions";
+import { getTopClients, TopClient } from "../service/TransactionService";
 
 export function useClients() {
   const [clients, setClients] = useState<Client[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
-  const { transactions, loading: txLoading } = useTransactions();
+  const [topClients, setTopClients] = useState<TopClient[]>([]);
 
   useEffect(() => {
     const fetchClients = async () => {
       try {
-        const data = await getAllClients();
+        const [data, top] = await Promise.all([getAllClients(), getTopClients(3)]);
         setClients(data);
+        setTopClients(top);
       } catch (err) {
         setError("Failed to fetch clients");
       } finally {
@@ -22,24 +23,21 @@ export function useClients() {
     fetchClients();
   }, []);
 
+  // clasamentul vine gata calculat de pe server (/aggregates/top-clients)
   const rankedClients = useMemo(() => {
-    if (!clients.length || !transactions.length) return [];
+    if (!clients.length || !topClients.length) return [];
 
-    const txCount: Record<number, number> = {};
-    transactions.forEach((t) => {
-      txCount[t.client_id] = (txCount[t.client_id] || 0) + 1;
-    });
-
-    return [...clients].sort(
-      (a, b) => (txCount[b.id] || 0) - (txCount[a.id] || 0)
-    );
-  }, [clients, transactions]);
+    const byId = new Map(clients.map((c) => [c.id, c]));
+    return topClients
+      .map((t) => byId.get(t.id))
+      .filter((c): c is Client => Boolean(c));
+  }, [clients, topClients]);
 
   return {
     clients,
     topClient: rankedClients[0] || null,
     topThree: rankedClients.slice(0, 3),
-    loading: loading || txLoading,
+    loading,
     error,
   };
 }
@@ -1,18 +1,33 @@
-import { useMemo } from "react";
+import { useEffect, useMemo, useState } from "react";
 import { useClients } from "./useClients";
-import { useTransactions } from "./useTransactions";
+import { getMonthlyChange, MonthlyChange } from "../service/TransactionService";
 import { useSelectedUser } from "../Context/SelectedUserContext";
 
 export function useUserMetrics() {
   const { clients, topClient, loading: clientsLoading } = useClients();
-  const { transactions, loading: txLoading } = useTransactions();
   const { selectedUser } = useSelectedUser();
+  const [change, setChange] = useState<MonthlyChange | null>(null);
+  const [changeLoading, setChangeLoading] = useState(false);
 
   // 🟡 folosim utilizatorul selectat sau fallback pe topClient
   const activeUser = selectedUser || topClient;
 
+  // 🔹 totalurile lunare sunt calculate pe server (/aggregates/monthly-change)
+  useEffect(() => {
+    if (!activeUser) return;
+    let cancelled = false;
+    setChangeLoading(true);
+    getMonthlyChange(activeUser.id)
+      .then((data) => !cancelled && setChange(data))
+      .catch((err) => console.error("Error fetching monthly change:", err))
+      .finally(() => !cancelled && setChangeLoading(false));
+    return () => {
+      cancelled = true;
+    };
+  }, [activeUser?.id]);
+
   const metrics = useMemo(() => {
-    if (!activeUser || !transactions.length) {
+    if (!activeUser || !change || change.client_id !== activeUser.id) {
       return {
         creditScore: 0,
         riskProfile: "Unknown",
@@ -22,39 +37,17 @@ export function useUserMetrics() {
       };
     }
 
-    // 🔹 Filtrăm tranzacțiile doar pentru userul activ
-    const userTx = transactions.filter((t) => t.client_id === activeUser.id);
-
-    const totalsByMonth: Record<string, number> = {};
-    userTx.forEach((tx) => {
-      const monthKey = tx.transaction_date.slice(0, 7); // "YYYY-MM"
-      totalsByMonth[monthKey] =
-        (totalsByMonth[monthKey] || 0) + Number(tx.amount);
-    });
-
-    const months = Object.keys(totalsByMonth).sort();
-    const lastMonth = months.at(-1);
-    const prevMonth = months.at(-2);
-
-    const totalCurrent = lastMonth ? totalsByMonth[lastMonth] : 0;
-    const totalPrevious = prevMonth ? totalsByMonth[prevMonth] : 0;
-
-    const monthlyChange =
-      totalPrevious > 0
-        ? ((totalCurrent - totalPrevious) / totalPrevious) * 100
-        : 0;
-
     return {
       creditScore: activeUser.credit_score ?? 0,
       riskProfile: activeUser.risk_rating ?? "Unknown",
-      totalBalance: totalCurrent,
-      monthlyChange,
+      totalBalance: change.total,
+      monthlyChange: change.change_pct,
     };
-  }, [activeUser, transactions]); // 👈 se actualizează automat când schimbi userul
+  }, [activeUser, change]); // 👈 se actualizează automat când schimbi userul
 
   return {
     topClient,
     metrics,
-    loading: clientsLoading || txLoading,
+    loading: clientsLoading || changeLoading,
   };
 }
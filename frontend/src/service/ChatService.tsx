@@ -11,3 +11,57 @@ export const postResponse = async (message: string) => {
     throw new Error("Failed to fetch AI response");
   }
 };
+
+export interface ChatStreamHandlers {
+  onToken: (text: string) => void;
+  onEvent?: (event: string, data: any) => void; // plan | tool | done
+}
+
+// Same endpoints with `Accept: text/event-stream`: the answer arrives token by token.
+// Resolves with the payload of the final `done` event.
+// sessionId (agent endpoints): the server keeps the conversation history under it.
+export const streamResponse = async (
+  message: string,
+  handlers: ChatStreamHandlers,
+  path: "/chat" | "/agent_chat" | "/agent_chat_v2" = "/chat",
+  sessionId?: string
+) => {
+  const res = await fetch(`http://localhost:8090${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ message, session_id: sessionId }),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`Failed to fetch AI response (${res.status})`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let done: any = null;
+
+  for (;;) {
+    const { value, done: finished } = await reader.read();
+    if (finished) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const parsed = data ? JSON.parse(data) : null;
+      if (event === "token") handlers.onToken(parsed.text);
+      else if (event === "error") throw new Error(parsed?.detail || "AI stream error");
+      else {
+        if (event === "done") done = parsed;
+        handlers.onEvent?.(event, parsed);
+      }
+    }
+  }
+  return done;
+};
@@ -15,6 +15,32 @@ export const getAllTransactions = async () => {
   }
 };
 
+export interface TransactionsPage {
+  items: any[];
+  next_cursor: string | null;
+  limit: number;
+}
+
+/**
+ * Obține o pagină de tranzacții (cele mai noi primele).
+ * Pentru pagina următoare trimite `next_cursor` din răspunsul anterior.
+ */
+export const getTransactionsPage = async (
+  limit = 100,
+  cursor?: string | null,
+  clientId?: number
+): Promise<TransactionsPage> => {
+  try {
+    const response = await axios.get(`${API_URL}/transactions`, {
+      params: { limit, cursor: cursor ?? undefined, client_id: clientId },
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Error fetching transactions page:", error);
+    throw error;
+  }
+};
+
 /**
  * Returnează userul (client_id) cu cele mai multe tranzacții
  */
@@ -63,3 +89,56 @@ export const getMonthlyBreakdown = (transactions: any[]) => {
     total,
   }));
 };
+
+// -----------------------------------------------------
+// Agregate calculate pe server (transaction_rollups)
+// -----------------------------------------------------
+export interface MonthlyTotal {
+  month: string; // "YYYY-MM"
+  total: number;
+  count: number;
+}
+
+export interface MonthlyChange {
+  client_id: number;
+  month: string | null;
+  total: number;
+  previous_month: string | null;
+  previous_total: number;
+  change_pct: number;
+}
+
+export interface TopClient {
+  id: number;
+  name: string;
+  transaction_count: number;
+  total_amount: number;
+}
+
+export const getMonthlyTotals = async (clientId?: number): Promise<MonthlyTotal[]> => {
+  const response = await axios.get(`${API_URL}/aggregates/monthly`, {
+    params: { client_id: clientId },
+  });
+  return response.data;
+};
+
+export const getMonthlyChange = async (clientId: number): Promise<MonthlyChange> => {
+  const response = await axios.get(`${API_URL}/aggregates/monthly-change`, {
+    params: { client_id: clientId },
+  });
+  return response.data;
+};
+
+export const getCategoryTotals = async (clientId?: number, month?: string) => {
+  const response = await axios.get(`${API_URL}/aggregates/categories`, {
+    params: { client_id: clientId, month },
+  });
+  return response.data as { category: string; total: number; count: number }[];
+};
+
+export const getTopClients = async (n = 10): Promise<TopClient[]> => {
+  const response = await axios.get(`${API_URL}/aggregates/top-clients`, {
+    params: { n },
+  });
+  return response.data;
+};